@@ -6,6 +6,8 @@ import SettingsModal from './components/modals/SettingsModal';
 import GameViewModal from './components/modals/GameViewModal';
 import IconButton from './components/IconButton';
 import { useGameUploads } from './hooks/useGameUploads';
+import { useLibrarySearch, type LibraryFilters, type LibrarySort } from './hooks/useLibrarySearch';
+import LibraryToolbar from './components/LibraryToolbar';
 import axios from 'axios';
 
 // Icons
@@ -16,6 +18,17 @@ export interface Game {
   title: string;
   size: number;
   cover_url: string;
+  // Local copies served by /art, null until the art has been downloaded
+  art_url?: string | null;
+  thumb_url?: string | null;
+  // From the game's CFG, null until known
+  region?: string | null;
+  developer?: string | null;
+  genre?: string | null;
+  release?: string | null;
+  // Set for ZSO images; size is always what the file takes up on the drive
+  original_size?: number | null;
+  compressed_size?: number | null;
 }
 
 export interface StorageDevice {
@@ -27,31 +40,21 @@ export interface StorageDevice {
 }
 
 function App() {
-  const [games, setGames] = useState<Game[]>([]);
   const [selectedGame, setSelectedGame] = useState<Game | null>(null);
   const [ gameQuery, setGameQuery ] = useState<string | null>(null);
   const [gameModalOpen, setGameModalOpen] = useState(false);
   const [storageDevice, setStorageDevice] = useState<StorageDevice | null>(null);
   const [settingsModalOpen, setSettingsModalOpen] = useState(false);
   const { queue, uploadFiles, removeFile, clearCompleted } = useGameUploads();
-  
-  useEffect(() => {
-    fetchLibrary();
-  }, []);
+  const [filters, setFilters] = useState<LibraryFilters>({});
+  const [sort, setSort] = useState<LibrarySort | null>(null);
+  const [descending, setDescending] = useState(false);
+  const { games, total, facets, activeSort, loading, hasMore, loadMore, refresh: fetchLibrary } = useLibrarySearch(gameQuery, filters, sort, descending);
 
   useEffect(() => {
     fetchDevice();
   }, [])
 
-  const fetchLibrary = async () => {
-    try {
-      const response = await axios.get('/library');
-      setGames(response.data);
-    } catch (error) {
-      console.error("Failed to fetch library: ", error);
-    }
-  };
-
   const fetchDevice = async () => {
     try {
       const response = await axios.get('/device');
@@ -110,9 +113,14 @@ function App() {
   };
 
   const handleSearch = async (query : string) => {
+    if (query === (gameQuery ?? '')) return;
     setGameQuery(query)
+    // A new query starts out ranked by relevance
+    setSort(null)
   }
 
+  const activeFilters = [gameQuery, ...Object.values(filters)].filter(Boolean).join(", ");
+
   return (
     <>
       <Header setSettingsModalOpen={setSettingsModalOpen} OnQuery={handleSearch} />
@@ -121,7 +129,9 @@ function App() {
           <SettingsModal isOpen={settingsModalOpen} onClose={() => {setSettingsModalOpen(false); fetchLibrary();}} device={storageDevice || undefined} onUpdatePath={onUpdatePath} onRefresh={fetchDevice}/>
           <AddGameModal isOpen={gameModalOpen} queue={queue} onUpload={uploadFiles} onClose={handleGameModalClose} onRemove={removeFile} />
           <GameViewModal isOpen={!!selectedGame} onClose={() => setSelectedGame(null)} game={selectedGame} onDelete={handleDeleteGame} />
-          <Grid games={games} onGameClick={(game) => setSelectedGame(game)} filter={gameQuery}/>
+          <LibraryToolbar total={total} facets={facets} filters={filters} sort={activeSort} descending={descending} hasQuery={!!gameQuery}
+            onFiltersChange={setFilters} onSortChange={setSort} onOrderToggle={() => setDescending(!descending)} />
+          <Grid games={games} onGameClick={(game) => setSelectedGame(game)} filter={activeFilters || null} loading={loading} hasMore={hasMore} onEndReached={loadMore}/>
           <div className="fixed bottom-8 right-8 shadow-lg">
             <IconButton icon={<Plus size={48} className="text-zinc-100" />} bgColor="bg-sky-600" onClick={handleAddGameClick} />
           </div>
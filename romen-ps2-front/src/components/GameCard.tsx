@@ -48,7 +48,7 @@ function GameCard({ title, size, cover_url, onClick } : GameCardProps) {
                 <div className={`relative aspect-2/3 w-full ${imageError ? randomColor : 'bg-zinc-900'}`}>
                     {!imageError && cover_url ? (
                         <img className="w-full h-full object-cover" 
-                        src={cover_url} alt={title}
+                        src={cover_url} alt={title} loading="lazy" decoding="async"
                         onError={() => setImageError(true)} />
                     ) : (
                         <div className="w-full h-full flex items-center justify-center p-4 text-center">
@@ -1,3 +1,4 @@
+import { useEffect, useLayoutEffect, useRef, useState } from "react";
 import GameCard from "./GameCard"
 import type { Game } from "../App";
 import { Gamepad2, SearchX } from "lucide-react"; // Added SearchX for a "no results" state
@@ -6,34 +7,97 @@ interface GridProps {
     games: Game[];
     onGameClick: (game: Game) => void;
     filter: string | null;
+    loading?: boolean;
+    hasMore?: boolean;
+    onEndReached?: () => void;
 }
 
-export default function Grid({ games, onGameClick, filter }: GridProps) {
-    // 1. Filter the games based on the title (case-insensitive)
-    const filteredGames = games.filter((game) => {
-        if (!filter) return true;
-        return game.title.toLowerCase().includes(filter.toLowerCase());
+// Matches the grid's gap-10 / p-5 and Tailwind's sm/md/lg breakpoints below
+const GAP = 40;
+const PADDING = 20;
+// Rows rendered above and below the viewport
+const OVERSCAN_ROWS = 3;
+
+const columnsFor = (width: number) => width >= 1024 ? 5 : width >= 768 ? 4 : width >= 640 ? 2 : 1;
+
+export default function Grid({ games, onGameClick, filter, loading, hasMore, onEndReached }: GridProps) {
+    const containerRef = useRef<HTMLDivElement>(null);
+    const rowRef = useRef<HTMLDivElement>(null);
+    const [viewport, setViewport] = useState({ width: window.innerWidth, height: window.innerHeight, offset: 0 });
+    // Estimated until the first rendered row can be measured
+    const [rowHeight, setRowHeight] = useState(400);
+    const updateViewport = useRef<() => void>(() => {});
+
+    // Only the rows in (or near) the viewport are rendered, so large libraries stay cheap
+    useEffect(() => {
+        let frame = 0;
+        const update = () => {
+            frame = 0;
+            const top = containerRef.current?.getBoundingClientRect().top ?? 0;
+            setViewport({ width: window.innerWidth, height: window.innerHeight, offset: -top });
+        };
+        const schedule = () => { if (!frame) frame = requestAnimationFrame(update); };
+
+        updateViewport.current = update;
+        update();
+        window.addEventListener("scroll", schedule, { passive: true });
+        window.addEventListener("resize", schedule);
+        return () => {
+            window.removeEventListener("scroll", schedule);
+            window.removeEventListener("resize", schedule);
+            if (frame) cancelAnimationFrame(frame);
+        };
+    }, []);
+
+    // The container only exists once there are games; measure where it landed
+    const hasGames = games.length > 0;
+    useEffect(() => updateViewport.current(), [hasGames]);
+
+    const columns = columnsFor(viewport.width);
+    const rowCount = Math.ceil(games.length / columns);
+    const firstRow = Math.max(0, Math.floor((viewport.offset - PADDING) / rowHeight) - OVERSCAN_ROWS);
+    const lastRow = Math.min(rowCount, Math.ceil((viewport.offset + viewport.height) / rowHeight) + OVERSCAN_ROWS);
+
+    useLayoutEffect(() => {
+        const measured = rowRef.current ? rowRef.current.offsetHeight + GAP : 0;
+        if (measured > GAP && measured !== rowHeight) setRowHeight(measured);
     });
 
+    // Ask for the next page before the user runs out of rows
+    useEffect(() => {
+        if (hasMore && onEndReached && lastRow >= rowCount - OVERSCAN_ROWS) onEndReached();
+    }, [hasMore, onEndReached, lastRow, rowCount]);
+
+    const visibleRows = [];
+    for (let row = firstRow; row < lastRow; row++) {
+        visibleRows.push(
+            <div key={row} ref={row === firstRow ? rowRef : undefined} className="grid sm:grid-cols-2 md:grid-cols-4 lg:grid-cols-5 gap-10">
+                {games.slice(row * columns, (row + 1) * columns).map((game) => (
+                    <GameCard
+                        key={game.serial}
+                        title={game.title}
+                        size={game.size}
+                        cover_url={game.thumb_url || game.cover_url}
+                        onClick={() => onGameClick(game)}
+                    />
+                ))}
+            </div>
+        );
+    }
+
     return (
         <>
-            {/* 2. Check if we have games to show after filtering */}
-            {filteredGames.length > 0 ? (
-                <div className="grid sm:grid-cols-2 md:grid-cols-4 lg:grid-cols-5 gap-10 p-5">
-                    {filteredGames.map((game, index) => (
-                        <GameCard 
-                            key={index} 
-                            title={game.title} 
-                            size={game.size} 
-                            cover_url={game.cover_url} 
-                            onClick={() => onGameClick(game)}
-                        />
-                    ))}
+            {/* 2. Check if we have games to show */}
+            {games.length > 0 ? (
+                <div ref={containerRef} className="p-5" style={{ height: rowCount * rowHeight - GAP + PADDING * 2 }}>
+                    <div className="flex flex-col gap-10" style={{ transform: `translateY(${firstRow * rowHeight}px)` }}>
+                        {visibleRows}
+                    </div>
                 </div>
-            ) : (
+            ) : loading ? null : (
                 <div className="flex flex-col items-center justify-center min-h-[50vh] text-zinc-500">
                     {/* 3. Logic to show different empty states */}
-                    {games.length === 0 ? (
+                    {!filter ? (
                         // Original "Empty Library" state
                         <>
                             <div className="bg-zinc-800/50 p-6 rounded-full mb-4 ring-1 ring-zinc-700/50">
@@ -61,4 +125,4 @@ export default function Grid({ games, onGameClick, filter }: GridProps) {
             )}
         </>
     );
-}
\ No newline at end of file
+}
@@ -0,0 +1,65 @@
+import React from 'react';
+import { ArrowDownWideNarrow, ArrowUpNarrowWide } from 'lucide-react';
+import type { LibraryFacets, LibraryFilters, LibrarySort } from '../hooks/useLibrarySearch';
+
+interface LibraryToolbarProps {
+    total: number;
+    facets: LibraryFacets;
+    filters: LibraryFilters;
+    sort: LibrarySort | null;
+    descending: boolean;
+    hasQuery: boolean;
+    onFiltersChange: (filters: LibraryFilters) => void;
+    onSortChange: (sort: LibrarySort) => void;
+    onOrderToggle: () => void;
+}
+
+const FACET_LABELS: Record<keyof LibraryFilters, string> = {
+    region: "All regions",
+    genre: "All genres",
+    developer: "All developers",
+};
+
+const SORT_LABELS: Record<LibrarySort, string> = {
+    relevance: "Best match",
+    title: "Title",
+    serial: "Serial",
+    size: "Size",
+    release: "Release date",
+};
+
+const selectClass = "bg-zinc-800 border border-zinc-700 rounded-md px-3 py-1.5 text-sm text-zinc-200 outline-none focus:border-sky-600 max-w-48";
+
+const LibraryToolbar: React.FC<LibraryToolbarProps> = ({ total, facets, filters, sort, descending, hasQuery, onFiltersChange, onSortChange, onOrderToggle }) => {
+    const sorts = (Object.keys(SORT_LABELS) as LibrarySort[]).filter(option => option !== 'relevance' || hasQuery);
+
+    return (
+        <div className="flex flex-wrap items-center gap-3 px-5 pt-5 text-zinc-400">
+            <span className="text-sm mr-auto">{total} {total === 1 ? "game" : "games"}</span>
+
+            {(Object.keys(FACET_LABELS) as (keyof LibraryFilters)[]).map(facet => {
+                const values = Object.entries(facets[facet] ?? {});
+                // Nothing to choose between (e.g. no CFG metadata yet)
+                if (values.length === 0 && !filters[facet]) return null;
+                return (
+                    <select key={facet} className={selectClass} value={filters[facet] ?? ""}
+                        onChange={(e) => onFiltersChange({ ...filters, [facet]: e.target.value || null })}>
+                        <option value="">{FACET_LABELS[facet]}</option>
+                        {values.map(([value, count]) => (
+                            <option key={value} value={value}>{value} ({count})</option>
+                        ))}
+                    </select>
+                );
+            })}
+
+            <select className={selectClass} value={sort ?? ""} onChange={(e) => onSortChange(e.target.value as LibrarySort)}>
+                {sorts.map(option => <option key={option} value={option}>{SORT_LABELS[option]}</option>)}
+            </select>
+            <button className="p-1.5 rounded-md hover:text-sky-500 transition-colors" onClick={onOrderToggle} title={descending ? "Descending" : "Ascending"}>
+                {descending ? <ArrowDownWideNarrow size={20} /> : <ArrowUpNarrowWide size={20} />}
+            </button>
+        </div>
+    );
+};
+
+export default LibraryToolbar;
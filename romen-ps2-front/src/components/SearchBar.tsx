@@ -1,9 +1,15 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { Search } from 'lucide-react';
 
 const SearchBar: React.FC<{OnQuery: (query: string) => void}> = ({ OnQuery }) => {
     const [query, setQuery] = useState('');
 
+    // The server searches as you type; wait for a pause so every keystroke isn't a request
+    useEffect(() => {
+        const timeout = setTimeout(() => OnQuery(query), 250);
+        return () => clearTimeout(timeout);
+    }, [query]);
+
     const handleKeyDown = (e: React.KeyboardEvent<HTMLInputElement>) => {
             if (e.key === 'Enter') {
                 e.currentTarget.blur(); // Remove focus, which triggers onBlur -> handleCommit
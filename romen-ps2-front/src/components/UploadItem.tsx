@@ -9,15 +9,18 @@ interface UploadItemProps {
     coverUrl?: string;
     progress: number; // 0 to 100
     status: UploadStatus
+    queuePosition?: number | null;
+    copyProgress?: number | null;
     onTrash?: () => void;
 }
 
-const UploadItem: React.FC<UploadItemProps> = ({ title, coverUrl, progress, status, onTrash }) => {
+const UploadItem: React.FC<UploadItemProps> = ({ title, coverUrl, progress, status, queuePosition, copyProgress, onTrash }) => {
     
     // Helper to determine bar color based on status
     const getBarColor = () => {
         if (status === 'error') return 'bg-red-500';
         if (status === 'completed') return 'bg-green-500';
+        if (status === 'skipped') return 'bg-zinc-500';
         return 'bg-sky-500';
     };
 
@@ -38,13 +41,19 @@ const UploadItem: React.FC<UploadItemProps> = ({ title, coverUrl, progress, stat
                             <span className="text-green-400 flex items-center">
                                 <CheckCircle size={14} className="mr-1"/> Complete
                             </span>
+                        ) : status === 'skipped' ? (
+                            <span className="text-zinc-400 flex items-center">
+                                <CheckCircle size={14} className="mr-1"/> Already in library
+                            </span>
                         ) : status === 'error' ? (
                             <span className="text-red-400 flex items-center">
                                 <AlertCircle size={14} className="mr-1"/> Failed
                             </span>
                         ) : status === 'processing' ? (
                             <span className="text-amber-400 flex items-center">
-                                <Loader2 size={14} className="mr-1 animate-spin"/> Processing...
+                                <Loader2 size={14} className="mr-1 animate-spin"/> {queuePosition
+                                    ? `Queued (#${queuePosition})`
+                                    : copyProgress != null ? `Copying to drive ${copyProgress}%` : 'Processing...'}
                             </span>
                         ) : (
                             <span className="text-zinc-400">
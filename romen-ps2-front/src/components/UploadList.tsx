@@ -19,6 +19,8 @@ const UploadList : React.FC<UploadListProps> = ({items, onRemove}) => {
                         coverUrl={item.coverUrl || "/img/placeholder_cover.jpg"}
                         progress={item.progress}
                         status={item.status}
+                        queuePosition={item.queuePosition}
+                        copyProgress={item.copyProgress}
                         onTrash={() => onRemove(item.fileObject.name)}
                     />
                 ))
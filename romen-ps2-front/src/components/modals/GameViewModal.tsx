@@ -43,9 +43,9 @@ const GameViewModal: React.FC<GameViewModalProps> = ({ isOpen, onClose, game, on
                     {/* --- LEFT COLUMN: COVER ART --- */}
                     <div className="w-full md:w-1/3 shrink-0">
                         <div className="aspect-2/3 w-full bg-zinc-800 rounded-lg overflow-hidden shadow-lg border border-zinc-700/50 relative">
-                            {game.cover_url || (game as any).cover_URL ? (
+                            {game.art_url || game.cover_url || (game as any).cover_URL ? (
                                 <img 
-                                    src={game.cover_url || (game as any).cover_URL} 
+                                    src={game.art_url || game.cover_url || (game as any).cover_URL} 
                                     alt={game.title} 
                                     className="w-full h-full object-cover" 
                                 />
@@ -80,7 +80,12 @@ const GameViewModal: React.FC<GameViewModalProps> = ({ isOpen, onClose, game, on
                                 </div>
                                 <div>
                                     <p className="text-xs text-zinc-500 uppercase font-semibold">File Size</p>
-                                    <p className="text-zinc-200">{formatSize(game.size)}</p>
+                                    <p className="text-zinc-200">
+                                        {formatSize(game.size)}
+                                        {game.compressed_size && game.original_size ? (
+                                            <span className="text-zinc-500"> (ZSO, {formatSize(game.original_size)} uncompressed)</span>
+                                        ) : null}
+                                    </p>
                                 </div>
                             </div>
                         </div>
@@ -1,7 +1,7 @@
 import Modal from '../Modal';
 import React, { useState, useEffect } from 'react';
 import IconButton from '../IconButton';
-import { Trash, HardDrive, FolderSearch, Wrench } from 'lucide-react';
+import { Trash, HardDrive, FolderSearch, Wrench, Archive } from 'lucide-react';
 import type { StorageDevice } from '../../App';
 import axios from 'axios';
 
@@ -68,10 +68,12 @@ const SettingsModal: React.FC<SettingsModalProps> = ({ isOpen, onClose, device,
 
     async function OnDeleteClick() {
         if (!confirm("Are you sure you want to clear the library?\nThis Action CANNOT be Undone.")) return;
-        const response = await axios.delete(`/library/clear`);
+        const response = await axios.post(`/library/delete`, { serials: "all" });
 
-        if (response.data.success) {
+        if (response.data.status === "success") {
             alert("Library has been cleared successfully.")
+        } else if (response.data.status === "partial") {
+            alert(`Library cleared, but files for ${response.data.failed} games could not be deleted.`)
         } else {
             alert("Unable to clear library, if issue persists rebuild library.")
         }
@@ -83,6 +85,12 @@ const SettingsModal: React.FC<SettingsModalProps> = ({ isOpen, onClose, device,
         alert(response.data.message);
     }
 
+    async function OnCompressClick() {
+        if (!confirm("Compress every game in the library to ZSO?\nGames are compressed one at a time in the background; uploads go first.")) return;
+        const response = await axios.post('/library/compress', { serials: "all" });
+        alert(response.data.message);
+    }
+
     return (
         <Modal isOpen={isOpen} onClose={onClose} title="Settings">
             <div className="flex flex-col space-y-5">
@@ -139,6 +147,11 @@ const SettingsModal: React.FC<SettingsModalProps> = ({ isOpen, onClose, device,
                         <p className="font-semibold text-xl text-zinc-100">Rebuild Library</p>
                     </div>
 
+                    <div className="flex flex-row items-center space-x-4 mt-4">
+                        <IconButton icon={<Archive size={32} className="text-white" />} bgColor="bg-sky-600 hover:bg-sky-500" onClick={OnCompressClick} />
+                        <p className="font-semibold text-xl text-zinc-100">Compress Library</p>
+                    </div>
+
                     <div className="flex flex-row items-center space-x-4 mt-4">
                         <IconButton icon={<Trash size={32} className="text-white" />} bgColor="bg-red-600 hover:bg-red-500" onClick={OnDeleteClick} />
                         <p className="font-semibold text-xl text-zinc-100">Clear Library</p>
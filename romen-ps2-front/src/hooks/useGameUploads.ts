@@ -1,7 +1,7 @@
 import { useState, useCallback } from 'react';
 import axios from 'axios';
 
-export type UploadStatus = 'pending' | 'uploading' | 'processing' | 'completed' | 'error';
+export type UploadStatus = 'pending' | 'uploading' | 'processing' | 'completed' | 'skipped' | 'error';
 
 export interface FileUploadItem {
     fileObject: File;
@@ -9,12 +9,236 @@ export interface FileUploadItem {
     status: UploadStatus;
     displayTitle?: string;
     coverUrl?: string;
+    queuePosition?: number | null;
+    copyProgress?: number | null;
     // 1. Add this so we can kill the request later
     controller: AbortController; 
 }
 
 const wait = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
 
+// Resumable upload tuning
+const PARALLEL_CHUNKS = 4;
+const MAX_CHUNK_RETRIES = 8;
+// A compressed chunk is only sent when it is at least this much smaller than the raw one
+const MIN_TRANSPORT_SAVINGS = 0.05;
+
+type ByteRange = [number, number];
+
+interface UploadSession {
+    upload_id: string;
+    job_id: string;
+    chunk_size: number;
+    received: ByteRange[];
+    error?: string | null;
+    // Encodings the server accepts chunks in; empty when transport compression is off
+    encodings?: string[];
+}
+
+class UploadRejected extends Error {}
+
+interface Precheck {
+    exists: boolean;
+    identical: boolean | null;
+    title?: string;
+}
+
+// ISO9660 layout, as read by the server's iso.read_system_cnf
+const SECTOR_SIZE = 2048;
+const FIRST_DESCRIPTOR_SECTOR = 16;
+const MAX_DESCRIPTORS = 32;
+const MAX_SYSTEM_CNF_SIZE = 64 * 1024;
+// Must match ingest.FINGERPRINT_SPAN on the server
+const FINGERPRINT_SPAN = 4 * 1024 * 1024;
+
+interface JobEvent {
+    job_id: string;
+    status: string;
+    title?: string;
+    cover_url?: string;
+    message?: string;
+    stage?: string;
+    bytes_done?: number;
+    bytes_total?: number | null;
+    queue_position?: number | null;
+}
+
+// One shared event stream carries every job's progress, instead of one poll per file
+const jobListeners = new Map<string, (job: JobEvent) => void>();
+let jobEvents: EventSource | null = null;
+
+const watchJob = (jobId: string, listener: (job: JobEvent) => void) => {
+    jobListeners.set(jobId, listener);
+    if (!jobEvents) {
+        // EventSource reconnects on its own; the server replays a snapshot on every connect
+        jobEvents = new EventSource("/jobs/events");
+        jobEvents.addEventListener("job", (e) => {
+            const job: JobEvent = JSON.parse((e as MessageEvent).data);
+            jobListeners.get(job.job_id)?.(job);
+        });
+    }
+
+    return () => {
+        jobListeners.delete(jobId);
+        if (jobListeners.size === 0 && jobEvents) {
+            jobEvents.close();
+            jobEvents = null;
+        }
+    };
+};
+
+const readBytes = async (file: File, offset: number, length: number) =>
+    new Uint8Array(await file.slice(offset, offset + length).arrayBuffer());
+
+const latin1 = new TextDecoder('latin1');
+
+// Walks just enough of the image to read SYSTEM.CNF, a few small slices instead of the whole file
+const readSerial = async (file: File): Promise<string | null> => {
+    let rootRecord: DataView | null = null;
+    for (let index = 0; index < MAX_DESCRIPTORS; index++) {
+        const descriptor = await readBytes(file, (FIRST_DESCRIPTOR_SECTOR + index) * SECTOR_SIZE, SECTOR_SIZE);
+        if (descriptor.length < SECTOR_SIZE || latin1.decode(descriptor.subarray(1, 6)) !== 'CD001') return null;
+        if (descriptor[0] === 1) {
+            rootRecord = new DataView(descriptor.buffer, 156, 34);
+            break;
+        }
+        if (descriptor[0] === 255) return null;
+    }
+    if (!rootRecord) return null;
+
+    const rootDir = await readBytes(file, rootRecord.getUint32(2, true) * SECTOR_SIZE, rootRecord.getUint32(10, true));
+    let offset = 0;
+    while (offset < rootDir.length) {
+        const recordLength = rootDir[offset];
+        if (recordLength === 0) {
+            // Records never span sectors; skip the padding to the next one
+            offset = (Math.floor(offset / SECTOR_SIZE) + 1) * SECTOR_SIZE;
+            continue;
+        }
+        const name = latin1.decode(rootDir.subarray(offset + 33, offset + 33 + rootDir[offset + 32])).toUpperCase();
+        if (name === 'SYSTEM.CNF;1' || name === 'SYSTEM.CNF') {
+            const record = new DataView(rootDir.buffer, offset, recordLength);
+            const content = await readBytes(file, record.getUint32(2, true) * SECTOR_SIZE, Math.min(record.getUint32(10, true), MAX_SYSTEM_CNF_SIZE));
+            const match = latin1.decode(content).match(/cdrom0:\s?\\(.*?);/i);
+            return match ? match[1] : null;
+        }
+        offset += recordLength;
+    }
+    return null;
+};
+
+const CRC_TABLE = (() => {
+    const table = new Uint32Array(256);
+    for (let n = 0; n < 256; n++) {
+        let c = n;
+        for (let k = 0; k < 8; k++) c = c & 1 ? 0xEDB88320 ^ (c >>> 1) : c >>> 1;
+        table[n] = c >>> 0;
+    }
+    return table;
+})();
+
+// Same as zlib.crc32(data, crc), so fingerprints can be chained the way the server does
+const crc32 = (data: Uint8Array, crc = 0) => {
+    crc = ~crc;
+    for (let i = 0; i < data.length; i++) crc = CRC_TABLE[(crc ^ data[i]) & 0xff] ^ (crc >>> 8);
+    return ~crc >>> 0;
+};
+
+// ingest.image_fingerprint: CRC32 over the first and last few MB
+const fingerprint = async (file: File) => {
+    const head = Math.min(file.size, FINGERPRINT_SPAN);
+    const tailStart = Math.max(head, file.size - FINGERPRINT_SPAN);
+    let crc = crc32(await readBytes(file, 0, head));
+    crc = crc32(await readBytes(file, tailStart, file.size - tailStart), crc);
+    return crc.toString(16).padStart(8, '0');
+};
+
+// Asks the library about a file before sending it; a precheck that can't be made never blocks an upload
+const precheck = async (file: File, signal: AbortSignal): Promise<Precheck | null> => {
+    try {
+        const serial = await readSerial(file);
+        if (!serial) return null;
+        const { data } = await axios.get('/library/precheck', {
+            params: { serial, size: file.size, fingerprint: await fingerprint(file) },
+            signal
+        });
+        return data.status === "success" ? data : null;
+    } catch (error) {
+        if (axios.isCancel(error)) throw error;
+        console.warn(`Precheck for ${file.name} failed: `, error);
+        return null;
+    }
+};
+
+const isFinished = (job: JobEvent) => ["completed", "success", "error"].includes(job.status);
+
+// Sessions are remembered per file so re-selecting it after a reload resumes the transfer
+const sessionKey = (file: File) => `romen-upload:${file.name}:${file.size}:${file.lastModified}`;
+
+const missingChunks = (size: number, chunkSize: number, received: ByteRange[]): ByteRange[] => {
+    const chunks: ByteRange[] = [];
+    for (let start = 0; start < size; start += chunkSize) {
+        const end = Math.min(start + chunkSize, size);
+        if (!received.some(([s, e]) => s <= start && e >= end)) chunks.push([start, end]);
+    }
+    return chunks;
+};
+
+const openSession = async (file: File, signal: AbortSignal): Promise<UploadSession> => {
+    const key = sessionKey(file);
+    const savedId = localStorage.getItem(key);
+
+    if (savedId) {
+        const { data } = await axios.get(`/uploads/${savedId}`, { signal });
+        if (data.upload_id && !data.error) return data;
+        localStorage.removeItem(key);
+    }
+
+    const { data } = await axios.post("/uploads", null, {
+        params: { filename: file.name, size: file.size },
+        signal
+    });
+    if (data.status === "error") throw new UploadRejected(data.message);
+    localStorage.setItem(key, data.upload_id);
+    return data;
+};
+
+// Gzip is understood by every browser with CompressionStream, and zero padding shrinks to almost nothing
+const transportEncoding = (session: UploadSession): CompressionFormat | null =>
+    typeof CompressionStream !== 'undefined' && session.encodings?.includes('gzip') ? 'gzip' : null;
+
+// Browsers only stream request bodies over HTTP/2, so each chunk is compressed whole instead of the file as one stream
+const compressChunk = async (chunk: Blob, encoding: CompressionFormat): Promise<Blob | null> => {
+    const compressed = await new Response(chunk.stream().pipeThrough(new CompressionStream(encoding))).blob();
+    return compressed.size <= chunk.size * (1 - MIN_TRANSPORT_SAVINGS) ? compressed : null;
+};
+
+const sendChunk = async (uploadId: string, file: File, [start, end]: ByteRange, encoding: CompressionFormat | null,
+                         signal: AbortSignal, onProgress: (loaded: number) => void) => {
+    const raw = file.slice(start, end);
+    const compressed = encoding ? await compressChunk(raw, encoding) : null;
+    const body = compressed ?? raw;
+
+    for (let attempt = 0; ; attempt++) {
+        try {
+            const { data } = await axios.put(`/uploads/${uploadId}`, body, {
+                params: compressed ? { offset: start, encoding } : { offset: start },
+                headers: { 'Content-Type': 'application/octet-stream' },
+                signal,
+                // Progress is counted in file bytes, whatever went over the wire
+                onUploadProgress: (e) => onProgress(body.size ? Math.round((e.loaded * raw.size) / body.size) : 0)
+            });
+            if (data.status === "error") throw new UploadRejected(data.message);
+            return;
+        } catch (error) {
+            if (axios.isCancel(error) || error instanceof UploadRejected || attempt >= MAX_CHUNK_RETRIES) throw error;
+            // Dropped Wi-Fi or a sleeping device; back off and send the range again
+            onProgress(0);
+            await wait(Math.min(1000 * 2 ** attempt, 30000));
+        }
+    }
+};
+
 export const useGameUploads = () => {
     const [queue, setQueue] = useState<FileUploadItem[]>([]);
 
@@ -26,54 +250,104 @@ export const useGameUploads = () => {
     };
 
     const processFile = async (file: File, controller: AbortController) => {
-        const formData = new FormData();
-        formData.append("file", file);
+        let session: UploadSession | null = null;
+        let stopWatching = () => {};
 
         try {
-            updateItem(file.name, { status: 'uploading', progress: 0 });
-
-            // 2. Pass the signal to the upload request
-            const { data } = await axios.post("/upload", formData, {
-                signal: controller.signal, // <--- This connects the abort button
-                onUploadProgress: (e) => {
-                    const total = e.total || file.size;
-                    const percent = Math.round((e.loaded * 100) / total);
-                    if (percent === 100) {
-                        updateItem(file.name, { progress: 100, status: 'processing' });
-                    } else {
-                        updateItem(file.name, { progress: percent, status: 'uploading' });
+            // PHASE 0: DUPLICATE CHECK (a resumed session was already decided on)
+            if (!localStorage.getItem(sessionKey(file))) {
+                const existing = await precheck(file, controller.signal);
+                if (existing?.exists) {
+                    const replace = existing.identical === true ? false : confirm(
+                        `${existing.title} is already in your library` +
+                        (existing.identical === false ? " as a different dump or version" : "") +
+                        ".\nUpload it anyway and replace it?"
+                    );
+                    if (!replace) {
+                        updateItem(file.name, { status: 'skipped', progress: 100, displayTitle: existing.title });
+                        return;
                     }
                 }
-            });
+            }
 
-            // PHASE 2: POLLING
-            while (true) {
-                // Check if user clicked trash during the wait
-                if (controller.signal.aborted) throw new Error("Cancelled by user");
-                
-                await wait(1000); 
+            updateItem(file.name, { status: 'uploading', progress: 0 });
 
-                // Check again before network request
-                if (controller.signal.aborted) throw new Error("Cancelled by user");
+            // PHASE 1: CHUNKED UPLOAD (resumes any session left over from a reload)
+            session = await openSession(file, controller.signal);
+            const { upload_id: uploadId, job_id: jobId } = session;
 
-                // 3. Pass signal here too, so we can cancel polling requests!
-                const job = await axios.get(`/job/${data.job_id}`, {
-                    signal: controller.signal
-                });
-
-                if (job.data.status === "completed" || job.data.status === "success") {
-                    updateItem(file.name, { 
-                        status: 'completed', 
-                        displayTitle: job.data.title, 
-                        coverUrl: job.data.cover_url 
+            // Title, queue position and copy progress all arrive over the shared event stream
+            let resolveJob: (job: JobEvent) => void = () => {};
+            const jobDone = new Promise<JobEvent>(resolve => { resolveJob = resolve; });
+            stopWatching = watchJob(jobId, (job) => {
+                if (job.title) updateItem(file.name, { displayTitle: job.title });
+                if (job.status === "queued") updateItem(file.name, { queuePosition: job.queue_position });
+                if (job.status === "processing" && job.stage === "copying" && job.bytes_total) {
+                    updateItem(file.name, {
+                        queuePosition: null,
+                        copyProgress: Math.round(((job.bytes_done || 0) * 100) / job.bytes_total)
                     });
-                    break; 
                 }
-                
-                if (job.data.status === "error") {
-                    updateItem(file.name, { status: 'error' });
-                    break;
+                if (isFinished(job)) resolveJob(job);
+            });
+
+            let doneBytes = session.received.reduce((sum, [s, e]) => sum + (e - s), 0);
+            const inFlight = new Map<number, number>();
+            const reportProgress = () => {
+                const loaded = doneBytes + Array.from(inFlight.values()).reduce((a, b) => a + b, 0);
+                const percent = file.size ? Math.round((loaded * 100) / file.size) : 100;
+                updateItem(file.name, { progress: Math.min(percent, 99), status: 'uploading' });
+            };
+
+            const pending = missingChunks(file.size, session.chunk_size, session.received);
+            const encoding = transportEncoding(session);
+
+            // One failed chunk stops the rest of this file's chunks, not just its own worker
+            const chunks = new AbortController();
+            const stopChunks = () => chunks.abort();
+            controller.signal.addEventListener("abort", stopChunks);
+            const worker = async () => {
+                try {
+                    while (pending.length > 0 && !chunks.signal.aborted) {
+                        const range = pending.shift()!;
+                        await sendChunk(uploadId, file, range, encoding, chunks.signal, (loaded) => {
+                            inFlight.set(range[0], loaded);
+                            reportProgress();
+                        });
+                        inFlight.delete(range[0]);
+                        doneBytes += range[1] - range[0];
+                        reportProgress();
+                    }
+                } catch (error) {
+                    chunks.abort();
+                    throw error;
                 }
+            };
+            try {
+                await Promise.all(Array.from({ length: PARALLEL_CHUNKS }, worker));
+            } finally {
+                controller.signal.removeEventListener("abort", stopChunks);
+            }
+
+            const { data } = await axios.post(`/uploads/${uploadId}/finalize`, null, { signal: controller.signal });
+            if (data.status === "error") throw new UploadRejected(data.message);
+            localStorage.removeItem(sessionKey(file));
+            updateItem(file.name, { progress: 100, status: 'processing' });
+
+            // PHASE 2: WAIT FOR THE JOB (pushed by the server, no polling)
+            const cancelled = new Promise<never>((_, reject) => {
+                controller.signal.addEventListener("abort", () => reject(new Error("Cancelled by user")));
+            });
+            const job = await Promise.race([jobDone, cancelled]);
+
+            if (job.status === "error") {
+                updateItem(file.name, { status: 'error' });
+            } else {
+                updateItem(file.name, { 
+                    status: 'completed', 
+                    displayTitle: job.title, 
+                    coverUrl: job.cover_url 
+                });
             }
 
         } catch (error) {
@@ -81,10 +355,20 @@ export const useGameUploads = () => {
             if (axios.isCancel(error) || (error as Error).message === "Cancelled by user") {
                 console.log(`Upload ${file.name} cancelled.`);
                 // We don't need to set status to error, because we are about to remove it from the queue entirely
+                if (session) {
+                    localStorage.removeItem(sessionKey(file));
+                    axios.delete(`/uploads/${session.upload_id}`).catch(() => {});
+                }
+            } else if (error instanceof UploadRejected) {
+                console.error(`Upload ${file.name} rejected: ${error.message}`);
+                localStorage.removeItem(sessionKey(file));
+                updateItem(file.name, { status: 'error', progress: 0 });
             } else {
                 console.error(error);
                 updateItem(file.name, { status: 'error', progress: 0 });
             }
+        } finally {
+            stopWatching();
         }
     };
 
@@ -127,7 +411,7 @@ export const useGameUploads = () => {
 
     // 7. Clear Completed (For re-opening modal)
     const clearCompleted = useCallback(() => {
-        setQueue(prev => prev.filter(i => i.status !== 'completed'));
+        setQueue(prev => prev.filter(i => i.status !== 'completed' && i.status !== 'skipped'));
     }, []);
 
     return { queue, uploadFiles, removeFile, clearCompleted };
@@ -0,0 +1,144 @@
+import { useState, useEffect, useCallback, useRef } from 'react';
+import axios from 'axios';
+import type { Game } from '../App';
+
+export type LibrarySort = 'relevance' | 'title' | 'serial' | 'size' | 'release';
+export type LibraryFacets = Record<string, Record<string, number>>;
+
+export interface LibraryFilters {
+    region?: string | null;
+    genre?: string | null;
+    developer?: string | null;
+}
+
+interface SearchPage {
+    items: Game[];
+    total: number;
+    facets: LibraryFacets;
+    next_cursor: string | null;
+    sort: LibrarySort;
+    library: string | null;
+    revision: number | null;
+}
+
+interface LibraryChanges {
+    library: string | null;
+    revision: number;
+    reset: boolean;
+    upserts: Game[];
+    deleted: string[];
+}
+
+const PAGE_SIZE = 120;
+// How often to check for changes made by other clients (an unchanged library is a 304)
+const SYNC_INTERVAL_MS = 10000;
+
+// Pages through /library/search; the server does the matching, sorting and facet counts
+export const useLibrarySearch = (query: string | null, filters: LibraryFilters, sort: LibrarySort | null, descending: boolean) => {
+    const [games, setGames] = useState<Game[]>([]);
+    const [total, setTotal] = useState(0);
+    const [facets, setFacets] = useState<LibraryFacets>({});
+    const [activeSort, setActiveSort] = useState<LibrarySort | null>(null);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [loading, setLoading] = useState(false);
+    const [refreshCount, setRefreshCount] = useState(0);
+
+    // Bumped on every new search so late pages from an older one are dropped
+    const generation = useRef(0);
+    const inFlight = useRef(false);
+    // Library revision the loaded rows are from, to ask /library/changes what's new since
+    const synced = useRef<{ library: string; revision: number } | null>(null);
+    const loaded = useRef<Game[]>([]);
+    loaded.current = games;
+    const { region, genre, developer } = filters;
+
+    const fetchPage = useCallback(async (cursor: string | null) => {
+        const requestGeneration = generation.current;
+        inFlight.current = true;
+        setLoading(true);
+        try {
+            const response = await axios.get<SearchPage>('/library/search', {
+                params: {
+                    q: query || undefined,
+                    region: region || undefined,
+                    genre: genre || undefined,
+                    developer: developer || undefined,
+                    sort: sort || undefined,
+                    order: descending ? 'desc' : 'asc',
+                    cursor: cursor || undefined,
+                    limit: PAGE_SIZE
+                }
+            });
+            if (requestGeneration !== generation.current) return;
+
+            const page = response.data;
+            // Later pages may be newer than the first; changes are followed from the first page's revision
+            if (!cursor) synced.current = page.library && page.revision !== null ? { library: page.library, revision: page.revision } : null;
+            setGames(prev => cursor ? [...prev, ...page.items] : page.items);
+            setTotal(page.total);
+            setFacets(page.facets);
+            setActiveSort(page.sort);
+            setNextCursor(page.next_cursor);
+        } catch (error) {
+            console.error("Failed to search library: ", error);
+        } finally {
+            if (requestGeneration === generation.current) {
+                inFlight.current = false;
+                setLoading(false);
+            }
+        }
+    }, [query, region, genre, developer, sort, descending]);
+
+    useEffect(() => {
+        generation.current += 1;
+        synced.current = null;
+        setNextCursor(null);
+        fetchPage(null);
+    }, [fetchPage, refreshCount]);
+
+    const loadMore = useCallback(() => {
+        if (!inFlight.current && nextCursor) fetchPage(nextCursor);
+    }, [fetchPage, nextCursor]);
+
+    const research = useCallback(() => setRefreshCount(count => count + 1), []);
+
+    // Updates to games already on screen are patched in place; anything that can
+    // move rows, totals or facets (new games, deletions, a reset) reruns the search
+    const refresh = useCallback(async () => {
+        const since = synced.current;
+        if (!since) {
+            // A search already under way will come back with the latest rows
+            if (!inFlight.current) research();
+            return;
+        }
+        try {
+            const response = await axios.get<LibraryChanges>('/library/changes', {
+                params: { since: since.revision, library: since.library }
+            });
+            const changes = response.data;
+            if (synced.current !== since || changes.revision === since.revision) return;
+
+            const updates = new Map(changes.upserts.map(game => [game.serial, game]));
+            const loadedSerials = new Set(loaded.current.map(game => game.serial));
+            if (changes.reset || changes.deleted.length > 0 || changes.upserts.some(game => !loadedSerials.has(game.serial))) {
+                return research();
+            }
+            synced.current = changes.library ? { library: changes.library, revision: changes.revision } : null;
+            setGames(prev => prev.map(game => updates.get(game.serial) ?? game));
+        } catch (error) {
+            console.error("Failed to sync library: ", error);
+        }
+    }, [research]);
+
+    useEffect(() => {
+        const poll = () => { if (document.visibilityState === 'visible') refresh(); };
+        const interval = setInterval(poll, SYNC_INTERVAL_MS);
+        document.addEventListener('visibilitychange', poll);
+        return () => {
+            clearInterval(interval);
+            document.removeEventListener('visibilitychange', poll);
+        };
+    }, [refresh]);
+
+    return { games, total, facets, activeSort, loading, hasMore: nextCursor !== null, loadMore, refresh };
+};
@@ -0,0 +1,203 @@
+import os
+import re
+import hashlib
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+# artwork.py
+# Serves the art already saved on the library drive (ART/{serial}_COV.jpg,
+# ART/{serial}_ICO.png) plus size-bucketed thumbnails rendered once into a
+# local cache, so browsers never have to go to GitHub for covers. Also owns
+# the resize that turns downloaded covers into OPL-sized ART files.
+
+THUMB_CACHE_DIR = './data/art_cache'
+COVER_CACHE_DIR = './data/cover_cache'
+# What OPL expects for ART/{serial}_COV.jpg
+OPL_COVER_SIZE = (140, 200)
+# Requested widths are rounded up to one of these so the cache stays small
+THUMB_WIDTHS = (160, 240, 360, 480, 720)
+GRID_THUMB_WIDTH = 360
+# PS2 case art is 2:3
+THUMB_ASPECT = 1.5
+THUMB_QUALITY = 82
+
+KINDS = {
+    "cover": "{serial}_COV.jpg",
+    "disc": "{serial}_ICO.png",
+}
+MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+}
+SERIAL_RE = re.compile(r'[A-Za-z]{4}_\d{3}\.\d{2}')
+
+class Artwork:
+    """A servable image: where it is on disk, its strong ETag and media type."""
+
+    def __init__(self, path, etag, media_type, version):
+        self.path = path
+        self.etag = etag
+        self.media_type = media_type
+        self.version = version
+
+_digest_cache = {}
+_width_cache = {}
+_digest_lock = threading.Lock()
+
+def file_version(stat) -> str:
+    """Cheap change token (mtime + size) used to version art URLs."""
+    return f"{stat.st_mtime_ns:x}{stat.st_size:x}"
+
+def content_digest(path, stat) -> str:
+    """SHA-1 of the file contents, remembered until the file changes."""
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with _digest_lock:
+        digest = _digest_cache.get(key)
+    if digest is None:
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                sha1.update(block)
+        digest = sha1.hexdigest()
+        with _digest_lock:
+            _digest_cache[key] = digest
+    return digest
+
+def source_width(path, stat) -> int:
+    """Pixel width of an image (read from its header), remembered until the file changes."""
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with _digest_lock:
+        width = _width_cache.get(key)
+    if width is None:
+        with Image.open(path) as img:
+            width = img.width
+        with _digest_lock:
+            _width_cache[key] = width
+    return width
+
+def bucket_width(width) -> int:
+    for bucket in THUMB_WIDTHS:
+        if width <= bucket:
+            return bucket
+    return THUMB_WIDTHS[-1]
+
+def source_path(lib_path, serial, kind):
+    if not lib_path or kind not in KINDS or not SERIAL_RE.fullmatch(serial):
+        return None
+    return os.path.join(lib_path, "ART", KINDS[kind].format(serial=serial))
+
+def resolve(lib_path, serial, kind, width=None, accept=""):
+    """
+    Returns the Artwork to send for a request, rendering a thumbnail first if
+    a width was asked for. None if we don't have that art.
+    """
+    path = source_path(lib_path, serial, kind)
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    version = file_version(stat)
+    digest = content_digest(path, stat)
+    # Thumbnails never upscale, so a bucket as wide as the source (OPL covers
+    # are only 140 px) would just be a re-encoded copy; send the original
+    if not width or bucket_width(width) >= source_width(path, stat):
+        return Artwork(path, f'"{digest}"', MEDIA_TYPES.get(os.path.splitext(path)[1], "application/octet-stream"), version)
+
+    # Thumbnails are keyed by the source's content, so a changed cover never reuses a stale one
+    width = bucket_width(width)
+    ext = ".webp" if "image/webp" in accept else ".jpg"
+    thumb_path = os.path.join(THUMB_CACHE_DIR, f"{digest}_{width}{ext}")
+    if not os.path.exists(thumb_path):
+        render_thumbnail(path, thumb_path, width)
+    return Artwork(thumb_path, f'"{digest}-{width}{ext}"', MEDIA_TYPES[ext], version)
+
+def render_thumbnail(src_path, thumb_path, width):
+    height = int(width * THUMB_ASPECT)
+    os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+
+    with Image.open(src_path) as img:
+        # JPEG can decode straight to a smaller scale, far cheaper than a full decode
+        img.draft('RGB', (width, height))
+        img.thumbnail((width, height), Image.LANCZOS)
+        if thumb_path.endswith(".webp"):
+            img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+            fmt = 'WEBP'
+        else:
+            img = img.convert('RGB')
+            fmt = 'JPEG'
+
+        # Concurrent requests for the same thumbnail each render; the last rename wins
+        tmp_path = f"{thumb_path}.{threading.get_ident()}.tmp"
+        img.save(tmp_path, fmt, quality=THUMB_QUALITY)
+    os.replace(tmp_path, thumb_path)
+
+def library_art_versions(lib_path) -> dict:
+    """{filename: version} for everything in ART/, from a single directory scan."""
+    art_dir = os.path.join(lib_path, "ART") if lib_path else None
+    if not art_dir or not os.path.isdir(art_dir):
+        return {}
+    with os.scandir(art_dir) as entries:
+        return {entry.name: file_version(entry.stat()) for entry in entries if entry.is_file()}
+
+def art_url(serial, kind, version, width=None) -> str:
+    url = f"/art/{serial}/{kind}?v={version}"
+    if width:
+        url += f"&w={width}"
+    return url
+
+def resize_cover(content, size=OPL_COVER_SIZE) -> bytes:
+    """
+    Turns downloaded cover bytes into an OPL-sized JPEG. JPEG sources are
+    draft-decoded at 1/2-1/8 scale (never below 2x the target) so the final
+    LANCZOS pass works on a fraction of the pixels.
+    """
+    with Image.open(io.BytesIO(content)) as img:
+        img.draft('RGB', (size[0] * 2, size[1] * 2))
+        resized_img = img.resize(size, Image.Resampling.LANCZOS)
+        if resized_img.mode != 'RGB':
+            resized_img = resized_img.convert('RGB')
+        out = io.BytesIO()
+        resized_img.save(out, format='JPEG')
+        return out.getvalue()
+
+class CoverProcessor:
+    """
+    Cover post-processing stage. Resizes run on their own pool so downloads
+    never wait behind CPU work. Results are cached by the source's SHA-256,
+    so covers shared between serials are only resized once.
+    """
+
+    def __init__(self, workers=2, cache_dir=COVER_CACHE_DIR, size=OPL_COVER_SIZE):
+        self.cache_dir = cache_dir
+        self.size = size
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='covers')
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def process(self, content) -> bytes:
+        return self.submit(content).result()
+
+    def submit(self, content):
+        """Returns a future for the resized cover."""
+        return self.pool.submit(self._process, content)
+
+    def _process(self, content):
+        source_hash = hashlib.sha256(content).hexdigest()
+        cache_path = os.path.join(self.cache_dir, f"{source_hash}_{self.size[0]}x{self.size[1]}.jpg")
+        try:
+            with open(cache_path, 'rb') as f:
+                return f.read()
+        except OSError:
+            pass
+
+        data = resize_cover(content, self.size)
+        tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, cache_path)
+        return data
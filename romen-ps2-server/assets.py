@@ -0,0 +1,149 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+
+# assets.py
+# Shared fetcher for cover art, disc icons and CFG files. One pooled HTTP
+# session, bounded concurrency, conditional revalidation and an on-disk,
+# content-addressed cache (including "upstream doesn't have it" answers).
+
+CACHE_DIR = './data/asset_cache'
+MAX_CONNECTIONS = 8
+REQUEST_TIMEOUT = (5, 20)
+# Cached responses younger than this are used without asking upstream
+FRESH_SECONDS = 24 * 60 * 60
+# How long a 404 is remembered before we ask again
+NEGATIVE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+class AssetFetcher:
+    def __init__(self, cache_dir=CACHE_DIR, max_connections=MAX_CONNECTIONS, timeout=REQUEST_TIMEOUT,
+                 fresh_seconds=FRESH_SECONDS, negative_ttl=NEGATIVE_TTL_SECONDS, session=None):
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.fresh_seconds = fresh_seconds
+        self.negative_ttl = negative_ttl
+        self.max_connections = max_connections
+
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.pool = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix='assets')
+
+        os.makedirs(os.path.join(cache_dir, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, 'index.db'), check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS assets (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                missing INTEGER NOT NULL DEFAULT 0,
+                checked_at REAL NOT NULL
+            )
+        ''')
+        self._conn.commit()
+
+    def fetch(self, url) -> bytes:
+        """
+        Returns the body at url, from cache when possible, or None if upstream
+        doesn't have it (or can't be reached and nothing is cached).
+        """
+        entry = self._lookup(url)
+        now = time.time()
+        cached = self._read_object(entry['sha256']) if entry and entry['sha256'] else None
+
+        if entry and entry['missing'] and now - entry['checked_at'] < self.negative_ttl:
+            return None
+        if cached is not None and now - entry['checked_at'] < self.fresh_seconds:
+            return cached
+
+        headers = {}
+        if cached is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"[Assets] Request failed for {url}: {e}")
+            return cached
+
+        if response.status_code == 304 and cached is not None:
+            self._touch(url, now)
+            return cached
+
+        if response.status_code == 404:
+            self._record(url, None, None, None, True, now)
+            return None
+
+        if response.status_code != 200:
+            print(f"[Assets] {url} returned HTTP {response.status_code}")
+            return cached
+
+        body = response.content
+        sha256 = self._write_object(body)
+        self._record(url, sha256, response.headers.get('ETag'), response.headers.get('Last-Modified'), False, now)
+        return body
+
+    def fetch_many(self, urls) -> dict:
+        """Fetches several URLs concurrently; returns {url: bytes or None}."""
+        urls = list(dict.fromkeys(urls))
+        return dict(zip(urls, self.pool.map(self.fetch, urls)))
+
+    def submit(self, fn, *args):
+        """Runs fn on the fetcher's bounded pool."""
+        return self.pool.submit(fn, *args)
+
+    # --- Cache storage ---
+
+    def _object_path(self, sha256):
+        return os.path.join(self.cache_dir, 'objects', sha256[:2], sha256)
+
+    def _read_object(self, sha256):
+        try:
+            with open(self._object_path(sha256), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_object(self, body):
+        sha256 = hashlib.sha256(body).hexdigest()
+        path = self._object_path(sha256)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        return sha256
+
+    def _lookup(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT sha256, etag, last_modified, missing, checked_at FROM assets WHERE url = ?', (url,)
+            ).fetchone()
+        if not row:
+            return None
+        return dict(zip(('sha256', 'etag', 'last_modified', 'missing', 'checked_at'), row))
+
+    def _record(self, url, sha256, etag, last_modified, missing, now):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO assets (url, sha256, etag, last_modified, missing, checked_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (url, sha256, etag, last_modified, int(missing), now)
+            )
+            self._conn.commit()
+
+    def _touch(self, url, now):
+        with self._lock:
+            self._conn.execute('UPDATE assets SET checked_at = ? WHERE url = ?', (now, url))
+            self._conn.commit()
@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import diskio
+
+# benchmarks/copy.py
+# Throughput and page cache footprint of copying an ISO-sized file: a plain
+# shutil.copyfile (what the commit step used to amount to) against
+# diskio.copy_file with read/write and with the kernel doing the copy.
+# Peak dirty memory is Dirty + Writeback from /proc/meminfo, sampled while
+# each copy runs. Point --dest at a USB stick to see the difference that matters.
+#
+#   python benchmarks/copy.py [--size-mb 2048] [--src DIR] [--dest DIR]
+
+MEMINFO_PATH = '/proc/meminfo'
+
+def dirty_bytes():
+    """Dirty + Writeback pages system-wide, or None off Linux."""
+    try:
+        with open(MEMINFO_PATH) as f:
+            fields = dict(line.split(':', 1) for line in f)
+    except OSError:
+        return None
+    return sum(int(fields[key].split()[0]) * 1024 for key in ('Dirty', 'Writeback'))
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+class DirtySampler:
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, dirty_bytes() or 0)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+def make_source(directory, size):
+    fd, path = tempfile.mkstemp(dir=directory, suffix='.iso')
+    block = os.urandom(1024 * 1024)
+    with os.fdopen(fd, 'wb') as f:
+        for _ in range(size // len(block)):
+            f.write(block)
+        f.flush()
+        os.fsync(f.fileno())
+    return path
+
+def shutil_copy(src, dest, args):
+    shutil.copyfile(src, dest)
+    # Durable like the others, or its number would only measure the page cache
+    with open(dest, 'rb+') as f:
+        os.fsync(f.fileno())
+
+def measure(label, copy, src, dest_dir, size, args):
+    dest = os.path.join(dest_dir, 'benchmark-copy.iso')
+    # Every run starts from a cold source
+    with open(src, 'rb') as f:
+        diskio.drop_cache(f.fileno())
+    rss_before = rss_bytes()
+    try:
+        with DirtySampler() as sampler:
+            start = time.perf_counter()
+            copy(src, dest, args)
+            elapsed = time.perf_counter() - start
+    finally:
+        if os.path.exists(dest):
+            os.remove(dest)
+    dirty = f"{sampler.peak / 1024 / 1024:8.0f} MB" if dirty_bytes() is not None else "     n/a"
+    print(f"{label:<28} {size / elapsed / 1024 / 1024:8.1f} MB/s  peak dirty {dirty}  "
+          f"rss +{max(0, rss_bytes() - rss_before) / 1024 / 1024:.0f} MB")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=2048)
+    parser.add_argument('--src', default=tempfile.gettempdir(), help="directory for the source file")
+    parser.add_argument('--dest', default=tempfile.gettempdir(), help="directory to copy into")
+    parser.add_argument('--window-mb', type=int, default=diskio.WRITEBACK_WINDOW // 1024 // 1024)
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    window = args.window_mb * 1024 * 1024
+    src = make_source(args.src, size)
+    print(f"{args.size_mb} MB from {args.src} to {args.dest}, {args.window_mb} MB writeback window")
+    try:
+        measure("shutil.copyfile", shutil_copy, src, args.dest, size, args)
+        measure("diskio, read/write", lambda s, d, a: diskio.copy_file(s, d, diskio.COPY_BUFFER_SIZE, window, kernel_copy=False),
+                src, args.dest, size, args)
+        measure("diskio, kernel copy", lambda s, d, a: diskio.copy_file(s, d, diskio.COPY_BUFFER_SIZE, window),
+                src, args.dest, size, args)
+    finally:
+        os.remove(src)
+
+if __name__ == '__main__':
+    main()
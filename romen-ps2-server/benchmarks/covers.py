@@ -0,0 +1,62 @@
+import os
+import io
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import artwork
+
+# benchmarks/covers.py
+# Covers/sec for the OPL cover resize: the old full decode + LANCZOS path
+# against draft decoding, single-threaded and spread over a pool.
+#
+#   python benchmarks/covers.py [--count 64] [--workers N]
+
+def make_sources(count, size=(700, 1000)):
+    """Noisy JPEGs roughly the size of the upstream cover scans."""
+    sources = []
+    for index in range(count):
+        img = Image.effect_noise(size, 40 + index % 32).convert('RGB')
+        out = io.BytesIO()
+        img.save(out, format='JPEG', quality=90)
+        sources.append(out.getvalue())
+    return sources
+
+def resize_full_decode(content):
+    # What download_cover did before the draft path
+    with Image.open(io.BytesIO(content)) as img:
+        resized_img = img.resize(artwork.OPL_COVER_SIZE, Image.Resampling.LANCZOS).convert('RGB')
+        out = io.BytesIO()
+        resized_img.save(out, format='JPEG')
+        return out.getvalue()
+
+def measure(label, run, count, workers=1):
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    per_second = count / elapsed
+    print(f"{label:<28} {per_second:8.1f} covers/s  {per_second / workers:8.1f} covers/s/core")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    sources = make_sources(args.count)
+    print(f"{args.count} covers, {len(sources[0]) // 1024} KB each, {args.workers} workers")
+
+    measure("full decode, 1 thread", lambda: [resize_full_decode(c) for c in sources], args.count)
+    measure("draft decode, 1 thread", lambda: [artwork.resize_cover(c) for c in sources], args.count)
+    with ThreadPoolExecutor(args.workers) as pool:
+        measure("draft decode, thread pool", lambda: list(pool.map(artwork.resize_cover, sources)), args.count, args.workers)
+    with ProcessPoolExecutor(args.workers) as pool:
+        # Warm the workers up so process start-up isn't counted
+        list(pool.map(artwork.resize_cover, sources[:args.workers]))
+        measure("draft decode, process pool", lambda: list(pool.map(artwork.resize_cover, sources)), args.count, args.workers)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database as db
+
+# benchmarks/titles.py
+# Title lookup latency: one SQLite connection + point query per call (how
+# query_title_by_serial used to work) against the in-memory title index,
+# for hits, misses that go through the fuzzy fallbacks, and a batch.
+#
+#   python benchmarks/titles.py [--lookups 20000]
+
+def sqlite_lookup(serial):
+    conn = sqlite3.connect(db.MAP_DB_LOCAL_PATH)
+    result = conn.execute('SELECT title FROM title_map WHERE serial = ?', (db.clean_serial(serial),)).fetchone()
+    conn.close()
+    return result[0] if result else None
+
+def measure(label, lookup, serials):
+    start = time.perf_counter()
+    for serial in serials:
+        lookup(serial)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed / len(serials) * 1e6:10.2f} us/lookup")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lookups', type=int, default=20000)
+    args = parser.parse_args()
+
+    if not os.path.exists(db.MAP_DB_LOCAL_PATH):
+        sys.exit(f"No title map at {db.MAP_DB_LOCAL_PATH}")
+
+    rng = random.Random(0)
+    start = time.perf_counter()
+    count = len(db.TITLES)
+    print(f"Loaded {count} titles in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    # Map serials (SLUS-20002) back to the on-disc form (SLUS_200.02)
+    listed = [serial for serial, _ in db._load_title_rows() if len(serial) == 10 and serial[4] == '-']
+    hits = [f"{s[:4]}_{s[5:8]}.{s[8:]}" for s in rng.choices(listed, k=args.lookups)]
+    misses = [f"SL{rng.choice('UE')}S_{rng.randint(0, 999):03d}.{rng.randint(0, 99):02d}" for _ in range(args.lookups)]
+
+    measure("sqlite, connection per call", sqlite_lookup, hits[:args.lookups // 10])
+    measure("index, exact hit", lambda s: db.query_title_by_serial(s, fuzzy=False), hits)
+    measure("index, hit (fuzzy on)", db.query_title_by_serial, hits)
+    measure("index, random serial (fuzzy)", db.query_title_by_serial, misses)
+
+    start = time.perf_counter()
+    db.query_titles_by_serials(hits[:500])
+    print(f"{'index, batch of 500':<32} {(time.perf_counter() - start) * 1000:10.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+import os
+import sys
+import time
+import zlib
+import socket
+import struct
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ingest
+
+# benchmarks/transport.py
+# Wall-clock time to get an image onto the server over a throttled local
+# link, sent raw, gzipped chunk by chunk the way the browser does it
+# (CompressionStream on each resumable chunk, raw when it doesn't shrink),
+# and as one gzip stream the way /upload/stream?encoding=gzip takes it.
+# The receiver inflates with ingest's decoders into an IngestWriter, so the
+# server's side of the cost is counted too.
+#
+# Synthetic images are random data with a share of zero padding per profile
+# (a guess at a typical disc); pass --image to measure a real one.
+#
+#   python benchmarks/transport.py [--link-mbps 160] [--size-mb 512] [--image PATH]
+
+PROFILES = {
+    # name: (full size in MB, share of the image that is zero padding)
+    "cd": (700, 0.35),
+    "dvd": (4480, 0.25),
+}
+# Mirrors useGameUploads: four chunks compressed at once, gzip's default level
+PARALLEL_CHUNKS = 4
+GZIP_LEVEL = 6
+MIN_TRANSPORT_SAVINGS = 0.05
+SEND_SLICE = 64 * 1024
+# Per-chunk framing on the wire: body length, encoded flag
+FRAME = struct.Struct('<IB')
+
+def make_image(directory, size, padding):
+    """Random 1 MB regions with every so often a zero one, so padding is spread out like on a disc."""
+    fd, path = tempfile.mkstemp(dir=directory, suffix='.iso')
+    region = 1024 * 1024
+    zeros = bytes(region)
+    with os.fdopen(fd, 'wb') as f:
+        owed = 0.0
+        for _ in range(size // region):
+            owed += padding
+            if owed >= 1:
+                owed -= 1
+                f.write(zeros)
+            else:
+                f.write(os.urandom(region))
+    return path
+
+class ThrottledLink:
+    """Sends over a socket no faster than rate bytes/s."""
+
+    def __init__(self, sock, rate):
+        self.sock = sock
+        self.rate = rate
+        self.sent = 0
+        self.start = time.perf_counter()
+
+    def send(self, data):
+        view = memoryview(data)
+        for offset in range(0, len(view), SEND_SLICE):
+            piece = view[offset:offset + SEND_SLICE]
+            ahead = (self.sent + len(piece)) / self.rate - (time.perf_counter() - self.start)
+            if ahead > 0:
+                time.sleep(ahead)
+            self.sock.sendall(piece)
+            self.sent += len(piece)
+
+def gzip_chunk(chunk):
+    packer = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    packed = packer.compress(chunk) + packer.flush()
+    return packed if len(packed) <= len(chunk) * (1 - MIN_TRANSPORT_SAVINGS) else None
+
+def read_chunks(path, chunk_size):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+def send_raw(link, path, chunk_size):
+    for chunk in read_chunks(path, chunk_size):
+        link.send(FRAME.pack(len(chunk), 0))
+        link.send(chunk)
+
+def send_chunked_gzip(link, path, chunk_size):
+    with ThreadPoolExecutor(PARALLEL_CHUNKS) as pool:
+        # zlib drops the GIL, so chunks compress in parallel while earlier ones are on the wire
+        for chunk, packed in zip(read_chunks(path, chunk_size), pool.map(gzip_chunk, read_chunks(path, chunk_size))):
+            body = packed if packed is not None else chunk
+            link.send(FRAME.pack(len(body), packed is not None))
+            link.send(body)
+
+def send_gzip_stream(link, path, chunk_size):
+    packer = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in read_chunks(path, chunk_size):
+        packed = packer.compress(chunk)
+        link.send(FRAME.pack(len(packed), 1))
+        link.send(packed)
+    tail = packer.flush()
+    link.send(FRAME.pack(len(tail), 1))
+    link.send(tail)
+
+def recv_exact(sock, length):
+    data = bytearray()
+    while len(data) < length:
+        piece = sock.recv(min(length - len(data), 1024 * 1024))
+        if not piece:
+            raise ConnectionError("Link closed early.")
+        data += piece
+    return bytes(data)
+
+def receive(sock, staging_dir, chunk_size, stream, result):
+    writer = ingest.IngestWriter(staging_dir, chunk_size)
+    decoder = ingest.TransportDecoder("gzip", chunk_size) if stream else None
+    try:
+        while True:
+            header = sock.recv(FRAME.size, socket.MSG_WAITALL)
+            if not header:
+                break
+            length, encoded = FRAME.unpack(header)
+            body = recv_exact(sock, length)
+            if decoder:
+                for piece in decoder.decode(body):
+                    writer.write(piece)
+            elif encoded:
+                writer.write(ingest.decode_body(body, "gzip", ingest.MAX_CHUNK_SIZE))
+            else:
+                writer.write(body)
+        if decoder:
+            writer.write(decoder.finish())
+        writer.close()
+        result["bytes"] = writer.bytes_written
+        result["crc32"] = writer.hasher.hexdigests()["crc32"]
+    finally:
+        writer.abort()
+
+def measure(label, send, path, args, stream=False):
+    receiver_sock, sender_sock = socket.socketpair()
+    result = {}
+    start = time.perf_counter()
+    receiver = threading.Thread(target=receive, args=(receiver_sock, args.staging, args.chunk_size, stream, result))
+    receiver.start()
+    link = ThrottledLink(sender_sock, args.link_mbps * 1e6 / 8)
+    send(link, path, args.chunk_size)
+    sender_sock.shutdown(socket.SHUT_WR)
+    receiver.join()
+    elapsed = time.perf_counter() - start
+    sender_sock.close()
+    receiver_sock.close()
+
+    size = os.path.getsize(path)
+    print(f"  {label:<20} {elapsed:8.2f} s  {size / elapsed / 1024 / 1024:7.1f} MB/s  "
+          f"wire {link.sent / 1024 / 1024:7.0f} MB ({link.sent / size:5.1%})")
+    return elapsed, result
+
+def run(name, path, full_size_mb, args):
+    size = os.path.getsize(path)
+    print(f"{name}: {size / 1024 / 1024:.0f} MB over a {args.link_mbps} Mbit/s link")
+    raw, expected = measure("raw", send_raw, path, args)
+    for label, send, stream in (("gzip, per chunk", send_chunked_gzip, False), ("gzip, one stream", send_gzip_stream, True)):
+        elapsed, result = measure(label, send, path, args, stream)
+        assert result == expected, f"{label} received a different image"
+        scale = full_size_mb * 1024 * 1024 / size
+        print(f"  {'':<20} {raw / elapsed:.2f}x the speed of raw; a full {full_size_mb} MB image "
+              f"{raw * scale:.0f} s -> {elapsed * scale:.0f} s")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--link-mbps', type=float, default=160, help="link speed in Mbit/s (160 is decent Wi-Fi)")
+    parser.add_argument('--size-mb', type=int, default=512, help="size of each synthetic image")
+    parser.add_argument('--chunk-mb', type=int, default=8)
+    parser.add_argument('--image', help="measure a real ISO instead of the synthetic profiles")
+    parser.add_argument('--staging', default=tempfile.gettempdir(), help="directory the receiver writes into")
+    args = parser.parse_args()
+    args.chunk_size = args.chunk_mb * 1024 * 1024
+
+    if args.image:
+        run(os.path.basename(args.image), args.image, os.path.getsize(args.image) // 1024 // 1024, args)
+        return
+    for name, (full_size_mb, padding) in PROFILES.items():
+        path = make_image(args.staging, args.size_mb * 1024 * 1024, padding)
+        try:
+            run(f"{name} ({padding:.0%} padding)", path, full_size_mb, args)
+        finally:
+            os.remove(path)
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,18 @@ class Config:
     COVERS_URL = ""
     DISCS_URL = ""
     CFG_URL = ""
+    INGEST_MODE = "stream"
+    INGEST_CHUNK_SIZE = 8 * 1024 * 1024
+    INGEST_WORKERS_PER_DEVICE = 1
+    INGEST_CPU_WORKERS = 2
+    INGEST_FINISH_WORKERS = 2
+    INGEST_WRITEBACK_SIZE = 32 * 1024 * 1024
+    INGEST_KERNEL_COPY = True
+    INGEST_TRANSPORT_COMPRESSION = True
+    COVER_WORKERS = 2
+    COMPRESSION_FORMAT = "iso"
+    COMPRESSION_WORKERS = 2
+    COMPRESSION_LEVEL = 9
 
     def __init__(self, json_data : list) -> None:
         self.update_entries(json_data)
@@ -16,3 +28,24 @@ class Config:
         self.COVERS_URL = json_data["paths"]["covers_url"]
         self.DISCS_URL = json_data["paths"]["discs_url"]
         self.CFG_URL = json_data["paths"]["cfg_url"]
+
+        # Ingest options are optional so older settings.json files still load
+        ingest = json_data.get("ingest", {})
+        self.INGEST_MODE = ingest.get("mode", "stream")
+        self.INGEST_CHUNK_SIZE = int(ingest.get("chunk_size_mb", 8)) * 1024 * 1024
+        self.INGEST_WORKERS_PER_DEVICE = int(ingest.get("workers_per_device", 1))
+        self.INGEST_CPU_WORKERS = int(ingest.get("cpu_workers", 2))
+        self.INGEST_FINISH_WORKERS = int(ingest.get("finish_workers", 2))
+        self.INGEST_WRITEBACK_SIZE = int(ingest.get("writeback_mb", 32)) * 1024 * 1024
+        self.INGEST_KERNEL_COPY = bool(ingest.get("kernel_copy", True))
+        # Lets browsers gzip upload chunks; worth it on Wi-Fi, where the link is slower than the CPU
+        self.INGEST_TRANSPORT_COMPRESSION = bool(ingest.get("transport_compression", True))
+
+        art = json_data.get("art", {})
+        self.COVER_WORKERS = int(art.get("cover_workers", 2))
+
+        # "zso" compresses games as they are ingested; "iso" stores them as uploaded
+        compression = json_data.get("compression", {})
+        self.COMPRESSION_FORMAT = compression.get("format", "iso")
+        self.COMPRESSION_WORKERS = int(compression.get("workers", 2))
+        self.COMPRESSION_LEVEL = int(compression.get("level", 9))
@@ -1,7 +1,17 @@
 import sqlite3
 import requests
+import threading
+import pathlib
+import json
 import os 
 import system
+import titles
+import titlemap
+import hashlib
+import base64
+import re
+import uuid
+from contextlib import contextmanager
 
 # database.py
 
@@ -9,6 +19,178 @@ import system
 # We ONLY keep the Map DB here because it lives in the app, not the USB drive.
 MAP_DB_LOCAL_PATH = './data/ps2_titlemap.db'
 MAP_FILE_URL = 'https://github.com/niemasd/GameDB-PS2/releases/latest/download/PS2.titles.json'
+# Shipped with the app, so the map can be built on first boot without the network
+MAP_SNAPSHOT_PATH = './data/ps2_titles.bin'
+# Optional newer title lists dropped in by the user; applied as diffs when they change
+MAP_SOURCE_PATHS = ('./data/PS2.titles.jsonl', './data/PS2.titles.json')
+# A list with fewer titles than this share of the current map is taken to be
+# truncated (a cut-off download, a half-written file) and isn't applied
+MAP_MIN_LISTED_SHARE = 0.5
+# Optional Redump-style hash list ({"SLUS-20002": {"crc32": ..., "md5": ..., "sha1": ...}})
+REFERENCE_HASHES_PATH = './data/PS2.hashes.json'
+
+# Columns added to the library table after its first release. Existing DBs
+# are migrated in place by initialize_library().
+LIBRARY_EXTRA_COLUMNS = [
+    ('crc32', 'TEXT'),
+    ('md5', 'TEXT'),
+    ('sha1', 'TEXT'),
+    ('mtime', 'REAL'),
+    ('region', 'TEXT'),
+    ('developer', 'TEXT'),
+    ('genre', 'TEXT'),
+    ('release', 'TEXT'),
+    ('revision', 'INTEGER'),
+    # size is the file on the drive; for ZSO images these record both sides
+    ('original_size', 'INTEGER'),
+    ('compressed_size', 'INTEGER'),
+    # ingest.image_fingerprint of the image, for duplicate checks before an upload
+    ('fingerprint', 'TEXT'),
+]
+
+# Change feed: every write to a library row bumps a per-library revision (by
+# trigger), and deletes leave a tombstone, so clients can fetch just what
+# changed since the revision they last saw. Beyond this many tombstones the
+# oldest are pruned and clients that far behind get a full reset instead.
+MAX_LIBRARY_TOMBSTONES = 10000
+
+# Full-text index over the library (external content, kept in sync by triggers)
+LIBRARY_FTS_COLUMNS = ('title', 'serial', 'region', 'developer', 'genre', 'release')
+# Columns /library/search can filter and count by
+SEARCH_FACETS = ('region', 'genre', 'developer')
+SEARCH_SORTS = {
+    'title': 'library.title COLLATE NOCASE',
+    'serial': 'library.serial',
+    'size': 'COALESCE(library.size, 0)',
+    'release': "COALESCE(library.release, '')",
+    'relevance': 'bm25(library_fts)',
+}
+SEARCH_PAGE_SIZE = 60
+MAX_SEARCH_PAGE_SIZE = 500
+MAX_FACET_VALUES = 50
+
+# Library DB tuning. WAL turns each commit into an append instead of a
+# rollback journal + fsync pair, which matters on USB sticks; synchronous=NORMAL
+# is still crash-safe in WAL mode (only the last commit can be lost on power cut).
+LIBRARY_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-8000',
+    'PRAGMA temp_store=MEMORY',
+    # INSERT OR REPLACE only fires the FTS delete trigger with this on
+    'PRAGMA recursive_triggers=ON',
+)
+# Per-connection prepared statement cache (sqlite3 reuses statements by SQL text)
+CACHED_STATEMENTS = 256
+
+class ConnectionManager:
+    """
+    Keeps one long-lived connection per database instead of opening a new one
+    for every query. Connections are shared between threads behind a lock.
+
+    The library connection follows get_db_path(): it is reopened when the
+    library path changes or the file disappears. The title map is opened
+    read-only; call reset_map() after writing to it through another connection.
+    """
+
+    def __init__(self):
+        self._library_lock = threading.RLock()
+        self._map_lock = threading.RLock()
+        self._library = None
+        self._library_path = None
+        self._map = None
+
+    @contextmanager
+    def library(self):
+        """Yields the shared library connection, or None if no library path is set."""
+        with self._library_lock:
+            yield self._library_connection()
+
+    @contextmanager
+    def batch(self):
+        """
+        Yields the library connection inside a single transaction. Everything
+        written in the block is committed together, or rolled back on error.
+        """
+        with self.library() as conn:
+            if conn is None:
+                raise sqlite3.OperationalError("No library path selected.")
+            with conn:
+                yield conn
+
+    @contextmanager
+    def title_map(self):
+        """Yields the read-only title map connection, or None if the map DB doesn't exist."""
+        with self._map_lock:
+            yield self._map_connection()
+
+    def close_library(self):
+        with self._library_lock:
+            if self._library is not None:
+                self._library.close()
+            self._library = None
+            self._library_path = None
+
+    def reset_map(self):
+        with self._map_lock:
+            if self._map is not None:
+                self._map.close()
+            self._map = None
+
+    def close(self):
+        self.close_library()
+        self.reset_map()
+
+    def _library_connection(self):
+        db_path = get_db_path()
+        if self._library is not None and (db_path != self._library_path or not os.path.exists(db_path)):
+            # Drive switched (set_library_path) or the DB was removed underneath us
+            self.close_library()
+        if not db_path:
+            return None
+
+        if self._library is None:
+            conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+            conn.row_factory = sqlite3.Row
+            for pragma in LIBRARY_PRAGMAS:
+                try:
+                    conn.execute(pragma)
+                except sqlite3.OperationalError as e:
+                    # e.g. filesystems without shared-memory support for WAL
+                    print(f"[DB Warning] {pragma} failed: {e}")
+            self._library = conn
+            self._library_path = db_path
+        return self._library
+
+    def _map_connection(self):
+        if self._map is None:
+            if not os.path.exists(MAP_DB_LOCAL_PATH):
+                return None
+            uri = pathlib.Path(os.path.abspath(MAP_DB_LOCAL_PATH)).as_uri() + '?mode=ro'
+            self._map = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+            self._map.row_factory = sqlite3.Row
+        return self._map
+
+CONNECTIONS = ConnectionManager()
+
+def _load_title_rows():
+    # The snapshot loads faster than a table scan, whenever it's what the map holds
+    try:
+        if os.path.exists(MAP_SNAPSHOT_PATH) and get_map_version('current') == titlemap.snapshot_version(MAP_SNAPSHOT_PATH):
+            return titlemap.read_snapshot(MAP_SNAPSHOT_PATH)[1].items()
+    except (titlemap.SnapshotError, OSError) as e:
+        print(f"[Map Warning] Ignoring title snapshot: {e}")
+
+    with CONNECTIONS.title_map() as conn:
+        if conn is None:
+            return []
+        try:
+            return conn.execute('SELECT serial, title FROM title_map').fetchall()
+        except sqlite3.OperationalError:
+            return []
+
+# The whole title map, held in memory (~13k rows)
+TITLES = titles.TitleIndex(_load_title_rows)
 
 # --- Helper: Get Dynamic Path ---
 
@@ -37,64 +219,306 @@ def initialize_library():
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir, exist_ok=True)
 
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS library (
-                serial TEXT PRIMARY KEY,
-                title TEXT NOT NULL,
-                filepath TEXT NOT NULL,
-                size INTEGER,
-                cover_url TEXT
+        with CONNECTIONS.batch() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS library (
+                    serial TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    filepath TEXT NOT NULL,
+                    size INTEGER,
+                    cover_url TEXT
+                )
+            ''')
+
+            # Migrate older libraries that predate the extra columns
+            cursor.execute('PRAGMA table_info(library)')
+            existing = {row[1] for row in cursor.fetchall()}
+            for name, col_type in LIBRARY_EXTRA_COLUMNS:
+                if name not in existing:
+                    cursor.execute(f'ALTER TABLE library ADD COLUMN {name} {col_type}')
+
+            # Region comes from the serial, so older rows can be filled in directly
+            missing_region = cursor.execute('SELECT serial FROM library WHERE region IS NULL').fetchall()
+            cursor.executemany(
+                'UPDATE library SET region = ? WHERE serial = ?',
+                [(titles.region_of(row[0]), row[0]) for row in missing_region if titles.region_of(row[0])]
             )
-        ''')
-        conn.commit()
-        conn.close()
+
+            _initialize_library_fts(cursor)
+            _initialize_library_revisions(cursor)
+
         print(f"[DB] Library initialized at: {db_path}")
     except (sqlite3.OperationalError, OSError) as e:
         print(f"[DB Init Error] Could not initialize library at {db_path}: {e}")
 
+def _initialize_library_fts(cursor):
+    columns = ', '.join(LIBRARY_FTS_COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column in LIBRARY_FTS_COLUMNS)
+    old_values = ', '.join(f'old.{column}' for column in LIBRARY_FTS_COLUMNS)
+
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'library_fts'").fetchone()
+    try:
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS library_fts USING fts5(
+                {columns}, content='library', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5; search falls back to LIKE
+        print(f"[DB Warning] Full-text search unavailable: {e}")
+        return
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS library_fts_insert AFTER INSERT ON library BEGIN
+            INSERT INTO library_fts (rowid, {columns}) VALUES (new.rowid, {new_values});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS library_fts_delete AFTER DELETE ON library BEGIN
+            INSERT INTO library_fts (library_fts, rowid, {columns}) VALUES ('delete', old.rowid, {old_values});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS library_fts_update AFTER UPDATE OF {columns} ON library BEGIN
+            INSERT INTO library_fts (library_fts, rowid, {columns}) VALUES ('delete', old.rowid, {old_values});
+            INSERT INTO library_fts (rowid, {columns}) VALUES (new.rowid, {new_values});
+        END
+    ''')
+    if not exists:
+        # Index whatever the library already holds
+        cursor.execute("INSERT INTO library_fts (library_fts) VALUES ('rebuild')")
+
+def _initialize_library_revisions(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS library_sync (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            library_id TEXT NOT NULL,
+            revision INTEGER NOT NULL,
+            pruned_revision INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('CREATE TABLE IF NOT EXISTS library_tombstones (serial TEXT PRIMARY KEY, revision INTEGER NOT NULL)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS library_revision ON library (revision)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS library_tombstones_revision ON library_tombstones (revision)')
+    # The library ID tells clients apart a different drive (or a recreated DB) with similar revision numbers
+    cursor.execute('INSERT OR IGNORE INTO library_sync (id, library_id, revision) VALUES (0, ?, 0)', (uuid.uuid4().hex,))
+
+    # Rows from before the change feed all count as changed in one revision
+    if cursor.execute('SELECT 1 FROM library WHERE revision IS NULL LIMIT 1').fetchone():
+        cursor.execute('UPDATE library_sync SET revision = revision + 1')
+        cursor.execute('UPDATE library SET revision = (SELECT revision FROM library_sync) WHERE revision IS NULL')
+
+    # Recreated each time so the update trigger covers migrated columns too
+    cursor.execute('PRAGMA table_info(library)')
+    columns = [row[1] for row in cursor.fetchall() if row[1] != 'revision']
+    changed = ' OR '.join(f'old.{column} IS NOT new.{column}' for column in columns)
+    for trigger in ('library_revision_insert', 'library_revision_update', 'library_revision_delete'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    cursor.execute('''
+        CREATE TRIGGER library_revision_insert AFTER INSERT ON library BEGIN
+            UPDATE library_sync SET revision = revision + 1;
+            UPDATE library SET revision = (SELECT revision FROM library_sync) WHERE rowid = new.rowid;
+            DELETE FROM library_tombstones WHERE serial = new.serial;
+        END
+    ''')
+    # Skips writes that change nothing, and its own revision update
+    cursor.execute(f'''
+        CREATE TRIGGER library_revision_update AFTER UPDATE ON library
+        WHEN old.revision IS new.revision AND ({changed}) BEGIN
+            UPDATE library_sync SET revision = revision + 1;
+            UPDATE library SET revision = (SELECT revision FROM library_sync) WHERE rowid = new.rowid;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER library_revision_delete AFTER DELETE ON library BEGIN
+            UPDATE library_sync SET revision = revision + 1;
+            INSERT OR REPLACE INTO library_tombstones (serial, revision) VALUES (old.serial, (SELECT revision FROM library_sync));
+        END
+    ''')
+
+    # Keep the tombstone list bounded; clients from before the cut get a reset
+    excess = cursor.execute('SELECT COUNT(*) FROM library_tombstones').fetchone()[0] - MAX_LIBRARY_TOMBSTONES
+    if excess > 0:
+        cutoff = cursor.execute(
+            'SELECT revision FROM library_tombstones ORDER BY revision LIMIT 1 OFFSET ?', (excess - 1,)
+        ).fetchone()[0]
+        cursor.execute('DELETE FROM library_tombstones WHERE revision <= ?', (cutoff,))
+        cursor.execute('UPDATE library_sync SET pruned_revision = MAX(pruned_revision, ?)', (cutoff,))
+
+def has_library_fts(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'library_fts'").fetchone() is not None
+
 def initialize_map():
+    """Downloads the full GameDB title list. Only used when no snapshot ships with the app."""
     try:
         response = requests.get(MAP_FILE_URL, verify=True)
         response.raise_for_status()
         data = response.json()
         print(f"Loaded {len(data)} entries from mapping database.")
-        
-        db_dir = os.path.dirname(MAP_DB_LOCAL_PATH)
-        if db_dir and not os.path.exists(db_dir):
-            os.makedirs(db_dir, exist_ok=True)
+
+        update_title_map(data.items(), 'download', hashlib.sha256(response.content).hexdigest())
+    except Exception as e:
+        print(f"[Map Init Error] Failed to initialize map: {e}")
+
+def update_title_map(entries, source, version):
+    """
+    Applies a full title list to title_map as a diff: only new or renamed
+    serials are written and serials no longer listed are removed, all in one
+    transaction. Skipped when `source` was last applied at this same version,
+    or when the list is much shorter than the map (see MAP_MIN_LISTED_SHARE).
+    Returns the number of rows changed, or None if nothing was applied.
+    """
+    db_dir = os.path.dirname(MAP_DB_LOCAL_PATH)
+    if db_dir and not os.path.exists(db_dir):
+        os.makedirs(db_dir, exist_ok=True)
+
+    conn = sqlite3.connect(MAP_DB_LOCAL_PATH)
+    try:
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS title_map (
+                    serial TEXT PRIMARY KEY,
+                    title TEXT NOT NULL
+                )
+            ''')
+            conn.execute('CREATE TABLE IF NOT EXISTS map_meta (key TEXT PRIMARY KEY, value TEXT)')
+
+            applied = conn.execute('SELECT value FROM map_meta WHERE key = ?', (source,)).fetchone()
+            if applied and applied[0] == version:
+                return None
+
+            # Whatever is left in `existing` after the walk is no longer listed
+            existing = dict(conn.execute('SELECT serial, title FROM title_map'))
+            mapped = len(existing)
+            changed = []
+            listed = 0
+            for serial, title in entries:
+                serial = clean_serial(serial)
+                if not serial or not title:
+                    continue
+                listed += 1
+                if existing.pop(serial, None) != title:
+                    changed.append((serial, title))
+
+            if listed < mapped * MAP_MIN_LISTED_SHARE:
+                print(f"[DB] Ignoring title list from {source}: {listed} titles against {mapped} mapped, it looks truncated.")
+                return None
+
+            conn.executemany('INSERT OR REPLACE INTO title_map (serial, title) VALUES (?, ?)', changed)
+            conn.executemany('DELETE FROM title_map WHERE serial = ?', [(serial,) for serial in existing])
+            conn.executemany(
+                'INSERT OR REPLACE INTO map_meta (key, value) VALUES (?, ?)',
+                [(source, version), ('current', version)]
+            )
+    finally:
+        conn.close()
+
+    CONNECTIONS.reset_map()
+    TITLES.invalidate()
+    print(f"[DB] Title map updated from {source}: {len(changed)} changed, {len(existing)} removed.")
+    return len(changed) + len(existing)
+
+def update_title_map_offline():
+    """
+    Brings the map up to date from local files only: the bundled snapshot,
+    then any PS2.titles.json(l) in the data folder. Each is skipped unless it
+    changed since it was last applied.
+    """
+    if os.path.exists(MAP_SNAPSHOT_PATH):
+        try:
+            version = titlemap.snapshot_version(MAP_SNAPSHOT_PATH)
+            if get_map_version('snapshot') != version:
+                _, snapshot = titlemap.read_snapshot(MAP_SNAPSHOT_PATH)
+                update_title_map(snapshot.items(), 'snapshot', version)
+        except (titlemap.SnapshotError, OSError, sqlite3.Error) as e:
+            print(f"[Map Init Error] Failed to apply title snapshot: {e}")
+
+    for source_path in MAP_SOURCE_PATHS:
+        if not os.path.exists(source_path):
+            continue
+        try:
+            source = os.path.basename(source_path)
+            version = titlemap.file_version(source_path)
+            if get_map_version(source) != version:
+                update_title_map(titlemap.iter_source(source_path), source, version)
+        except (ValueError, OSError, sqlite3.Error) as e:
+            print(f"[Map Init Error] Failed to apply {source_path}: {e}")
+
+def get_map_version(source):
+    """Version of `source` last applied to the map ('current' for whatever applied last)."""
+    try:
+        with CONNECTIONS.title_map() as conn:
+            if conn is None: return None
+            result = conn.execute('SELECT value FROM map_meta WHERE key = ?', (source,)).fetchone()
+        return result[0] if result else None
+    except sqlite3.OperationalError:
+        # Maps from before versioning have no map_meta table
+        return None
+
+def import_reference_hashes(json_path=REFERENCE_HASHES_PATH):
+    """
+    Loads a serial -> {crc32, md5, sha1} JSON file (e.g. exported from the
+    Redump data GameDB-PS2 is built on) into the map DB for verification.
+    """
+    if not os.path.exists(json_path):
+        return 0
+
+    try:
+        with open(json_path, 'r') as f:
+            data = json.load(f)
+
+        rows = [
+            (clean_serial(serial), h.get('crc32'), h.get('md5'), h.get('sha1'))
+            for serial, h in data.items()
+        ]
 
         conn = sqlite3.connect(MAP_DB_LOCAL_PATH)
         cursor = conn.cursor()
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS title_map (
+            CREATE TABLE IF NOT EXISTS reference_hashes (
                 serial TEXT PRIMARY KEY,
-                title TEXT NOT NULL
+                crc32 TEXT,
+                md5 TEXT,
+                sha1 TEXT
             )
         ''')
-        
-        # Use executemany for faster insertion
-        game_list = [(k, v) for k, v in data.items()]
-        cursor.executemany('INSERT OR REPLACE INTO title_map (serial, title) VALUES (?, ?)', game_list)
-        
+        cursor.executemany('INSERT OR REPLACE INTO reference_hashes (serial, crc32, md5, sha1) VALUES (?, ?, ?, ?)', rows)
         conn.commit()
         conn.close()
+        CONNECTIONS.reset_map()
+        print(f"[DB] Loaded {len(rows)} reference hashes.")
+        return len(rows)
     except Exception as e:
-        print(f"[Map Init Error] Failed to initialize map: {e}")
+        print(f"[Map Init Error] Failed to load reference hashes: {e}")
+        return 0
 
 # --- Query Functions ---
 
-def query_title_by_serial(serial):
-    cleanSerial = clean_serial(serial)
-    if not os.path.exists(MAP_DB_LOCAL_PATH): return None
+def query_title_by_serial(serial, fuzzy=True):
+    """
+    Title for a serial from the in-memory index. With fuzzy, serials missing
+    from the map fall back to region prefix variants, multi-disc siblings and
+    single-digit typos (see titles.TitleIndex.match).
+    """
+    match = TITLES.match(clean_serial(serial), fuzzy)
+    return match.title if match else None
+
+def query_titles_by_serials(serials, fuzzy=True):
+    """Batch form of query_title_by_serial: {serial: title} for the serials that matched."""
+    found = {}
+    for serial in serials:
+        match = TITLES.match(clean_serial(serial), fuzzy)
+        if match:
+            found[serial] = match.title
+    return found
+
+def query_reference_hashes(serial):
     try:
-        conn = sqlite3.connect(MAP_DB_LOCAL_PATH)
-        cursor = conn.cursor()
-        cursor.execute('SELECT title FROM title_map WHERE serial = ?', (cleanSerial,))
-        result = cursor.fetchone()
-        conn.close()
-        return result[0] if result else None
+        with CONNECTIONS.title_map() as conn:
+            if conn is None: return None
+            result = conn.execute('SELECT crc32, md5, sha1 FROM reference_hashes WHERE serial = ?', (clean_serial(serial),)).fetchone()
+        return dict(result) if result else None
     except sqlite3.OperationalError:
         return None
 
@@ -105,12 +529,8 @@ def query_library_by_serial(serial):
         return None
 
     try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM library WHERE serial = ?', (serial,))
-        result = cursor.fetchone()
-        conn.close()
+        with CONNECTIONS.library() as conn:
+            result = conn.execute('SELECT * FROM library WHERE serial = ?', (serial,)).fetchone()
         return dict(result) if result else None
     except sqlite3.OperationalError:
         return None
@@ -126,14 +546,9 @@ def get_all_games():
         print(f"[DB Warning] Library DB file not found at {db_path}")
         return []
 
-    conn = None
     try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row 
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM library")
-        rows = cursor.fetchall()
+        with CONNECTIONS.library() as conn:
+            rows = conn.execute("SELECT * FROM library").fetchall()
         
         # Convert rows to list of dicts
         return [dict(row) for row in rows]
@@ -144,49 +559,362 @@ def get_all_games():
     except Exception as e:
         print(f"[DB Error] Unexpected error: {e}")
         return []
-    finally:
-        if conn: conn.close()
+
+def get_library_revision():
+    """Returns (library_id, revision) for the current library, or None."""
+    db_path = get_db_path()
+    if not db_path or not os.path.exists(db_path):
+        return None
+
+    try:
+        with CONNECTIONS.library() as conn:
+            row = conn.execute('SELECT library_id, revision FROM library_sync').fetchone()
+        return (row[0], row[1]) if row else None
+    except sqlite3.OperationalError:
+        return None
+
+def get_library_changes(since=0, library_id=None):
+    """
+    Returns what changed after revision `since`:
+    {library, revision, reset, upserts: [rows], deleted: [serials]}.
+    When `since` can't be brought forward (another library, or tombstones
+    already pruned), reset is True and upserts holds the whole library.
+    """
+    db_path = get_db_path()
+    if not db_path or not os.path.exists(db_path):
+        return None
+
+    try:
+        # Writers share this connection, so holding it keeps the rows in step with the revision
+        with CONNECTIONS.library() as conn:
+            state = conn.execute('SELECT library_id, revision, pruned_revision FROM library_sync').fetchone()
+            if state is None:
+                return None
+            current_id, revision, pruned = state
+            reset = library_id != current_id or since < pruned or since > revision
+            if reset:
+                upserts = conn.execute('SELECT * FROM library').fetchall()
+                deleted = []
+            else:
+                upserts = conn.execute('SELECT * FROM library WHERE revision > ?', (since,)).fetchall()
+                deleted = conn.execute('SELECT serial FROM library_tombstones WHERE revision > ?', (since,)).fetchall()
+    except sqlite3.OperationalError as e:
+        print(f"[DB Error] Failed to read library changes: {e}")
+        return None
+
+    return {
+        "library": current_id,
+        "revision": revision,
+        "reset": reset,
+        "upserts": [dict(row) for row in upserts],
+        "deleted": [row[0] for row in deleted],
+    }
+
+def mark_games_changed(serials):
+    """Bumps the revision of games whose files changed outside the table (new art, for example)."""
+    db_path = get_db_path()
+    if not db_path or not os.path.exists(db_path):
+        return False
+
+    try:
+        with CONNECTIONS.batch() as conn:
+            conn.execute('UPDATE library_sync SET revision = revision + 1')
+            conn.executemany(
+                'UPDATE library SET revision = (SELECT revision FROM library_sync) WHERE serial = ?',
+                [(serial,) for serial in serials]
+            )
+        return True
+    except sqlite3.Error as e:
+        print(f"[DB] Error marking games changed: {e}")
+        return False
 
 # --- Add/Remove Funcs ---
 
-def add_game_to_library(serial, title, filepath, size=None, cover_url=None):
+def add_game_to_library(serial, title, filepath, size=None, cover_url=None, hashes=None, mtime=None,
+                        original_size=None, compressed_size=None, fingerprint=None):
     db_path = get_db_path()
     if not db_path:
         print("[DB Error] Cannot add game: No library path selected.")
         return False
 
+    hashes = hashes or {}
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            INSERT OR REPLACE INTO library (serial, title, filepath, size, cover_url)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (serial, title, filepath, size, cover_url))
+        with CONNECTIONS.batch() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO library (serial, title, filepath, size, cover_url, crc32, md5, sha1, mtime, region,
+                                                original_size, compressed_size, fingerprint)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (serial, title, filepath, size, cover_url, hashes.get('crc32'), hashes.get('md5'), hashes.get('sha1'), mtime, titles.region_of(serial),
+                  original_size, compressed_size, fingerprint))
 
-        conn.commit()
         print(f"[DB] Added {title} ({serial}) to library.")
         return True
     
     except sqlite3.Error as e:
         print(f"[DB] Error adding game: {e}")
         return False
-    finally:
-        if conn: conn.close()
 
-def remove_game_from_library(serial):
+def update_game_hashes(serial, hashes):
     db_path = get_db_path()
     if not db_path or not os.path.exists(db_path):
         return False
 
-    conn = None
     try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        with CONNECTIONS.batch() as conn:
+            cursor = conn.execute(
+                'UPDATE library SET crc32 = ?, md5 = ?, sha1 = ? WHERE serial = ?',
+                (hashes.get('crc32'), hashes.get('md5'), hashes.get('sha1'), serial)
+            )
+        return cursor.rowcount > 0
+    except sqlite3.Error as e:
+        print(f"[DB] Error updating hashes: {e}")
+        return False
 
-        cursor.execute('DELETE FROM library WHERE serial = ?', (serial,))
-        conn.commit()
+def update_game_fingerprint(serial, fingerprint):
+    db_path = get_db_path()
+    if not db_path or not os.path.exists(db_path):
+        return False
+
+    try:
+        with CONNECTIONS.batch() as conn:
+            cursor = conn.execute('UPDATE library SET fingerprint = ? WHERE serial = ?', (fingerprint, serial))
+        return cursor.rowcount > 0
+    except sqlite3.Error as e:
+        print(f"[DB] Error updating fingerprint: {e}")
+        return False
+
+def update_game_file(serial, filepath, size, mtime, original_size=None, compressed_size=None):
+    """Points a game at a new file for the same image (e.g. its compressed copy); hashes and metadata are kept."""
+    db_path = get_db_path()
+    if not db_path or not os.path.exists(db_path):
+        return False
+
+    try:
+        with CONNECTIONS.batch() as conn:
+            cursor = conn.execute(
+                'UPDATE library SET filepath = ?, size = ?, mtime = ?, original_size = ?, compressed_size = ? WHERE serial = ?',
+                (filepath, size, mtime, original_size, compressed_size, serial)
+            )
+        return cursor.rowcount > 0
+    except sqlite3.Error as e:
+        print(f"[DB] Error updating game file: {e}")
+        return False
+
+def update_game_metadata(serial, metadata):
+    """Stores CFG metadata (developer, genre, release) for a game."""
+    db_path = get_db_path()
+    if not db_path or not os.path.exists(db_path):
+        return False
+
+    try:
+        with CONNECTIONS.batch() as conn:
+            cursor = conn.execute(
+                'UPDATE library SET developer = ?, genre = ?, release = ? WHERE serial = ?',
+                (metadata.get('developer'), metadata.get('genre'), metadata.get('release'), serial)
+            )
+        return cursor.rowcount > 0
+    except sqlite3.Error as e:
+        print(f"[DB] Error updating metadata: {e}")
+        return False
+
+def get_library_serials():
+    """Every serial in the library, as a set."""
+    db_path = get_db_path()
+    if not db_path or not os.path.exists(db_path):
+        return set()
+
+    try:
+        with CONNECTIONS.library() as conn:
+            return {row[0] for row in conn.execute('SELECT serial FROM library')}
+    except sqlite3.Error as e:
+        print(f"[DB] Error reading library serials: {e}")
+        return set()
+
+def get_library_scan_index():
+    """Returns {filepath: {serial, size, mtime, has_metadata}} for every game, for rescans."""
+    db_path = get_db_path()
+    if not db_path or not os.path.exists(db_path):
+        return {}
+
+    try:
+        with CONNECTIONS.library() as conn:
+            rows = conn.execute('''
+                SELECT filepath, serial, size, mtime,
+                       (developer IS NOT NULL OR genre IS NOT NULL OR release IS NOT NULL)
+                FROM library
+            ''').fetchall()
+        return {
+            filepath: {"serial": serial, "size": size, "mtime": mtime, "has_metadata": bool(has_metadata)}
+            for filepath, serial, size, mtime, has_metadata in rows
+        }
+    except sqlite3.Error as e:
+        print(f"[DB] Error reading scan index: {e}")
+        return {}
+
+def apply_library_changes(upserts=(), touches=(), deleted_serials=(), clear=False, metadata=()):
+    """
+    Applies a rescan in a single transaction.
+    upserts: dicts with serial, title, filepath, size, cover_url, mtime and
+             optionally developer, genre, release, original_size and
+             compressed_size (hashes are reset)
+    touches: (serial, mtime) pairs for unchanged files that only need their mtime recorded
+    deleted_serials: serials whose files are gone
+    clear: drop every existing row first (full rebuild)
+    metadata: (serial, {developer, genre, release}) pairs for unchanged games
+    """
+    upserts = [
+        {"developer": None, "genre": None, "release": None, "original_size": None, "compressed_size": None,
+         **upsert, "region": titles.region_of(upsert["serial"])}
+        for upsert in upserts
+    ]
+    db_path = get_db_path()
+    if not db_path:
+        print("[DB Error] Cannot update library: No library path selected.")
+        return False
+
+    try:
+        with CONNECTIONS.batch() as conn:
+            if clear:
+                conn.execute('DELETE FROM library')
+            conn.executemany('DELETE FROM library WHERE serial = ?', [(serial,) for serial in deleted_serials])
+            conn.executemany('''
+                INSERT OR REPLACE INTO library (serial, title, filepath, size, cover_url, mtime, region, developer, genre, release,
+                                                original_size, compressed_size)
+                VALUES (:serial, :title, :filepath, :size, :cover_url, :mtime, :region, :developer, :genre, :release,
+                        :original_size, :compressed_size)
+            ''', upserts)
+            conn.executemany('UPDATE library SET mtime = ? WHERE serial = ?', [(mtime, serial) for serial, mtime in touches])
+            conn.executemany(
+                'UPDATE library SET developer = ?, genre = ?, release = ? WHERE serial = ?',
+                [(meta.get('developer'), meta.get('genre'), meta.get('release'), serial) for serial, meta in metadata]
+            )
+        return True
+    except sqlite3.Error as e:
+        print(f"[DB] Error applying library changes: {e}")
+        return False
+
+# --- Search ---
+
+def search_library(query=None, filters=None, sort=None, descending=False, cursor=None, limit=SEARCH_PAGE_SIZE):
+    """
+    Searches the library with prefix matching over title, serial, region and
+    CFG metadata. filters narrows by SEARCH_FACETS ({"region": "PAL"}).
+    Pages by keyset: pass the returned next_cursor to get the following page.
+    Returns {items, total, facets: {facet: {value: count}}, next_cursor,
+    sort, library, revision}; the last two are the point to follow
+    get_library_changes() from.
+    """
+    empty = {"items": [], "total": 0, "facets": {}, "next_cursor": None, "library": None, "revision": None}
+    db_path = get_db_path()
+    if not db_path or not os.path.exists(db_path):
+        return empty
+
+    filters = {facet: value for facet, value in (filters or {}).items() if facet in SEARCH_FACETS and value}
+    limit = max(1, min(int(limit or SEARCH_PAGE_SIZE), MAX_SEARCH_PAGE_SIZE))
+
+    try:
+        with CONNECTIONS.library() as conn:
+            use_fts = has_library_fts(conn)
+            library_id, revision = conn.execute('SELECT library_id, revision FROM library_sync').fetchone()
+            terms = _search_terms(query)
+            if sort not in SEARCH_SORTS or (sort == 'relevance' and not (use_fts and terms)):
+                sort = 'relevance' if use_fts and terms else 'title'
+            sort_expr = SEARCH_SORTS[sort]
+
+            source, where, params = _search_scope(terms, filters, use_fts)
+
+            # Keyset pagination on (sort key, serial), which stays stable as rows are added
+            page_where, page_params = list(where), list(params)
+            after = _decode_cursor(cursor)
+            if after:
+                op = '<' if descending else '>'
+                page_where.append(f'({sort_expr} {op} ? OR ({sort_expr} = ? AND library.serial {op} ?))')
+                page_params += [after[0], after[0], after[1]]
+
+            direction = 'DESC' if descending else 'ASC'
+            rows = conn.execute(f'''
+                SELECT library.*, {sort_expr} AS sort_key {source}
+                {_where_clause(page_where)}
+                ORDER BY sort_key {direction}, library.serial {direction}
+                LIMIT ?
+            ''', page_params + [limit + 1]).fetchall()
+
+            total = conn.execute(f'SELECT COUNT(*) {source} {_where_clause(where)}', params).fetchone()[0]
+
+            # Each facet is counted with every other filter applied, but not its own
+            facets = {}
+            for facet in SEARCH_FACETS:
+                facet_source, facet_where, facet_params = _search_scope(
+                    terms, {k: v for k, v in filters.items() if k != facet}, use_fts
+                )
+                facet_where.append(f'library.{facet} IS NOT NULL')
+                facets[facet] = dict(conn.execute(f'''
+                    SELECT library.{facet}, COUNT(*) {facet_source} {_where_clause(facet_where)}
+                    GROUP BY library.{facet} ORDER BY COUNT(*) DESC, library.{facet} LIMIT ?
+                ''', facet_params + [MAX_FACET_VALUES]).fetchall())
+    except sqlite3.Error as e:
+        print(f"[DB Error] Library search failed: {e}")
+        return empty
+
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = _encode_cursor(last["sort_key"], last["serial"])
+    for item in items:
+        item.pop("sort_key", None)
+
+    return {
+        "items": items, "total": total, "facets": facets, "next_cursor": next_cursor, "sort": sort,
+        "library": library_id, "revision": revision,
+    }
+
+def _search_terms(query):
+    # Word characters only; everything else (quotes, FTS operators, "_" and ".") separates terms
+    return [term for term in re.split(r'[\W_]+', query or '') if term]
+
+def _search_scope(terms, filters, use_fts):
+    source = 'FROM library'
+    where = []
+    params = []
+    if terms and use_fts:
+        source = 'FROM library JOIN library_fts ON library_fts.rowid = library.rowid'
+        where.append('library_fts MATCH ?')
+        # Every term must match, each as a prefix
+        params.append(' '.join(f'"{term}"*' for term in terms))
+    elif terms:
+        for term in terms:
+            where.append('(' + ' OR '.join(f'library.{column} LIKE ?' for column in LIBRARY_FTS_COLUMNS) + ')')
+            params += [f'%{term}%'] * len(LIBRARY_FTS_COLUMNS)
+
+    for facet, value in filters.items():
+        where.append(f'library.{facet} = ?')
+        params.append(value)
+    return source, where, params
+
+def _where_clause(where):
+    return f"WHERE {' AND '.join(where)}" if where else ''
+
+def _encode_cursor(sort_key, serial):
+    return base64.urlsafe_b64encode(json.dumps([sort_key, serial]).encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        sort_key, serial = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return sort_key, serial
+    except (ValueError, TypeError):
+        return None
+
+def remove_game_from_library(serial):
+    db_path = get_db_path()
+    if not db_path or not os.path.exists(db_path):
+        return False
+
+    try:
+        with CONNECTIONS.batch() as conn:
+            cursor = conn.execute('DELETE FROM library WHERE serial = ?', (serial,))
         
         if cursor.rowcount > 0:
             print(f"[DB] Removed game ({serial}) from library.")
@@ -197,8 +925,37 @@ def remove_game_from_library(serial):
     except sqlite3.Error as e:
         print(f"[DB] Error removing game: {e}")
         return False
-    finally:
-        if conn: conn.close()
+
+def remove_games_from_library(serials=None):
+    """
+    Deletes many games in one transaction; serials=None removes every game.
+    Returns the removed rows ({serial, filepath}) so their files can be cleaned up.
+    """
+    db_path = get_db_path()
+    if not db_path or not os.path.exists(db_path):
+        return None
+
+    try:
+        with CONNECTIONS.batch() as conn:
+            if serials is None:
+                rows = conn.execute('SELECT serial, filepath FROM library').fetchall()
+                conn.execute('DELETE FROM library')
+            else:
+                # One statement per chunk, within SQLite's bound-parameter limit
+                rows = []
+                serials = list(dict.fromkeys(serials))
+                for start in range(0, len(serials), 500):
+                    chunk = serials[start:start + 500]
+                    placeholders = ', '.join('?' * len(chunk))
+                    rows += conn.execute(f'SELECT serial, filepath FROM library WHERE serial IN ({placeholders})', chunk).fetchall()
+                    conn.execute(f'DELETE FROM library WHERE serial IN ({placeholders})', chunk)
+
+        print(f"[DB] Removed {len(rows)} games from library.")
+        return [dict(row) for row in rows]
+
+    except sqlite3.Error as e:
+        print(f"[DB] Error removing games: {e}")
+        return None
 
 # --- Helper Functions ---
 def clean_serial(serial):
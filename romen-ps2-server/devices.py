@@ -0,0 +1,260 @@
+import os
+import re
+import sys
+import time
+import ctypes
+import select
+import threading
+import subprocess
+import psutil
+
+# devices.py
+# Which mount a library path lives on, its label and free space. The mount
+# table is parsed once and re-read only when the kernel says it changed
+# (poll() on /proc/self/mountinfo), or after a short TTL where that isn't
+# available. Linux labels come from /dev/disk/by-label instead of lsblk, and
+# free space is re-measured in the background so /device never waits on it.
+
+MOUNTINFO_PATH = '/proc/self/mountinfo'
+LABELS_DIR = '/dev/disk/by-label'
+# Used instead of mountinfo change events on other platforms
+MOUNT_TTL_SECONDS = 5
+# Free space older than this is refreshed in the background
+USAGE_TTL_SECONDS = 5
+
+class Mount:
+    def __init__(self, device, mountpoint, fstype):
+        self.device = device
+        self.mountpoint = mountpoint
+        self.fstype = fstype
+
+    def contains(self, path) -> bool:
+        mountpoint = self.mountpoint
+        if os.name == 'nt':
+            path, mountpoint = path.lower(), mountpoint.lower()
+        if path == mountpoint:
+            return True
+        # /media/usb must not match /media/usb2
+        return path.startswith(mountpoint if mountpoint.endswith(os.sep) else mountpoint + os.sep)
+
+class DeviceMonitor:
+    def __init__(self, mount_ttl=MOUNT_TTL_SECONDS, usage_ttl=USAGE_TTL_SECONDS):
+        self.mount_ttl = mount_ttl
+        self.usage_ttl = usage_ttl
+
+        self._lock = threading.RLock()
+        self._mounts = None
+        self._mounts_read_at = 0
+        self._by_path = {}
+        self._labels = {}
+        self._by_label = None
+        self._by_label_mtime = None
+        # mountpoint -> (measured_at, usage)
+        self._usage = {}
+        self._refreshing = set()
+
+        self._mountinfo = None
+        self._poller = None
+        if sys.platform.startswith('linux'):
+            try:
+                self._mountinfo = open(MOUNTINFO_PATH, 'rb')
+                self._poller = select.poll()
+                self._poller.register(self._mountinfo, select.POLLPRI | select.POLLERR)
+            except (OSError, AttributeError):
+                self._mountinfo = None
+                self._poller = None
+
+    def device_for(self, path) -> dict:
+        """Returns {label, file_system, space_free, total_space, mountpoint} for the mount holding path, or None."""
+        real_path = os.path.realpath(path)
+        if not os.path.exists(real_path):
+            return None
+
+        with self._lock:
+            mount = self._mount_of(real_path)
+            if mount is None:
+                return None
+            label = self._label_of(mount)
+
+        usage = self._usage_of(mount.mountpoint)
+        if usage is None:
+            return None
+        return {
+            "label": label,
+            "file_system": mount.fstype,
+            "space_free": usage.free,
+            "total_space": usage.total,
+            "mountpoint": mount.mountpoint,
+        }
+
+    def free_space(self, path):
+        """Free bytes on path's drive, measured now; for decisions a cached reading could get wrong."""
+        real_path = os.path.realpath(path) if path else None
+        if not real_path or not os.path.exists(real_path):
+            return None
+        with self._lock:
+            mount = self._mount_of(real_path)
+        usage = self._measure(mount.mountpoint if mount else real_path)
+        return usage.free if usage else None
+
+    def refresh_usage(self, path):
+        """Re-measures free space for path's mount in the background (after writes or deletes)."""
+        with self._lock:
+            mount = self._by_path.get(os.path.realpath(path))
+        if mount is not None:
+            self._refresh_in_background(mount.mountpoint)
+
+    # --- Mount table ---
+
+    def _mounts_changed(self) -> bool:
+        if self._mounts is None:
+            return True
+        if self._poller is not None:
+            # The kernel flags the fd once per mount table change; no events means nothing moved
+            return bool(self._poller.poll(0))
+        return time.monotonic() - self._mounts_read_at > self.mount_ttl
+
+    def _mount_of(self, real_path):
+        if self._mounts_changed():
+            self._reload_mounts()
+        mount = self._by_path.get(real_path)
+        if mount is None:
+            mount = self._find_mount(real_path)
+            if mount is not None:
+                self._by_path[real_path] = mount
+        return mount
+
+    def _reload_mounts(self):
+        if self._mountinfo is not None:
+            self._mountinfo.seek(0)
+            self._mounts = parse_mountinfo(self._mountinfo.read().decode('utf-8', errors='replace'))
+        else:
+            self._mounts = [Mount(part.device, part.mountpoint, part.fstype) for part in psutil.disk_partitions(all=True)]
+        self._mounts_read_at = time.monotonic()
+        self._by_path.clear()
+        self._labels.clear()
+
+    def _find_mount(self, real_path):
+        # Longest mountpoint wins; on ties the later mount is the one on top
+        best = None
+        for mount in self._mounts:
+            if mount.contains(real_path) and (best is None or len(mount.mountpoint) >= len(best.mountpoint)):
+                best = mount
+        return best
+
+    # --- Labels ---
+
+    def _label_of(self, mount):
+        key = (mount.device, mount.mountpoint)
+        if key not in self._labels:
+            self._labels[key] = self._read_label(mount)
+        return self._labels[key]
+
+    def _read_label(self, mount):
+        try:
+            # --- Windows ---
+            if os.name == 'nt':
+                kernel32 = ctypes.windll.kernel32
+                volume_name_buf = ctypes.create_unicode_buffer(1024)
+                # Windows requires a trailing backslash for the root path
+                root_path = mount.mountpoint if mount.mountpoint.endswith('\\') else mount.mountpoint + '\\'
+
+                kernel32.GetVolumeInformationW(
+                    ctypes.c_wchar_p(root_path),
+                    volume_name_buf,
+                    ctypes.sizeof(volume_name_buf),
+                    None, None, None, None, 0
+                )
+                return volume_name_buf.value
+
+            # --- macOS ---
+            elif sys.platform == 'darwin':
+                output = subprocess.check_output(["diskutil", "info", mount.mountpoint]).decode()
+                match = re.search(r"Volume Name:\s+(.*)", output)
+                if match:
+                    label = match.group(1).strip()
+                    return label if label != "Not applicable" else "Untitled"
+                return "Unknown"
+
+            # --- Linux ---
+            else:
+                label = self._linux_labels().get(os.path.realpath(mount.device))
+                return label if label else "Unnamed Drive"
+
+        except Exception as e:
+            print(f"Error getting label: {e}")
+            return "Unknown"
+
+    def _linux_labels(self):
+        """{device node: label} from udev's by-label symlinks, re-listed only when the directory changes."""
+        try:
+            mtime = os.stat(LABELS_DIR).st_mtime_ns
+        except OSError:
+            return {}
+        if self._by_label is None or mtime != self._by_label_mtime:
+            labels = {}
+            with os.scandir(LABELS_DIR) as entries:
+                for entry in entries:
+                    labels[os.path.realpath(entry.path)] = unescape_udev(entry.name)
+            self._by_label = labels
+            self._by_label_mtime = mtime
+        return self._by_label
+
+    # --- Free space ---
+
+    def _usage_of(self, mountpoint):
+        with self._lock:
+            entry = self._usage.get(mountpoint)
+        if entry is None:
+            return self._measure(mountpoint)
+        # Serve the last reading right away; a stale one is refreshed behind it
+        if time.monotonic() - entry[0] > self.usage_ttl:
+            self._refresh_in_background(mountpoint)
+        return entry[1]
+
+    def _measure(self, mountpoint):
+        try:
+            usage = psutil.disk_usage(mountpoint)
+        except OSError as e:
+            print(f"Error reading disk usage: {e}")
+            return None
+        with self._lock:
+            self._usage[mountpoint] = (time.monotonic(), usage)
+        return usage
+
+    def _refresh_in_background(self, mountpoint):
+        with self._lock:
+            if mountpoint in self._refreshing:
+                return
+            self._refreshing.add(mountpoint)
+
+        def refresh():
+            try:
+                self._measure(mountpoint)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(mountpoint)
+
+        threading.Thread(target=refresh, name='device-usage', daemon=True).start()
+
+def parse_mountinfo(text):
+    """Mounts from /proc/self/mountinfo, in mount order."""
+    mounts = []
+    for line in text.splitlines():
+        fields = line.split(' ')
+        try:
+            separator = fields.index('-', 6)
+            mountpoint = unescape_mountinfo(fields[4])
+            fstype, source = fields[separator + 1], unescape_mountinfo(fields[separator + 2])
+        except (ValueError, IndexError):
+            continue
+        mounts.append(Mount(source, mountpoint, fstype))
+    return mounts
+
+def unescape_mountinfo(value):
+    # Spaces, tabs, newlines and backslashes are written as \ooo
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), value)
+
+def unescape_udev(value):
+    # udev writes unsafe characters in link names as \xNN
+    return re.sub(r'\\x([0-9a-fA-F]{2})', lambda m: chr(int(m.group(1), 16)), value)
@@ -0,0 +1,200 @@
+import os
+import sys
+import ctypes
+import ctypes.util
+
+# diskio.py
+# Big sequential writes that don't flood the page cache. Left alone, a
+# multi-GB copy to a USB stick piles up gigabytes of dirty pages, evicts
+# everything else on a small board and then stalls in one long writeback.
+# Writes here are flushed in fixed windows instead: each window is handed to
+# writeback as soon as it's complete, the previous one is waited for, and
+# then dropped from the cache (the "streaming write" pattern from
+# sync_file_range(2)). Dirty memory stays around two windows while the device
+# is kept busy.
+
+# Flush/drop granularity; larger keeps slow sticks busier, smaller bounds memory tighter
+WRITEBACK_WINDOW = 32 * 1024 * 1024
+# Read/write buffer when the kernel can't copy for us
+COPY_BUFFER_SIZE = 8 * 1024 * 1024
+
+SYNC_FILE_RANGE_WAIT_BEFORE = 1
+SYNC_FILE_RANGE_WRITE = 2
+SYNC_FILE_RANGE_WAIT_AFTER = 4
+
+_libc = None
+
+def _linux_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        # 64-bit offsets throughout, so >2 GB images work on 32-bit boards too
+        signatures = {
+            'fallocate64': (ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64),
+            'fallocate': (ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64),
+            'sync_file_range': (ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_uint),
+        }
+        for name, argtypes in signatures.items():
+            func = getattr(_libc, name, None)
+            if func is not None:
+                func.argtypes = argtypes
+    return _libc
+
+def preallocate(fd, size) -> bool:
+    """
+    Allocates size bytes for fd up front (the file grows to size), so it is laid
+    out in one run instead of cluster by cluster as it is written; on exFAT that
+    keeps ISOs contiguous for OPL. Uses fallocate(2) directly where possible:
+    glibc's posix_fallocate emulates unsupported filesystems by writing into every
+    block, which would double the I/O. Returns False if nothing was allocated.
+    """
+    if size <= 0:
+        return False
+
+    if sys.platform.startswith('linux'):
+        libc = _linux_libc()
+        fallocate = getattr(libc, 'fallocate64', None) or libc.fallocate
+        # mode 0: allocate and extend; fails with EOPNOTSUPP rather than emulating
+        return fallocate(fd, 0, 0, size) == 0
+
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return True
+        except OSError:
+            return False
+    return False
+
+def drop_cache(fd, offset=0, length=0):
+    """Evicts a file range from the page cache (length 0 = to the end). Dirty pages are skipped by the kernel."""
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, offset, length, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+
+def _sync(fd):
+    (os.fdatasync if hasattr(os, 'fdatasync') else os.fsync)(fd)
+
+class Writeback:
+    """
+    Follows a file being written front to back and keeps its dirty pages bounded.
+    Call advance(offset) with how far the file has been written; every full window
+    is pushed to the device and the one before it is waited for and dropped.
+    before_sync() runs first, for callers holding data in a userspace buffer.
+    """
+
+    def __init__(self, fd, window=WRITEBACK_WINDOW, before_sync=None):
+        self.fd = fd
+        self.window = max(1, window)
+        self.before_sync = before_sync
+        self.flushed = 0
+        self._previous = None
+        libc = _linux_libc() if sys.platform.startswith('linux') else None
+        self._sync_file_range = getattr(libc, 'sync_file_range', None)
+
+    def advance(self, offset):
+        if offset - self.flushed < self.window:
+            return
+        if self.before_sync:
+            self.before_sync()
+
+        start, length = self.flushed, offset - self.flushed
+        if self._sync_file_range is not None:
+            # Start this window's writeback without waiting for it
+            self._sync_file_range(self.fd, start, length, SYNC_FILE_RANGE_WRITE)
+            if self._previous:
+                # The previous window has had a whole window's time to land; wait for the rest, then drop it
+                prev_start, prev_length = self._previous
+                self._sync_file_range(self.fd, prev_start, prev_length,
+                                      SYNC_FILE_RANGE_WAIT_BEFORE | SYNC_FILE_RANGE_WRITE | SYNC_FILE_RANGE_WAIT_AFTER)
+                drop_cache(self.fd, prev_start, prev_length)
+            self._previous = (start, length)
+        else:
+            # No async writeback control: flush synchronously every window instead
+            _sync(self.fd)
+            drop_cache(self.fd, 0, offset)
+        self.flushed = offset
+
+    def finish(self):
+        """Makes everything durable and drops the rest of the file from the cache."""
+        if self.before_sync:
+            self.before_sync()
+        _sync(self.fd)
+        drop_cache(self.fd)
+        self._previous = None
+
+def copy_file(src_path, dest_path, buffer_size=COPY_BUFFER_SIZE, window=WRITEBACK_WINDOW, kernel_copy=True, progress=None) -> str:
+    """
+    Copies src_path to a new dest_path with bounded page cache use on both ends.
+    With kernel_copy, copy_file_range(2) then sendfile(2) are tried first, so the
+    data never passes through Python; read/write with buffer_size is the fallback.
+    progress(bytes_copied, total) is called per window. Returns the method used.
+    """
+    with open(src_path, 'rb', buffering=0) as fsrc, open(dest_path, 'wb', buffering=0) as fdst:
+        src_fd, dest_fd = fsrc.fileno(), fdst.fileno()
+        total = os.fstat(src_fd).st_size
+        preallocate(dest_fd, total)
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(src_fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        writeback = Writeback(dest_fd, window)
+        copied = 0
+        method = None
+
+        def step(count):
+            nonlocal copied
+            # The source was read once and won't be again
+            drop_cache(src_fd, copied, count)
+            copied += count
+            writeback.advance(copied)
+            if progress:
+                progress(copied, total)
+
+        if kernel_copy:
+            for name, call in (('copy_file_range', _copy_file_range), ('sendfile', _sendfile)):
+                try:
+                    while copied < total:
+                        count = call(src_fd, dest_fd, copied, min(window, total - copied))
+                        if count == 0:
+                            break
+                        step(count)
+                    method = name
+                    break
+                except OSError:
+                    # Cross-filesystem, unsupported, or not in this kernel; anything done so far still stands
+                    continue
+
+        if method is None or copied < total:
+            method = method or 'readwrite'
+            view = memoryview(bytearray(buffer_size))
+            # Carry on from wherever a kernel copy stopped
+            fsrc.seek(copied)
+            fdst.seek(copied)
+            while copied < total:
+                count = fsrc.readinto(view)
+                if not count:
+                    break
+                written = 0
+                while written < count:
+                    written += fdst.write(view[written:count])
+                step(count)
+
+        if os.fstat(dest_fd).st_size != copied:
+            # Preallocation overshoots when the source shrank underneath us
+            os.ftruncate(dest_fd, copied)
+        writeback.finish()
+    return method
+
+def _copy_file_range(src_fd, dest_fd, offset, count):
+    if not hasattr(os, 'copy_file_range'):
+        raise OSError("copy_file_range unavailable")
+    return os.copy_file_range(src_fd, dest_fd, count, offset, offset)
+
+def _sendfile(src_fd, dest_fd, offset, count):
+    if not hasattr(os, 'sendfile') or not sys.platform.startswith('linux'):
+        # Only Linux sends to regular files
+        raise OSError("sendfile to files unavailable")
+    # sendfile writes at dest's file position
+    os.lseek(dest_fd, offset, os.SEEK_SET)
+    return os.sendfile(dest_fd, src_fd, offset, count)
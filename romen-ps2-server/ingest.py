@@ -0,0 +1,615 @@
+import os
+import re
+import json
+import uuid
+import mmap
+import time
+import threading
+import zlib
+import hashlib
+import tempfile
+import diskio
+import iso
+
+# ingest.py
+# Helpers for getting an uploaded ISO onto the library drive with as few
+# full passes over the data as possible.
+
+STAGING_DIR_NAME = '.romen_ingest'
+# How much of an upload we buffer while looking for SYSTEM.CNF
+IDENTIFY_LIMIT = 8 * 1024 * 1024
+# Largest single range accepted by a chunked upload session
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+# Seconds between sidecar rewrites while chunks arrive; a restart only loses
+# the ranges since the last save, which the browser then sends again
+SIDECAR_SAVE_INTERVAL = 2.0
+# Left free on the library drive for the DB, art and filesystem metadata
+SPACE_HEADROOM = 64 * 1024 * 1024
+# Bytes read from each end of an image for its quick fingerprint; the
+# browser's copy of this (useGameUploads) has to match
+FINGERPRINT_SPAN = 4 * 1024 * 1024
+# Encodings an upload body may be sent in, as zlib wbits
+TRANSPORT_ENCODINGS = {"gzip": 31, "deflate": 15}
+
+class UnidentifiableImageError(Exception):
+    """Raised when the leading sectors of an upload show it is not a PS2 image."""
+
+class InsufficientSpaceError(Exception):
+    """Raised when an upload can't fit on the library drive next to the ones in flight."""
+
+class TransportError(ValueError):
+    """Raised when a compressed upload body is corrupt, truncated or inflates past its declared size."""
+
+# --- Space admission ---
+
+class SpaceReservation:
+    """
+    Space booked for one upload. `on_disk` is how much of it the library drive
+    already accounts for (preallocated or written there), so the ledger only
+    holds back the rest.
+    """
+
+    def __init__(self, ledger, size):
+        self.ledger = ledger
+        self.size = size
+        self.on_disk = 0
+        self.released = False
+
+    @property
+    def outstanding(self):
+        return 0 if self.released else max(0, self.size - self.on_disk)
+
+    def allocated(self, nbytes):
+        """Records that nbytes of this upload now take up space on the library drive."""
+        self.on_disk = max(self.on_disk, nbytes)
+
+    def release(self):
+        self.ledger._release(self)
+
+class SpaceLedger:
+    """
+    In-memory accounting of space promised to uploads in flight. Each upload is
+    admitted against the drive's free space minus every other reservation, so
+    concurrent uploads can't all be accepted against the same free gigabytes.
+    free_space() returns the drive's current free bytes, or None if unknown.
+    """
+
+    def __init__(self, free_space, headroom=SPACE_HEADROOM):
+        self.free_space = free_space
+        self.headroom = headroom
+        self._lock = threading.Lock()
+        self._reservations = set()
+
+    def reserve(self, size, check=True) -> SpaceReservation:
+        """
+        Books size bytes, or raises InsufficientSpaceError. check=False books
+        without admission (sessions picked up again after a restart).
+        """
+        with self._lock:
+            if check:
+                free = self.free_space()
+                # Without a reading (no drive yet) admission is left to the commit
+                if free is not None:
+                    available = free - self.headroom - self._outstanding()
+                    if size > available:
+                        raise InsufficientSpaceError(
+                            f"Not enough space on the library drive: {size // 2**20} MB needed, "
+                            f"{max(0, available) // 2**20} MB available."
+                        )
+            reservation = SpaceReservation(self, size)
+            self._reservations.add(reservation)
+            return reservation
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"reserved": self._outstanding(), "uploads": len(self._reservations)}
+
+    def _outstanding(self):
+        return sum(reservation.outstanding for reservation in self._reservations)
+
+    def _release(self, reservation):
+        with self._lock:
+            reservation.released = True
+            self._reservations.discard(reservation)
+
+def allocated_bytes(path) -> int:
+    """Space a file actually takes up on disk (less than its size while sparse)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return 0
+    return st.st_blocks * 512 if hasattr(st, 'st_blocks') else st.st_size
+
+def get_staging_dir(lib_path, uploads_path, mode="stream"):
+    """
+    Returns the folder partial uploads should be written into.
+    In "stream" mode this is a hidden folder on the library drive itself, so
+    committing the finished file is a rename instead of a second full copy.
+    """
+    if mode == "stream" and lib_path and os.path.isdir(lib_path):
+        staging_dir = os.path.join(lib_path, STAGING_DIR_NAME)
+    else:
+        staging_dir = uploads_path
+
+    os.makedirs(staging_dir, exist_ok=True)
+    return staging_dir
+
+class IngestHasher:
+    """
+    Computes CRC32, MD5 and SHA-1 incrementally over the chunks fed to it,
+    matching the hash set Redump-style databases publish per disc image.
+    """
+
+    def __init__(self):
+        self._crc32 = 0
+        self._md5 = hashlib.md5()
+        self._sha1 = hashlib.sha1()
+
+    def update(self, chunk):
+        self._crc32 = zlib.crc32(chunk, self._crc32)
+        self._md5.update(chunk)
+        self._sha1.update(chunk)
+
+    def hexdigests(self) -> dict:
+        return {
+            "crc32": f"{self._crc32 & 0xFFFFFFFF:08x}",
+            "md5": self._md5.hexdigest(),
+            "sha1": self._sha1.hexdigest()
+        }
+
+def hash_file(path, chunk_size) -> dict:
+    """Re-hashes a file on disk through a read-only memory map."""
+    hasher = IngestHasher()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return hasher.hexdigests()
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(mm)
+            try:
+                for offset in range(0, size, chunk_size):
+                    hasher.update(view[offset:offset + chunk_size])
+            finally:
+                view.release()
+
+    return hasher.hexdigests()
+
+def image_fingerprint(read_at, size) -> str:
+    """
+    Cheap identity for an image, good enough to tell dumps of the same
+    serial apart: CRC32 of its first and last FINGERPRINT_SPAN bytes.
+    read_at(offset, length) returns bytes of the uncompressed image.
+    """
+    head = min(size, FINGERPRINT_SPAN)
+    tail_start = max(head, size - FINGERPRINT_SPAN)
+    crc = zlib.crc32(read_at(0, head))
+    crc = zlib.crc32(read_at(tail_start, size - tail_start), crc)
+    return f"{crc & 0xFFFFFFFF:08x}"
+
+def fingerprint_file(path) -> str:
+    """image_fingerprint of an ISO on disk."""
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        return image_fingerprint(lambda offset, length: _pread(fd, length, offset), os.fstat(fd).st_size)
+    finally:
+        os.close(fd)
+
+def compare_hashes(expected, actual) -> list:
+    """Returns the names of the hashes that are set in both dicts but differ."""
+    mismatches = []
+    for name in ("crc32", "md5", "sha1"):
+        if expected.get(name) and actual.get(name) and expected[name].lower() != actual[name].lower():
+            mismatches.append(name)
+    return mismatches
+
+# --- Compressed transport ---
+
+class TransportDecoder:
+    """
+    Inflates a gzip or deflate upload body as it arrives. Output comes back
+    in pieces of at most piece_size, so padding that compressed to almost
+    nothing never expands into one huge buffer, and never past limit bytes.
+    """
+
+    def __init__(self, encoding, piece_size, limit=None):
+        if encoding not in TRANSPORT_ENCODINGS:
+            raise TransportError(f"Unsupported encoding: {encoding}")
+        self.encoding = encoding
+        self.piece_size = piece_size
+        self.limit = limit
+        self.decoded = 0
+        self._inflater = zlib.decompressobj(TRANSPORT_ENCODINGS[encoding])
+
+    def _inflate(self, data, max_length=0):
+        try:
+            return self._inflater.decompress(data, max_length) if max_length else self._inflater.flush()
+        except zlib.error as e:
+            raise TransportError(f"Corrupt {self.encoding} body: {e}")
+
+    def _count(self, piece):
+        self.decoded += len(piece)
+        if self.limit is not None and self.decoded > self.limit:
+            raise TransportError(f"Body inflates to more than the declared {self.limit} bytes.")
+        return piece
+
+    def decode(self, data):
+        """Yields the bytes data inflates to."""
+        while True:
+            if self._inflater.eof:
+                if data or self._inflater.unused_data:
+                    raise TransportError("Data after the end of the compressed body.")
+                return
+            piece = self._inflate(data, self.piece_size)
+            data = self._inflater.unconsumed_tail
+            if piece:
+                yield self._count(piece)
+            # A full piece may have left output behind in zlib even with no input left
+            if not data and len(piece) < self.piece_size:
+                return
+
+    def finish(self) -> bytes:
+        """Whatever zlib still holds; raises TransportError if the body was cut short."""
+        tail = self._count(self._inflate(b''))
+        if not self._inflater.eof:
+            raise TransportError(f"The {self.encoding} body ended early.")
+        return tail
+
+def decode_body(data, encoding, limit) -> bytes:
+    """A whole compressed body (e.g. one chunk of a resumable upload), inflated to at most limit bytes."""
+    decoder = TransportDecoder(encoding, limit, limit)
+    body = b''.join(decoder.decode(data))
+    return body + decoder.finish()
+
+class PrefixIdentifier:
+    """
+    Looks for the serial in the leading bytes of an image as they are fed in,
+    in order. Sets `serial` (and calls on_identified) once SYSTEM.CNF has been
+    read, and raises UnidentifiableImageError for images that aren't ISO9660
+    at all. Anything else the quick reader can't place is left for
+    iso.get_serial (and its pycdlib fallback) once the transfer is done.
+    """
+
+    def __init__(self, on_identified=None):
+        self.serial = None
+        self.on_identified = on_identified
+        self.active = True
+        self._prefix = bytearray()
+        self._prefix_needed = 0
+
+    def feed(self, chunk):
+        if not self.active:
+            return
+
+        self._prefix += chunk[:IDENTIFY_LIMIT - len(self._prefix)]
+        if len(self._prefix) < self._prefix_needed:
+            return
+
+        try:
+            serial = iso.get_serial_from_prefix(self._prefix)
+        except iso.IncompleteImageError as e:
+            if e.needed > IDENTIFY_LIMIT:
+                # SYSTEM.CNF sits further in than we buffer; identify after the transfer
+                self._stop()
+            else:
+                self._prefix_needed = e.needed
+            return
+
+        iso9660 = iso.has_volume_descriptor(self._prefix)
+        self._stop()
+        if not serial:
+            # The quick reader only walks the root directory; pycdlib may still find it
+            if not iso9660:
+                raise UnidentifiableImageError("Game Lacks Valid Serial Number")
+            return
+
+        self.serial = serial
+        if self.on_identified:
+            self.on_identified(serial)
+
+    def _stop(self):
+        self.active = False
+        self._prefix = bytearray()
+
+class IngestWriter:
+    """
+    Large-buffer chunked writer for an incoming upload.
+    Data goes to a uniquely named .part file in the staging folder; call
+    commit_file() with the finished path to move it to its OPL name.
+    Every chunk is hashed on its way to disk, so checksums cost no extra pass.
+
+    With identify=True the leading sectors are inspected as they arrive:
+    `serial` is set (and on_identified called) as soon as SYSTEM.CNF has been
+    read, and write() raises UnidentifiableImageError for images that aren't
+    ISO9660 at all; the rest is decided by iso.get_serial after the transfer.
+    """
+
+    def __init__(self, staging_dir, chunk_size, identify=False, on_identified=None, expected_size=None,
+                 writeback_size=diskio.WRITEBACK_WINDOW):
+        fd, self.path = tempfile.mkstemp(dir=staging_dir, suffix='.part')
+        self.chunk_size = chunk_size
+        self.bytes_written = 0
+        self.hasher = IngestHasher()
+        self.identifier = PrefixIdentifier(on_identified) if identify else None
+        # Stream-mode staging files become the ISO by rename, so allocate them in one piece.
+        # expected_size may overshoot (e.g. multipart framing); close() trims the rest.
+        self.preallocated = expected_size if expected_size and diskio.preallocate(fd, expected_size) else 0
+        self._file = os.fdopen(fd, 'wb', buffering=chunk_size)
+        # Keeps a multi-GB upload from filling the page cache with dirty pages
+        self._writeback = diskio.Writeback(fd, writeback_size, before_sync=self._file.flush)
+
+    @property
+    def serial(self):
+        return self.identifier.serial if self.identifier else None
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self.hasher.update(chunk)
+        self.bytes_written += len(chunk)
+        self._writeback.advance(self.bytes_written)
+
+        if self.identifier:
+            self.identifier.feed(chunk)
+
+    def copy_from(self, src, progress=None):
+        """
+        Drains a file-like object into the writer, chunk_size bytes at a time.
+        progress(bytes_written) is called after every chunk.
+        """
+        while True:
+            chunk = src.read(self.chunk_size)
+            if not chunk:
+                break
+            self.write(chunk)
+            if progress:
+                progress(self.bytes_written)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.flush()
+        if self.preallocated > self.bytes_written:
+            os.ftruncate(self._file.fileno(), self.bytes_written)
+        # Syncs whatever is still dirty and leaves none of the file cached
+        self._writeback.finish()
+        self._file.close()
+
+    def abort(self):
+        """Closes the writer and deletes whatever was written so far."""
+        try:
+            if not self._file.closed:
+                self._file.close()
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+class ChunkedUpload:
+    """
+    A resumable upload session. Byte ranges can arrive in any order and are
+    written in place into a file preallocated to the final size; the session
+    state lives in a JSON sidecar next to it so it survives restarts. The
+    sidecar is rewritten every SIDECAR_SAVE_INTERVAL seconds and once the
+    last byte is in, not on every chunk.
+
+    Bytes are hashed and identified as the contiguous prefix from offset 0
+    grows, reading them back while they are still in the page cache.
+    """
+
+    def __init__(self, staging_dir, upload_id, filename, size, chunk_size, job_id=None, received=None,
+                 writeback_size=diskio.WRITEBACK_WINDOW):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.size = size
+        self.chunk_size = chunk_size
+        self.job_id = job_id
+        self.received = received or []
+        self.path = os.path.join(staging_dir, f'{upload_id}.part')
+        self.meta_path = os.path.join(staging_dir, f'{upload_id}.json')
+        self.hasher = IngestHasher()
+        self.hashed = 0
+        self.identifier = PrefixIdentifier()
+        self.error = None
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+
+        flags = os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0)
+        self._fd = os.open(self.path, flags, 0o644)
+        if os.fstat(self._fd).st_size != size:
+            # Allocated in one run where the filesystem supports it, sparse otherwise
+            if not diskio.preallocate(self._fd, size):
+                os.ftruncate(self._fd, size)
+        # Follows the hashed prefix: those bytes have been read back and are done with
+        self._writeback = diskio.Writeback(self._fd, writeback_size)
+
+    @classmethod
+    def create(cls, staging_dir, filename, size, chunk_size, job_id=None, writeback_size=diskio.WRITEBACK_WINDOW):
+        session = cls(staging_dir, uuid.uuid4().hex, filename, size, chunk_size, job_id, writeback_size=writeback_size)
+        session._save()
+        return session
+
+    @classmethod
+    def load(cls, staging_dir, upload_id, chunk_size, writeback_size=diskio.WRITEBACK_WINDOW):
+        """Reopens a session from its sidecar, or returns None if there isn't one."""
+        if not re.fullmatch(r'[0-9a-f]{32}', upload_id or ''):
+            return None
+
+        meta_path = os.path.join(staging_dir, f'{upload_id}.json')
+        if not os.path.exists(meta_path):
+            return None
+
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        return cls(staging_dir, upload_id, meta['filename'], meta['size'], chunk_size,
+                   meta.get('job_id'), [tuple(r) for r in meta['received']], writeback_size)
+
+    @property
+    def serial(self):
+        return self.identifier.serial
+
+    @property
+    def bytes_received(self):
+        return sum(end - start for start, end in self.received)
+
+    @property
+    def complete(self):
+        return self.received == [(0, self.size)] or (self.size == 0)
+
+    def write_at(self, offset, data):
+        if self.error:
+            raise UnidentifiableImageError(self.error)
+        if offset < 0 or offset + len(data) > self.size:
+            raise ValueError("Chunk lies outside the declared file size.")
+
+        if hasattr(os, 'pwrite'):
+            _pwrite(self._fd, data, offset)
+
+        with self._lock:
+            if not hasattr(os, 'pwrite'):
+                # seek+write has to be serialized between parallel chunks
+                _pwrite(self._fd, data, offset)
+            self.received = _add_range(self.received, offset, offset + len(data))
+            if self.complete or time.monotonic() - self._saved_at >= SIDECAR_SAVE_INTERVAL:
+                self._save()
+            try:
+                self._advance_prefix()
+            except UnidentifiableImageError as e:
+                self.error = str(e)
+                raise
+
+    def _advance_prefix(self):
+        """Hashes/identifies the newly contiguous bytes starting at offset 0."""
+        if not self.received or self.received[0][0] != 0:
+            return
+
+        contiguous_end = self.received[0][1]
+        while self.hashed < contiguous_end:
+            length = min(self.chunk_size, contiguous_end - self.hashed)
+            chunk = _pread(self._fd, length, self.hashed)
+            self.hasher.update(chunk)
+            self.identifier.feed(chunk)
+            self.hashed += length
+            self._writeback.advance(self.hashed)
+
+    def hexdigests(self):
+        """Digests of the whole file, or None if the hash stream was interrupted (e.g. by a restart)."""
+        if self.hashed != self.size:
+            return None
+        return self.hasher.hexdigests()
+
+    def status(self) -> dict:
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "size": self.size,
+            "chunk_size": self.chunk_size,
+            "received": [list(r) for r in self.received],
+            "bytes_received": self.bytes_received,
+            "serial": self.serial,
+            "job_id": self.job_id,
+            "error": self.error
+        }
+
+    def close(self):
+        if self._fd is None:
+            return
+        self._writeback.finish()
+        os.close(self._fd)
+        self._fd = None
+        if os.path.exists(self.meta_path):
+            os.remove(self.meta_path)
+
+    def abort(self):
+        try:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+        finally:
+            for path in (self.path, self.meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _save(self):
+        meta = {
+            "filename": self.filename,
+            "size": self.size,
+            "job_id": self.job_id,
+            "received": [list(r) for r in self.received]
+        }
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+        self._saved_at = time.monotonic()
+
+def _add_range(ranges, start, end) -> list:
+    """Inserts [start, end) into a sorted list of ranges, merging neighbours."""
+    merged = []
+    for r_start, r_end in sorted(ranges + [(start, end)]):
+        if merged and r_start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], r_end))
+        else:
+            merged.append((r_start, r_end))
+    return merged
+
+def _pwrite(fd, data, offset):
+    if hasattr(os, 'pwrite'):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+    else:
+        # Windows has no pwrite
+        os.lseek(fd, offset, os.SEEK_SET)
+        os.write(fd, data)
+
+def _pread(fd, length, offset):
+    if hasattr(os, 'pread'):
+        return os.pread(fd, length, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, length)
+
+def same_device(path_a, path_b) -> bool:
+    try:
+        return os.stat(path_a).st_dev == os.stat(path_b).st_dev
+    except OSError:
+        return False
+
+def commit_file(src_path, dest_path, chunk_size, progress=None, writeback_size=diskio.WRITEBACK_WINDOW, kernel_copy=True,
+                keep_source=False):
+    """
+    Moves a finished upload to its final location.
+    When both paths are on the same device this is a single atomic rename.
+    Otherwise the data is copied next to the destination and renamed into
+    place, so a half-written ISO never appears under its OPL name; see
+    diskio.copy_file for how the copy keeps the page cache in check.
+    progress(bytes_copied, total) is called as the data moves.
+    keep_source copies even on the same device and leaves src_path in place.
+    """
+    dest_dir = os.path.dirname(dest_path)
+    os.makedirs(dest_dir, exist_ok=True)
+    src_size = os.path.getsize(src_path)
+
+    if not keep_source and same_device(src_path, dest_dir):
+        os.replace(src_path, dest_path)
+        if progress:
+            progress(src_size, src_size)
+        return
+
+    partial_path = dest_path + '.part'
+    try:
+        diskio.copy_file(src_path, partial_path, chunk_size, writeback_size, kernel_copy, progress)
+
+        if os.path.getsize(partial_path) != src_size:
+            raise IOError("Copy validation failed: Destination size mismatch.")
+
+        os.replace(partial_path, dest_path)
+    except Exception:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    if not keep_source:
+        os.remove(src_path)
@@ -1,8 +1,126 @@
 import pycdlib
+import struct
 import io
+import os
 import re
 
-def get_serial(iso_path) -> str:
+# ISO9660 layout constants
+SECTOR_SIZE = 2048
+FIRST_DESCRIPTOR_SECTOR = 16
+MAX_DESCRIPTORS = 32
+SYSTEM_CNF_NAMES = (b'SYSTEM.CNF;1', b'SYSTEM.CNF')
+MAX_SYSTEM_CNF_SIZE = 64 * 1024
+
+class IncompleteImageError(Exception):
+    """Raised when a bytes prefix ends before the sectors we need to read."""
+
+    def __init__(self, needed):
+        super().__init__(f"Need at least {needed} bytes of the image.")
+        self.needed = needed
+
+def parse_boot2(content) -> str:
+    # Look for the BOOT2 line (e.g., "BOOT2 = cdrom0:\SLUS_200.02;1")
+    # We want to capture the pattern XXXX_000.00
+    match = re.search(r'cdrom0:\s?\\(.*?);', content, re.IGNORECASE)
+    if match:
+        # Returns the raw serial, e.g., "SLUS_200.02"
+        return match.group(1)
+    return None
+
+def read_system_cnf(read_at) -> bytes:
+    """
+    Minimal ISO9660 walk: finds the primary volume descriptor, reads the root
+    directory extent and returns the raw SYSTEM.CNF contents.
+    read_at(offset, length) must return exactly `length` bytes or raise.
+    Returns None if the image is not ISO9660 or has no SYSTEM.CNF at the root.
+    """
+    root_record = None
+    for index in range(MAX_DESCRIPTORS):
+        descriptor = read_at((FIRST_DESCRIPTOR_SECTOR + index) * SECTOR_SIZE, SECTOR_SIZE)
+        if descriptor[1:6] != b'CD001':
+            return None
+        if descriptor[0] == 1:
+            root_record = descriptor[156:190]
+            break
+        if descriptor[0] == 255:
+            return None
+    if root_record is None:
+        return None
+
+    root_lba, root_size = struct.unpack_from('<I4xI', root_record, 2)
+    root_dir = read_at(root_lba * SECTOR_SIZE, root_size)
+
+    offset = 0
+    while offset < len(root_dir):
+        record_len = root_dir[offset]
+        if record_len == 0:
+            # Records never span sectors; skip the padding to the next one
+            offset = (offset // SECTOR_SIZE + 1) * SECTOR_SIZE
+            continue
+
+        name_len = root_dir[offset + 32]
+        name = root_dir[offset + 33:offset + 33 + name_len].upper()
+        if name in SYSTEM_CNF_NAMES:
+            file_lba, file_size = struct.unpack_from('<I4xI', root_dir, offset + 2)
+            return read_at(file_lba * SECTOR_SIZE, min(file_size, MAX_SYSTEM_CNF_SIZE))
+
+        offset += record_len
+
+    return None
+
+def _file_reader(fd):
+    def read_at(offset, length):
+        if hasattr(os, 'pread'):
+            data = os.pread(fd, length, offset)
+        else:
+            # Windows has no pread
+            os.lseek(fd, offset, os.SEEK_SET)
+            data = os.read(fd, length)
+        if len(data) != length:
+            raise EOFError(f"Short read at offset {offset}.")
+        return data
+    return read_at
+
+def _bytes_reader(data):
+    view = memoryview(data)
+    def read_at(offset, length):
+        if offset + length > len(view):
+            raise IncompleteImageError(offset + length)
+        return bytes(view[offset:offset + length])
+    return read_at
+
+def has_volume_descriptor(data) -> bool:
+    """Whether the leading bytes of an image start an ISO9660 descriptor set; pycdlib can't open images that don't."""
+    start = FIRST_DESCRIPTOR_SECTOR * SECTOR_SIZE
+    return data[start + 1:start + 6] == b'CD001'
+
+def get_serial_from_prefix(data) -> str:
+    """
+    Reads the serial from the leading bytes of an image (e.g. an upload that
+    is still streaming in). Raises IncompleteImageError if the prefix is too
+    short to decide, returns None if the image has no readable SYSTEM.CNF.
+    """
+    try:
+        content = read_system_cnf(_bytes_reader(data))
+    except IncompleteImageError:
+        raise
+    except Exception:
+        return None
+    if content is None:
+        return None
+    return parse_boot2(content.decode('utf-8', errors='ignore'))
+
+def _get_serial_fast(iso_path) -> str:
+    fd = os.open(iso_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        content = read_system_cnf(_file_reader(fd))
+    finally:
+        os.close(fd)
+    if content is None:
+        return None
+    return parse_boot2(content.decode('utf-8', errors='ignore'))
+
+def _get_serial_pycdlib(iso_path) -> str:
     iso = pycdlib.PyCdlib()
     try:
         # Open the ISO file
@@ -12,17 +130,23 @@ def get_serial(iso_path) -> str:
         bio = io.BytesIO()
         iso.get_file_from_iso_fp(bio, iso_path='/SYSTEM.CNF;1')
         content = bio.getvalue().decode('utf-8', errors='ignore')
-        # Look for the BOOT2 line (e.g., "BOOT2 = cdrom0:\SLUS_200.02;1")
-        # We want to capture the pattern XXXX_000.00
-        match = re.search(r'cdrom0:\s?\\(.*?);', content, re.IGNORECASE)
-        if match:
-            # Returns the raw serial, e.g., "SLUS_200.02"
-            return match.group(1)
-        else:
-            return None
+        return parse_boot2(content)
     except Exception as e:
         return None
     finally:
         # Always close the ISO to free up resources
         iso.close()
-        
\ No newline at end of file
+
+def get_serial(iso_path) -> str:
+    # Fast path: a handful of sector reads instead of parsing the whole tree
+    try:
+        serial = _get_serial_fast(iso_path)
+        if serial:
+            return serial
+    except Exception:
+        pass
+
+    # Anything the quick reader can't place goes through pycdlib. Both need an
+    # ISO9660 volume descriptor, so uploads without one (UDF-only images, non-
+    # images) are already turned away by ingest.PrefixIdentifier
+    return _get_serial_pycdlib(iso_path)
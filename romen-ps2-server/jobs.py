@@ -0,0 +1,176 @@
+import asyncio
+import sqlite3
+import threading
+import json
+import time
+import os
+from collections import OrderedDict
+
+# jobs.py
+# Job records for uploads/ingest. Kept in memory as a bounded LRU, written
+# through to SQLite in the app's data folder so they survive restarts, and
+# pushed to any connected event-stream clients as they change.
+
+JOBS_DB_PATH = './data/romen_jobs.db'
+JOB_TTL_SECONDS = 24 * 60 * 60
+MAX_JOBS = 500
+PROGRESS_INTERVAL = 0.25
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+FINISHED_STATES = ("completed", "success", "error")
+# States owned by worker threads that did not survive a restart
+INTERRUPTED_STATES = ("preparing", "queued", "processing")
+
+class JobStore:
+    def __init__(self, db_path=JOBS_DB_PATH, ttl=JOB_TTL_SECONDS, max_jobs=MAX_JOBS):
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._touched = {}
+        self._last_progress = {}
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self._conn.commit()
+        self._load()
+
+    # --- Dict-style access ---
+
+    def get(self, job_id, default=None):
+        with self._lock:
+            state = self._jobs.get(job_id)
+            if state is None:
+                return default
+            self._jobs.move_to_end(job_id)
+            return dict(state)
+
+    def __contains__(self, job_id):
+        with self._lock:
+            return job_id in self._jobs
+
+    def __setitem__(self, job_id, state):
+        self.set(job_id, state)
+
+    def __getitem__(self, job_id):
+        state = self.get(job_id)
+        if state is None:
+            raise KeyError(job_id)
+        return state
+
+    def set(self, job_id, state, persist=True):
+        """Replaces a job record."""
+        with self._lock:
+            self._store(job_id, dict(state), persist)
+            self._publish(job_id, state)
+
+    def update(self, job_id, state, persist=True):
+        """Merges fields into a job record; None values keep what is already there."""
+        with self._lock:
+            merged = {**self._jobs.get(job_id, {}), **{k: v for k, v in state.items() if v is not None}}
+            self._store(job_id, merged, persist)
+            self._publish(job_id, merged)
+        return merged
+
+    def progress(self, job_id, stage, done, total):
+        """Byte progress for a stage. Throttled and kept in memory only."""
+        now = time.monotonic()
+        finished = total is not None and done >= total
+        with self._lock:
+            if not finished and now - self._last_progress.get(job_id, 0) < PROGRESS_INTERVAL:
+                return
+            self._last_progress[job_id] = now
+        self.update(job_id, {"stage": stage, "bytes_done": done, "bytes_total": total}, persist=False)
+
+    def items(self):
+        with self._lock:
+            return [(job_id, dict(state)) for job_id, state in self._jobs.items()]
+
+    # --- Event stream ---
+
+    def subscribe(self) -> asyncio.Queue:
+        """Must be called from the event loop that will consume the queue."""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers = [(loop, q) for loop, q in self._subscribers if q is not queue]
+
+    def _publish(self, job_id, state):
+        # Called with the lock held so events go out in the order states change
+        event = {"job_id": job_id, **state}
+        for loop, queue in self._subscribers:
+            loop.call_soon_threadsafe(_offer, queue, event)
+
+    # --- Storage ---
+
+    def _store(self, job_id, state, persist):
+        now = time.time()
+        self._jobs[job_id] = state
+        self._jobs.move_to_end(job_id)
+        self._touched[job_id] = now
+        if persist:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO jobs (job_id, state, updated_at) VALUES (?, ?, ?)',
+                (job_id, json.dumps(state), now)
+            )
+        evicted = self._evict(now)
+        if persist or evicted:
+            self._conn.commit()
+
+    def _evict(self, now):
+        expired = [
+            job_id for job_id, state in self._jobs.items()
+            if state.get("status") in FINISHED_STATES and now - self._touched.get(job_id, now) > self.ttl
+        ]
+        # Over capacity: drop the least recently used, finished jobs first
+        overflow = len(self._jobs) - len(expired) - self.max_jobs
+        if overflow > 0:
+            lru = [job_id for job_id in self._jobs if job_id not in expired]
+            lru.sort(key=lambda job_id: self._jobs[job_id].get("status") not in FINISHED_STATES)
+            expired += lru[:overflow]
+
+        for job_id in expired:
+            self._jobs.pop(job_id, None)
+            self._touched.pop(job_id, None)
+            self._last_progress.pop(job_id, None)
+        if expired:
+            self._conn.executemany('DELETE FROM jobs WHERE job_id = ?', [(job_id,) for job_id in expired])
+        return bool(expired)
+
+    def _load(self):
+        now = time.time()
+        self._conn.execute('DELETE FROM jobs WHERE updated_at < ?', (now - self.ttl,))
+        rows = self._conn.execute(
+            'SELECT job_id, state, updated_at FROM jobs ORDER BY updated_at DESC LIMIT ?', (self.max_jobs,)
+        ).fetchall()
+
+        for job_id, state, updated_at in reversed(rows):
+            state = json.loads(state)
+            if state.get("status") in INTERRUPTED_STATES:
+                state = {**state, "status": "error", "message": "Interrupted by a server restart."}
+                self._conn.execute('UPDATE jobs SET state = ? WHERE job_id = ?', (json.dumps(state), job_id))
+            self._jobs[job_id] = state
+            self._touched[job_id] = updated_at
+        self._conn.commit()
+
+def _offer(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # A stalled client misses intermediate updates; it gets a fresh snapshot on reconnect
+        pass
@@ -0,0 +1,158 @@
+import os
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# scheduler.py
+# Runs ingest jobs in three stages:
+#   prepare -> CPU pool (identification, hashing, naming)
+#   commit  -> per-device worker (the actual writes to the library drive)
+#   finish  -> finish pool (artwork/CFG fetches and other follow-up work)
+# so a batch of uploads never has more than N writers on the same device.
+# Finishes have a pool of their own: they mostly wait on the network, and
+# sharing the prepare pool would hold a finished game's art behind a batch
+# of hashes (and the next prepares behind slow downloads).
+
+DEFAULT_PRIORITY = 10
+# Library maintenance (e.g. compression) waits behind any uploads
+BACKGROUND_PRIORITY = 100
+
+def device_id(path):
+    """st_dev of the closest existing parent of path, used to group jobs per drive."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return path
+
+class IngestScheduler:
+    """
+    Bounded ingest scheduler with one FIFO priority queue per target device.
+    Lower priority values run first; equal priorities run in submission order.
+
+    prepare(): returns a plan dict containing "dest_path", or an error dict
+               ({"status": "error", ...}) which ends the job.
+    commit(plan): does the device I/O and returns the job result.
+    finish(plan, result): optional follow-up, returns the final result.
+
+    on_positions({job_id: position}) hears about queue positions that moved
+    (0 once a job starts writing), only when a device queue gains or loses
+    a job.
+    """
+
+    def __init__(self, workers_per_device=1, cpu_workers=2, finish_workers=2, on_update=None, on_positions=None):
+        self.workers_per_device = max(1, workers_per_device)
+        self.on_update = on_update
+        self.on_positions = on_positions
+        self._cpu_pool = ThreadPoolExecutor(max_workers=max(1, cpu_workers), thread_name_prefix='ingest-cpu')
+        self._finish_pool = ThreadPoolExecutor(max_workers=max(1, finish_workers), thread_name_prefix='ingest-finish')
+        self._cond = threading.Condition()
+        self._queues = {}
+        self._workers = {}
+        self._running = set()
+        self._seq = itertools.count()
+        # Last reported positions per device; reports are serialized so they arrive in order
+        self._positions = {}
+        self._positions_lock = threading.Lock()
+
+    def submit(self, job_id, prepare, commit, finish=None, priority=DEFAULT_PRIORITY):
+        self._update(job_id, {"status": "preparing"})
+        # Ordered by submission, not by which prepare happens to finish first
+        self._cpu_pool.submit(self._run_prepare, job_id, prepare, commit, finish, priority, next(self._seq))
+
+    def position(self, job_id):
+        """1-based place in its device queue, 0 while writing, None if not queued."""
+        with self._cond:
+            if job_id in self._running:
+                return 0
+            for queue in self._queues.values():
+                ordered = sorted(queue)
+                for index, entry in enumerate(ordered):
+                    if entry[2] == job_id:
+                        return index + 1
+        return None
+
+    def queue_lengths(self) -> dict:
+        with self._cond:
+            return {str(device): len(queue) for device, queue in self._queues.items()}
+
+    def _run_prepare(self, job_id, prepare, commit, finish, priority, seq):
+        try:
+            plan = prepare()
+        except Exception as e:
+            plan = {"status": "error", "message": str(e)}
+
+        if plan.get("status") == "error":
+            self._update(job_id, plan)
+            return
+
+        # Report before enqueueing so a fast worker's update can't be overwritten
+        self._update(job_id, {"status": "queued", "title": plan.get("title")})
+
+        device = device_id(os.path.dirname(plan["dest_path"]))
+        with self._cond:
+            heapq.heappush(self._queues.setdefault(device, []), (priority, seq, job_id, plan, commit, finish))
+            self._ensure_workers(device)
+            self._cond.notify_all()
+        self._report_positions(device)
+
+    def _ensure_workers(self, device):
+        workers = [t for t in self._workers.get(device, []) if t.is_alive()]
+        while len(workers) < self.workers_per_device:
+            worker = threading.Thread(target=self._device_worker, args=(device,), daemon=True, name=f'ingest-io-{device}')
+            worker.start()
+            workers.append(worker)
+        self._workers[device] = workers
+
+    def _device_worker(self, device):
+        while True:
+            with self._cond:
+                while not self._queues.get(device):
+                    self._cond.wait()
+                _, _, job_id, plan, commit, finish = heapq.heappop(self._queues[device])
+                self._running.add(job_id)
+
+            self._update(job_id, {"status": "processing", "title": plan.get("title")})
+            self._report_positions(device)
+            try:
+                result = commit(plan)
+            except Exception as e:
+                result = {"status": "error", "message": str(e)}
+            finally:
+                with self._cond:
+                    self._running.discard(job_id)
+
+            if finish and result.get("status") != "error":
+                self._finish_pool.submit(self._run_finish, job_id, finish, plan, result)
+            else:
+                self._update(job_id, result)
+
+    def _run_finish(self, job_id, finish, plan, result):
+        try:
+            result = finish(plan, result)
+        except Exception as e:
+            print(f"[Scheduler] Follow-up for {job_id} failed: {e}")
+        self._update(job_id, result)
+
+    def _report_positions(self, device):
+        """Renumbers one device queue after a push or pop and reports the jobs whose place changed."""
+        with self._positions_lock:
+            with self._cond:
+                positions = {entry[2]: index + 1 for index, entry in enumerate(sorted(self._queues.get(device, [])))}
+            previous = self._positions.get(device, {})
+            changed = {job_id: position for job_id, position in positions.items() if previous.get(job_id) != position}
+            # Jobs that left the queue have started writing
+            changed.update({job_id: 0 for job_id in previous if job_id not in positions})
+            self._positions[device] = positions
+            if changed and self.on_positions:
+                self.on_positions(changed)
+
+    def _update(self, job_id, state):
+        if self.on_update:
+            self.on_update(job_id, state)
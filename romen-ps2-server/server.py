@@ -1,15 +1,24 @@
 from colorama import Fore, Style
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, Request, Body
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, Response, JSONResponse
 from fastapi.staticfiles import StaticFiles
 import uvicorn
+import asyncio
+import json
 import os
-import shutil
+import time
 import uuid
+import threading
 
 # local modules
 import system
+import ingest
+import scheduler
+import jobs
+import artwork
+import database as db
 from system import *
 
 #  - - - CONFIGURABLE - - -
@@ -21,6 +30,41 @@ PORT = 8000
 # - - - APP SETUP - - -
 app = FastAPI()
 
+class UploadAdmission:
+    """
+    Books space for POST /upload before its body is received, turning away
+    uploads that can't fit. The reservation is left in request.state for
+    upload_game to take over; if it doesn't, it is released here.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != "/upload":
+            return await self.app(scope, receive, send)
+
+        # A declared ?size= is exact; Content-Length includes the multipart framing
+        request = Request(scope)
+        declared = request.query_params.get("size") or request.headers.get("content-length")
+        try:
+            request.state.reservation = SPACE.reserve(int(declared)) if declared else None
+        except ValueError:
+            request.state.reservation = None
+        except ingest.InsufficientSpaceError as e:
+            print(f"[API] Rejected upload: {e}")
+            response = JSONResponse({"status": "error", "message": str(e)}, status_code=507)
+            return await response(scope, receive, send)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if request.state.reservation:
+                request.state.reservation.release()
+
+# Added first so CORS wraps its early rejections too
+app.add_middleware(UploadAdmission)
+
 # Development stuff leave commented out
 
 # Middleware setup
@@ -40,52 +84,604 @@ if os.path.exists(img_path):
 
 # - - - APP SETUP - - -
 
-JOB_RESULT = {}
+JOBS = jobs.JobStore()
+UPLOAD_SESSIONS = {}
+# Held while a session is loaded back from its sidecar, so two requests can't both load and book it
+UPLOAD_SESSIONS_LOCK = threading.Lock()
+# Space booked on the library drive for uploads in flight, by upload_id
+UPLOAD_RESERVATIONS = {}
+SPACE = ingest.SpaceLedger(lambda: system.DEVICES.free_space(system.CONFIG.LIB_PATH))
+SSE_HEARTBEAT = 15
+# Versioned art URLs (?v=) never change content, so browsers may keep them forever
+ART_IMMUTABLE = "public, max-age=31536000, immutable"
 
-def process_upload_wrapper(temp_path: str, job_id: str):
-    try:
-        result = system.ProcessUpload(temp_path)
+def get_staging_dir():
+    return ingest.get_staging_dir(system.CONFIG.LIB_PATH, system.CONFIG.UPLOADS_PATH, system.CONFIG.INGEST_MODE)
 
-        JOB_RESULT[job_id] = result
-    except Exception as e:
-        os.remove(temp_path)
-        JOB_RESULT[job_id] = {"status": "error", "message": str(e)}
+def update_job(job_id: str, state: dict):
+    # Keep what we already know (e.g. the identified title) across stage updates
+    JOBS.update(job_id, state)
+
+def update_queue_positions(positions: dict):
+    # Sent by the scheduler only when a device queue gains or loses a job, and only for the jobs that moved
+    for job_id, position in positions.items():
+        JOBS.update(job_id, {"queue_position": position}, persist=False)
+
+SCHEDULER = scheduler.IngestScheduler(
+    workers_per_device=system.CONFIG.INGEST_WORKERS_PER_DEVICE,
+    cpu_workers=system.CONFIG.INGEST_CPU_WORKERS,
+    finish_workers=system.CONFIG.INGEST_FINISH_WORKERS,
+    on_update=update_job,
+    on_positions=update_queue_positions
+)
+
+def queue_upload(temp_path: str, job_id: str, hashes: dict = None, serial: str = None, priority: int = scheduler.DEFAULT_PRIORITY,
+                 reservation: ingest.SpaceReservation = None, title: str = None, keep_source: bool = False, staged: bool = True,
+                 on_committed=None):
+    # The reservation is held until the ISO is on the drive (or the job fails first).
+    # on_committed(result) hears how the file went, before the artwork follow-up.
+    def release(result):
+        if reservation:
+            reservation.release()
+        if on_committed:
+            on_committed(result)
+
+    def prepare():
+        try:
+            plan = system.PrepareUpload(temp_path, hashes, serial, title, keep_source, staged)
+        except Exception as e:
+            release({"status": "error", "message": str(e)})
+            raise
+        if plan["status"] == "error":
+            release(plan)
+        return plan
+
+    def commit(plan):
+        result = {"status": "error", "message": "Transfer failed."}
+        try:
+            result = system.CommitUpload(plan, lambda stage, done, total: JOBS.progress(job_id, stage, done, total))
+            return result
+        finally:
+            release(result)
+
+    SCHEDULER.submit(job_id, prepare=prepare, commit=commit, finish=system.FinishUpload, priority=priority)
+
+class ImportTracker:
+    """
+    Rolls the per-file jobs of a folder import up into the import's own job:
+    each file's status, bytes imported so far and the overall throughput.
+    """
+
+    def __init__(self, job_id, files):
+        self.job_id = job_id
+        self.files = files
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def committed(self, item):
+        def record(result):
+            with self._lock:
+                item["status"] = "error" if result.get("status") == "error" else "imported"
+                item["message"] = result.get("message")
+                JOBS.update(self.job_id, self._summary())
+        return record
+
+    def publish(self) -> dict:
+        # Published under the lock so an older summary can't land after a newer one
+        with self._lock:
+            summary = self._summary()
+            JOBS.update(self.job_id, summary)
+            return summary
+
+    def _summary(self) -> dict:
+        counts = {}
+        for item in self.files:
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+        imported = sum(item["size"] for item in self.files if item["status"] == "imported")
+        total = sum(item["size"] for item in self.files if item["status"] in ("queued", "imported"))
+        elapsed = time.monotonic() - self.started
+        return {
+            "status": "processing" if counts.get("queued") else "completed",
+            "kind": "import",
+            "stage": "importing",
+            "imported": counts.get("imported", 0),
+            "skipped": counts.get("duplicate", 0),
+            "failed": counts.get("error", 0),
+            "bytes_done": imported,
+            "bytes_total": total,
+            # Bytes per second over the whole import, waits in the device queue included
+            "throughput": imported / elapsed if elapsed > 0 else 0,
+            "files": [dict(item) for item in self.files]
+        }
+
+def track_allocation(reservation, path):
+    # Whatever the staging file already occupies on the library drive is no longer outstanding
+    if reservation and ingest.same_device(path, system.CONFIG.LIB_PATH):
+        reservation.allocated(ingest.allocated_bytes(path))
+
+def identification_callback(job_id: str, filename: str):
+    # Puts the title on the job as soon as the leading sectors give the serial away
+    def on_identified(serial):
+        title = db.query_title_by_serial(serial) or "Unknown Game"
+        print(f"[API] Identified {filename} as {title} ({serial})")
+        JOBS.update(job_id, {"serial": serial, "title": title})
+    return on_identified
 
 @app.post("/upload")
-def upload_game(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+def upload_game(request: Request, file: UploadFile = File(...), job_id: str = None, priority: int = scheduler.DEFAULT_PRIORITY):
     print(f"[API] Receiving file: {file.filename}")
+    reservation = getattr(request.state, "reservation", None)
+
+    # Clients may pick the job id up front so they can watch the transfer
+    job_id = job_id or str(uuid.uuid4())
+    JOBS.set(job_id, {"status": "uploading", "filename": file.filename})
+
+    on_identified = identification_callback(job_id, file.filename)
+
+    # 1. Stream file into the staging dir (on the library drive in stream mode)
+    writer = ingest.IngestWriter(get_staging_dir(), system.CONFIG.INGEST_CHUNK_SIZE, identify=True, on_identified=on_identified,
+                                 expected_size=file.size, writeback_size=system.CONFIG.INGEST_WRITEBACK_SIZE)
+    track_allocation(reservation, writer.path)
+
+    def on_progress(done):
+        JOBS.progress(job_id, "uploading", done, file.size)
+        track_allocation(reservation, writer.path)
 
-    # 1. Save file to uploads dir   
-    temp_path = os.path.join(system.CONFIG.UPLOADS_PATH, file.filename)
     try:
-        with open(temp_path, 'wb') as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        writer.copy_from(file.file, progress=on_progress)
+        writer.close()
+    except ingest.UnidentifiableImageError as e:
+        print(f"[API] Rejected {file.filename}: {e}")
+        writer.abort()
+        JOBS.update(job_id, {"status": "error", "message": str(e)})
+        return {"status": "error", "message": str(e), "job_id": job_id}
     except Exception as e:
         print(f"[API] Transfer interrupted or failed: {e}")
 
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-            print(f"[API] Clean up partial file: {temp_path}")
+        writer.abort()
+        print(f"[API] Clean up partial file: {writer.path}")
+        JOBS.update(job_id, {"status": "error", "message": "Upload cancelled."})
         return {"status": "error", "message": "Upload cancelled."}
 
-    job_id = str(uuid.uuid4())
-    JOB_RESULT[job_id] = {"status": "processing"}
+    request.state.reservation = None
+    queue_upload(writer.path, job_id, writer.hasher.hexdigests(), writer.serial, priority, reservation)
+    return {"job_id": job_id}
+
+@app.post("/upload/stream")
+async def stream_upload(request: Request, filename: str, size: int = None, job_id: str = None,
+                        priority: int = scheduler.DEFAULT_PRIORITY, encoding: str = None):
+    """
+    Raw upload: the request body is the ISO itself (application/octet-stream),
+    so nothing is spooled to a temp file by a multipart parser. The event loop
+    only gathers network chunks; each full buffer is written and hashed on a
+    worker thread while the next one fills. Reading pauses while a write is
+    still behind, so memory stays at two buffers and no thread waits on the
+    network.
+
+    With encoding=gzip or deflate the body is the compressed ISO; each buffer
+    is inflated on the same worker thread, piece by piece, as it is written.
+    size is then the uncompressed size.
+    """
+    if encoding and encoding not in ingest.TRANSPORT_ENCODINGS:
+        return JSONResponse({"status": "error", "message": f"Unsupported encoding: {encoding}"}, status_code=415)
+    # Content-Length is the compressed size when the body is encoded
+    declared = size if size is not None or encoding else request.headers.get("content-length")
+    declared = int(declared) if declared else None
+    try:
+        reservation = SPACE.reserve(declared) if declared else None
+    except ingest.InsufficientSpaceError as e:
+        print(f"[API] Rejected {filename}: {e}")
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=507)
+
+    print(f"[API] Receiving stream: {filename}")
+    job_id = job_id or str(uuid.uuid4())
+    chunk_size = system.CONFIG.INGEST_CHUNK_SIZE
+
+    def open_writer():
+        JOBS.set(job_id, {"status": "uploading", "filename": filename})
+        writer = ingest.IngestWriter(get_staging_dir(), chunk_size, identify=True,
+                                     on_identified=identification_callback(job_id, filename), expected_size=declared,
+                                     writeback_size=system.CONFIG.INGEST_WRITEBACK_SIZE)
+        track_allocation(reservation, writer.path)
+        return writer
+
+    decoder = ingest.TransportDecoder(encoding, chunk_size, size) if encoding else None
+
+    def write(buffer):
+        if decoder:
+            for piece in decoder.decode(buffer):
+                writer.write(piece)
+        else:
+            writer.write(buffer)
+        track_allocation(reservation, writer.path)
+
+    def finish():
+        if decoder:
+            writer.write(decoder.finish())
+
+    writer = None
+    pending = None
+    buffer = bytearray()
+    received = 0
+    try:
+        # Inside the guard, so a staging folder that can't be written still releases the reservation
+        writer = await run_in_threadpool(open_writer)
+        async for chunk in request.stream():
+            buffer += chunk
+            received += len(chunk)
+            if len(buffer) >= chunk_size:
+                # Backpressure: at most one write in flight behind the network
+                if pending:
+                    await pending
+                pending = asyncio.ensure_future(run_in_threadpool(write, buffer))
+                buffer = bytearray()
+                JOBS.progress(job_id, "uploading", decoder.decoded if decoder else received, declared)
+
+        if pending:
+            await pending
+            pending = None
+        if buffer:
+            await run_in_threadpool(write, buffer)
+        await run_in_threadpool(finish)
+        if decoder:
+            print(f"[API] {filename}: {received} bytes over the wire for {decoder.decoded} ({encoding})")
+            received = decoder.decoded
+        if size is not None and received != size:
+            raise IOError(f"Received {received} of {size} bytes.")
+        await run_in_threadpool(writer.close)
+    except Exception as e:
+        # Let a write still running finish before its file is removed underneath it
+        if pending:
+            await asyncio.gather(pending, return_exceptions=True)
+        if writer is not None:
+            await run_in_threadpool(writer.abort)
+        if reservation:
+            reservation.release()
+
+        if writer is None:
+            print(f"[API] Could not start receiving {filename}: {e}")
+            message = f"Could not start the upload: {e}"
+        elif isinstance(e, (ingest.UnidentifiableImageError, ingest.TransportError)):
+            print(f"[API] Rejected {filename}: {e}")
+            message = str(e)
+        else:
+            print(f"[API] Transfer interrupted or failed: {e}")
+            message = "Upload cancelled."
+        JOBS.update(job_id, {"status": "error", "message": message})
+        return {"status": "error", "message": message, "job_id": job_id}
 
-    background_tasks.add_task(process_upload_wrapper, temp_path, job_id)
+    JOBS.progress(job_id, "uploading", received, received)
+    await run_in_threadpool(queue_upload, writer.path, job_id, writer.hasher.hexdigests(), writer.serial, priority, reservation)
     return {"job_id": job_id}
 
+# - - - RESUMABLE UPLOADS - - -
+
+def watch_identification(session):
+    session.identifier.on_identified = identification_callback(session.job_id, session.filename)
+
+def get_upload_session(upload_id: str):
+    session = UPLOAD_SESSIONS.get(upload_id)
+    if session is not None:
+        return session
+    with UPLOAD_SESSIONS_LOCK:
+        session = UPLOAD_SESSIONS.get(upload_id)
+        if session is not None:
+            return session
+        # Sessions survive restarts through their sidecar file
+        session = ingest.ChunkedUpload.load(get_staging_dir(), upload_id, system.CONFIG.INGEST_CHUNK_SIZE,
+                                            system.CONFIG.INGEST_WRITEBACK_SIZE)
+        if session is None:
+            return None
+        watch_identification(session)
+        # Already accepted before the restart, so it's booked without another admission check
+        UPLOAD_RESERVATIONS[upload_id] = SPACE.reserve(session.size, check=False)
+        track_allocation(UPLOAD_RESERVATIONS[upload_id], session.path)
+        if session.job_id not in JOBS:
+            JOBS.set(session.job_id, {"status": "uploading", "filename": session.filename})
+        UPLOAD_SESSIONS[upload_id] = session
+    return session
+
+def upload_status(session):
+    # Tells the browser which encodings it may compress chunks with
+    encodings = list(ingest.TRANSPORT_ENCODINGS) if system.CONFIG.INGEST_TRANSPORT_COMPRESSION else []
+    return {**session.status(), "encodings": encodings}
+
+def release_upload_space(upload_id: str):
+    reservation = UPLOAD_RESERVATIONS.pop(upload_id, None)
+    if reservation:
+        reservation.release()
+
+@app.post("/uploads")
+def create_upload(filename: str, size: int):
+    if size < 0:
+        return {"status": "error", "message": "Invalid file size."}
+
+    # Refuse before any bytes are sent rather than after the drive fills up
+    try:
+        reservation = SPACE.reserve(size)
+    except ingest.InsufficientSpaceError as e:
+        print(f"[API] Rejected {filename}: {e}")
+        return {"status": "error", "message": str(e)}
+
+    job_id = str(uuid.uuid4())
+    try:
+        session = ingest.ChunkedUpload.create(get_staging_dir(), filename, size, system.CONFIG.INGEST_CHUNK_SIZE, job_id,
+                                              system.CONFIG.INGEST_WRITEBACK_SIZE)
+    except Exception:
+        reservation.release()
+        raise
+    watch_identification(session)
+    UPLOAD_SESSIONS[session.upload_id] = session
+    UPLOAD_RESERVATIONS[session.upload_id] = reservation
+    track_allocation(reservation, session.path)
+    JOBS.set(job_id, {"status": "uploading", "filename": filename})
+
+    print(f"[API] Started resumable upload {session.upload_id} for {filename}")
+    return upload_status(session)
+
+@app.get("/uploads/{upload_id}")
+def get_upload(upload_id: str):
+    session = get_upload_session(upload_id)
+    if session is None:
+        return {"status": "error", "message": "Upload session not found."}
+    return upload_status(session)
+
+@app.put("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, offset: int, request: Request, encoding: str = None):
+    session = get_upload_session(upload_id)
+    if session is None:
+        return {"status": "error", "message": "Upload session not found."}
+    if encoding and (encoding not in ingest.TRANSPORT_ENCODINGS or not system.CONFIG.INGEST_TRANSPORT_COMPRESSION):
+        return {"status": "error", "message": f"Unsupported encoding: {encoding}"}
+
+    # A raw chunk is at most the session's chunk size; a compressed one gets a fixed bound on the wire
+    limit = ingest.MAX_CHUNK_SIZE if encoding else session.chunk_size
+    declared = int(request.headers.get("content-length") or 0)
+    if declared > limit:
+        return {"status": "error", "message": "Chunk too large."}
+
+    def write(data):
+        # A compressed chunk is inflated in memory like a raw one is received, up to the same limit
+        if encoding:
+            data = ingest.decode_body(data, encoding, session.chunk_size)
+        session.write_at(offset, data)
+
+    # Counted as it arrives: Content-Length can be missing (chunked transfer) or wrong
+    data = bytearray()
+    async for piece in request.stream():
+        data += piece
+        if len(data) > limit:
+            return {"status": "error", "message": "Chunk too large."}
+    try:
+        await run_in_threadpool(write, data)
+    except ingest.UnidentifiableImageError as e:
+        print(f"[API] Rejected {session.filename}: {e}")
+        UPLOAD_SESSIONS.pop(upload_id, None)
+        release_upload_space(upload_id)
+        session.abort()
+        JOBS.update(session.job_id, {"status": "error", "message": str(e)})
+        return {"status": "error", "message": str(e)}
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+    JOBS.progress(session.job_id, "uploading", session.bytes_received, session.size)
+    track_allocation(UPLOAD_RESERVATIONS.get(upload_id), session.path)
+
+    return {"status": "success", "bytes_received": session.bytes_received}
+
+@app.post("/uploads/{upload_id}/finalize")
+def finalize_upload(upload_id: str, priority: int = scheduler.DEFAULT_PRIORITY):
+    session = get_upload_session(upload_id)
+    if session is None:
+        return {"status": "error", "message": "Upload session not found."}
+    if not session.complete:
+        return {"status": "error", "message": "Upload is missing byte ranges.", **session.status()}
+
+    UPLOAD_SESSIONS.pop(upload_id, None)
+    hashes = session.hexdigests()
+    session.close()
+
+    queue_upload(session.path, session.job_id, hashes, session.serial, priority, UPLOAD_RESERVATIONS.pop(upload_id, None))
+    return {"job_id": session.job_id}
+
+@app.delete("/uploads/{upload_id}")
+def cancel_upload(upload_id: str):
+    session = get_upload_session(upload_id)
+    if session is None:
+        return {"status": "error", "message": "Upload session not found."}
+
+    UPLOAD_SESSIONS.pop(upload_id, None)
+    release_upload_space(upload_id)
+    session.abort()
+    JOBS.update(session.job_id, {"status": "error", "message": "Upload cancelled."})
+    return {"status": "success", "message": "Upload cancelled."}
+
+# - - - RESUMABLE UPLOADS - - -
+
 @app.get("/job/{job_id}")
 def get_job_status(job_id: str):
-    result = JOB_RESULT.get(job_id)
+    result = JOBS.get(job_id)
 
     if result:
         return result
     return {"status": "processing"}
 
+@app.get("/jobs/events")
+async def job_events(request: Request):
+    """Server-Sent Events stream of every job's stage and byte progress."""
+    queue = JOBS.subscribe()
+
+    async def stream():
+        try:
+            # Snapshot first, so (re)connecting clients catch up on anything they missed
+            for job_id, state in JOBS.items():
+                yield f"event: job\ndata: {json.dumps({'job_id': job_id, **state})}\n\n"
+
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT)
+                    yield f"event: job\ndata: {json.dumps(event)}\n\n"
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            JOBS.unsubscribe(queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match", "")
+    return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+
 @app.get("/library")
-def get_library():
-    response = system.get_library()
-    return response
+def get_library(request: Request):
+    state = system.get_library_revision()
+    if state is None:
+        return system.get_library()
+
+    # The revision changes with every write, so an unchanged library is answered without reading it
+    library_id, revision = state
+    headers = {"ETag": f'W/"{library_id}-{revision}"', "Cache-Control": "no-cache"}
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(system.get_library(), headers=headers)
+
+@app.get("/library/changes")
+def get_library_changes(request: Request, since: int = 0, library: str = None):
+    changes = system.get_library_changes(since, library)
+    if changes is None:
+        return {"library": None, "revision": 0, "reset": True, "upserts": [], "deleted": []}
+
+    headers = {
+        "ETag": f'W/"{changes["library"]}-{since}-{changes["revision"]}-{int(changes["reset"])}"',
+        "Cache-Control": "no-cache",
+    }
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(changes, headers=headers)
+
+@app.get("/library/search")
+def search_library(q: str = None, region: str = None, genre: str = None, developer: str = None,
+                   sort: str = None, order: str = "asc", cursor: str = None, limit: int = None):
+    filters = {"region": region, "genre": genre, "developer": developer}
+    return system.search_library(q, filters, sort, order == "desc", cursor, limit)
+
+@app.get("/library/precheck")
+def precheck_upload(serial: str, size: int = None, fingerprint: str = None):
+    # Asked by the browser before an upload: the serial comes from SYSTEM.CNF, the fingerprint from File.slice()
+    return system.check_duplicate(serial, size, fingerprint)
+
+@app.get("/art/{serial}/{kind}")
+def get_art(serial: str, kind: str, request: Request, w: int = None, v: str = None):
+    art = artwork.resolve(system.CONFIG.LIB_PATH, serial, kind, w, request.headers.get("accept", ""))
+    if art is None:
+        return Response(status_code=404)
+
+    headers = {
+        "ETag": art.etag,
+        # Unversioned URLs still work, but have to be revalidated
+        "Cache-Control": ART_IMMUTABLE if v == art.version else "no-cache",
+        "Vary": "Accept",
+    }
+    if etag_matches(request, art.etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(art.path, media_type=art.media_type, headers=headers)
+
+@app.post("/library/{serial}/verify")
+def verify_game(serial: str):
+    return system.verify_game(serial)
+
+@app.post("/library/delete")
+def delete_games(serials: list[str] | str = Body(..., embed=True)):
+    """Bulk delete: {"serials": [...]} or {"serials": "all"}, with a result per game."""
+    if isinstance(serials, str):
+        if serials != "all":
+            return {"status": "error", "message": 'serials must be a list or "all".'}
+        serials = None
+    return system.remove_games(serials)
+
+@app.post("/library/import")
+def import_folder(path: str, recursive: bool = True, move: bool = False, job_id: str = None,
+                  priority: int = scheduler.DEFAULT_PRIORITY):
+    """
+    Imports every ISO in a folder on the server's own disks. Files are
+    identified up front, games already in the library are skipped, and the
+    rest are copied (moved with move=true) through the ingest scheduler in
+    folder order. Progress is published on job_id as well as per file.
+    """
+    real_path = os.path.realpath(path)
+    if not os.path.isdir(real_path):
+        return {"status": "error", "message": "Directory does not exist."}
+
+    job_id = job_id or str(uuid.uuid4())
+    JOBS.set(job_id, {"status": "processing", "kind": "import", "stage": "identifying", "path": real_path})
+    try:
+        files = system.plan_import(real_path, recursive)
+    except OSError as e:
+        response = {"status": "error", "message": f"Failed to read {real_path}: {e}"}
+        JOBS.update(job_id, response)
+        return {**response, "job_id": job_id}
+
+    tracker = ImportTracker(job_id, files)
+    for item in files:
+        if item["status"] != "ready":
+            continue
+        # A move within the library drive is a rename and needs no room
+        reservation = None
+        if not (move and ingest.same_device(item["path"], system.CONFIG.LIB_PATH)):
+            try:
+                reservation = SPACE.reserve(item["size"])
+            except ingest.InsufficientSpaceError as e:
+                item.update(status="error", message=str(e))
+                continue
+
+        item.update(status="queued", job_id=str(uuid.uuid4()))
+        JOBS.set(item["job_id"], {"status": "preparing", "kind": "import", "filename": os.path.basename(item["path"]),
+                                  "serial": item["serial"], "title": item["title"]})
+        queue_upload(item["path"], item["job_id"], serial=item["serial"], priority=priority, reservation=reservation,
+                     title=item["title"], keep_source=not move, staged=False, on_committed=tracker.committed(item))
+
+    summary = tracker.publish()
+    print(f"[API] Importing {summary['bytes_total'] // 2**20} MB from {real_path}: {len(files)} files, "
+          f"{summary['skipped']} already in the library, {summary['failed']} failed.")
+    return {**summary, "status": "success", "job_id": job_id,
+            "message": f"{sum(1 for item in files if item['status'] == 'queued')} games queued for import."}
+
+@app.post("/library/compress")
+def compress_games(serials: list[str] | str = Body("all", embed=True), priority: int = scheduler.BACKGROUND_PRIORITY):
+    """Queues games still stored as ISOs for ZSO compression, one job per game; "all" picks every one."""
+    selected = system.compressible_games(None if serials == "all" else ([serials] if isinstance(serials, str) else serials))
+
+    def commit(job_id):
+        def run(plan):
+            # The ISO stays until its ZSO is verified, so the copy needs room of its own
+            try:
+                reservation = SPACE.reserve(plan["file_size"])
+            except ingest.InsufficientSpaceError as e:
+                return {"status": "error", "message": str(e)}
+            try:
+                return system.CommitCompression(plan, lambda stage, done, total: JOBS.progress(job_id, stage, done, total))
+            finally:
+                reservation.release()
+        return run
+
+    queued = []
+    for serial in selected:
+        job_id = str(uuid.uuid4())
+        JOBS.set(job_id, {"status": "preparing", "kind": "compress", "serial": serial})
+        SCHEDULER.submit(job_id, prepare=lambda serial=serial: system.PrepareCompression(serial), commit=commit(job_id), priority=priority)
+        queued.append({"serial": serial, "job_id": job_id})
+
+    return {"status": "success", "message": f"{len(queued)} games queued for compression.", "jobs": queued}
+
+# Registered before /library/{serial}, which would otherwise take "clear" as a serial
+@app.delete("/library/clear")
+def clear_library():
+    report = system.remove_games(None)
+
+    if report["status"] != "error":
+        return {**report, "message": "Library cleared"}
+    else:
+        return {**report, "message": "Failed to clear library"}
 
 @app.delete("/library/{serial}")
 def delete_game(serial: str):
@@ -97,26 +693,23 @@ def delete_game(serial: str):
         # Return 500 or 404 depending on logic, keeping it simple here
         return {"status": "error", "message": "Failed to remove game"}
 
-@app.delete("/library/clear")
-def clear_library():
-    success = system.remove_all_from_library()
-
-    if success:
-        return {"status": "success", "message": "Library cleared"}
-    else:
-        # Return 500 or 404 depending on logic, keeping it simple here
-        return {"status": "error", "message": "Failed to clear library"}
-
 
 @app.post("/rebuild-library")
-def rebuild_library():
-    response = system.rebuild_library()
-    return response
+def rebuild_library(full: bool = False, job_id: str = None):
+    # Progress is published as a job so it shows up on the event stream
+    job_id = job_id or str(uuid.uuid4())
+    JOBS.set(job_id, {"status": "processing", "kind": "rebuild"})
+
+    response = system.rebuild_library(full, progress=lambda stage, done, total: JOBS.progress(job_id, stage, done, total))
+    JOBS.update(job_id, response)
+    return {**response, "job_id": job_id}
 
 @app.get("/device")
 def get_device():
     try:
-        return system.get_storage_device(system.CONFIG.LIB_PATH)
+        device = system.get_storage_device(system.CONFIG.LIB_PATH)
+        # Space already promised to uploads in flight
+        return {**device, "space_reserved": SPACE.status()["reserved"]} if device else device
     except Exception as e:
         return {"status" : "error" , "message": "Failed to get storage device"}
 
@@ -1,18 +1,16 @@
 import os
-import io
-import requests
 from colorama import Fore, Style
 import json
 import config
 import database as db
 import iso
-import shutil
-import psutil
-import subprocess
-import sys
+import ingest
+import assets
+import artwork
+import devices
+import zso
+from concurrent.futures import ThreadPoolExecutor
 import re
-import ctypes # <--- Added for Windows Drive Label support
-from PIL import Image
 
 # Load settings.json as an obj
 CONFIG = None
@@ -21,6 +19,27 @@ SETTINGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'settin
 with open(SETTINGS_PATH) as f:
     CONFIG = config.Config(json.load(f))
 
+# Worker pools here are threads, never processes: the heavy work (lz4/zlib,
+# Pillow, file I/O) drops the GIL, and under spawn (Windows, macOS) each worker
+# process would re-import server.py, reloading the job store and starting
+# another scheduler.
+# Shared, pooled fetcher for art and CFG downloads
+ASSETS = assets.AssetFetcher()
+# Cover resizing stage, fed by the download workers
+COVERS = artwork.CoverProcessor(workers=CONFIG.COVER_WORKERS)
+# Mount, label and free-space cache behind /device and VerifyDir
+DEVICES = devices.DeviceMonitor()
+# Parallel unlinks when removing games in bulk
+DELETE_WORKERS = 4
+# ZSO writer for compressed ingest and the library compression job
+COMPRESSOR = zso.ZsoCompressor(workers=CONFIG.COMPRESSION_WORKERS, level=CONFIG.COMPRESSION_LEVEL)
+# Images that shrink by less than this are kept as ISOs
+ZSO_MIN_SAVINGS = 0.05
+# Files picked up by folder imports
+IMPORT_EXTENSIONS = ('.iso',)
+# Threads identifying an import's files; mostly a few small reads each, so more than the cores
+IMPORT_IDENTIFY_WORKERS = 8
+
 # Directory Methods
 def VerifyDir(path) -> tuple[bool, str]:
     if not path:
@@ -65,11 +84,20 @@ def CheckDatabases():
     current_db_path = db.get_db_path()
     if not current_db_path or not os.path.exists(current_db_path):
         libExists = Fore.YELLOW + 'Not connected' + Style.RESET_ALL
+    else:
+        # Brings older library DBs up to the current schema
+        db.initialize_library()
         
-    # 2. Check Map DB (Static Path)
+    # 2. Check Map DB (Static Path): built/updated from local files, no network needed
     if not os.path.exists(db.MAP_DB_LOCAL_PATH):
-        db.initialize_map()
         mapExists = Fore.YELLOW + 'Initialized' + Style.RESET_ALL
+    db.update_title_map_offline()
+    if not os.path.exists(db.MAP_DB_LOCAL_PATH):
+        # No snapshot shipped; fall back to downloading the list
+        db.initialize_map()
+
+    # 3. Optional reference hashes for integrity checks
+    db.import_reference_hashes()
         
     print("-" * 30)
     print("| Database Verification System")
@@ -78,29 +106,58 @@ def CheckDatabases():
         print(f"|- {name}: {status}")
     print("-" * 30)
 
-def ProcessUpload(temp_path: str):
+def ProcessUpload(temp_path: str, hashes: dict = None, serial: str = None):
+    """Runs every ingest stage for one upload in the calling thread."""
+    plan = PrepareUpload(temp_path, hashes, serial)
+    if plan["status"] == "error":
+        return plan
+
+    result = CommitUpload(plan)
+    if result["status"] == "error":
+        return result
+    return FinishUpload(plan, result)
+
+def PrepareUpload(temp_path: str, hashes: dict = None, serial: str = None, title: str = None, keep_source: bool = False,
+                  staged: bool = True):
+    """
+    CPU stage: identifies the game, fills in missing hashes and works out the
+    OPL destination. Returns a plan for CommitUpload or an error dict.
+    keep_source copies temp_path instead of moving it (imports from a folder
+    the user keeps). staged=False marks temp_path as the user's own file
+    (an import): it is never deleted on failure, and a move only removes it
+    once the game is in the library.
+    """
     global db
     
     # 1. Validation
     if not os.path.exists(temp_path):
         return {"status": "error", "message": "Upload failed: Temp file not found."}
 
-    serial = iso.get_serial(temp_path)
+    # The serial is usually already known from the upload's leading sectors
+    if serial is None:
+        serial = iso.get_serial(temp_path)
     if serial is None:
-        if os.path.exists(temp_path): os.remove(temp_path)
+        if staged and os.path.exists(temp_path): os.remove(temp_path)
         return {"status": "error", "message": "Game Lacks Valid Serial Number"}
 
+    # Hashes are normally computed while receiving; only re-read if they are missing
+    if not hashes:
+        hashes = ingest.hash_file(temp_path, CONFIG.INGEST_CHUNK_SIZE)
+    # Lets later uploads of the same dump be spotted before they're sent
+    fingerprint = ingest.fingerprint_file(temp_path)
+
     # 2. Get Metadata
-    game_title = db.query_title_by_serial(serial) or "Unknown Game"
+    game_title = title or db.query_title_by_serial(serial) or "Unknown Game"
     # Clean invalid chars for Windows/exFAT (including dots to prevent extension issues)
     clean_title = re.sub(r'[<>:"/\\|?*]', '', game_title).strip()
     
-    # Standard OPL naming format: SERIAL.Title.iso
-    file_name = f'{serial}.{clean_title}.iso'
+    # Standard OPL naming format: SERIAL.Title.iso (.zso when compressing on ingest)
+    compress = CONFIG.COMPRESSION_FORMAT == "zso"
+    file_name = f'{serial}.{clean_title}{zso.ZSO_EXTENSION if compress else ".iso"}'
     
     # 3. Determine Destination
     file_size = os.path.getsize(temp_path)
-    # 700MB cutoff for CD vs DVD
+    # 700MB cutoff for CD vs DVD (by the uncompressed size for ZSO too)
     if file_size > 734003200:
         sub_folder = "DVD"
     else:
@@ -110,26 +167,75 @@ def ProcessUpload(temp_path: str):
     dest_dir = os.path.join(CONFIG.LIB_PATH, sub_folder)
     dest_path = os.path.join(dest_dir, file_name)
 
+    return {
+        "status": "ready",
+        "temp_path": temp_path,
+        "dest_path": dest_path,
+        "serial": serial,
+        "title": clean_title,
+        "file_size": file_size,
+        "hashes": hashes,
+        "fingerprint": fingerprint,
+        "compress": compress,
+        "keep_source": keep_source,
+        "staged": staged
+    }
+
+def CommitUpload(plan: dict, progress=None):
+    """
+    Device stage: moves the upload onto the library drive and records it.
+    progress(stage, done, total) reports the copy or compression as it goes.
+    """
+    global db
+
+    temp_path = plan["temp_path"]
+    dest_path = plan["dest_path"]
+    serial = plan["serial"]
+    clean_title = plan["title"]
+    file_size = plan["file_size"]
+    hashes = plan["hashes"]
+    keep_source = plan.get("keep_source", False)
+    staged = plan.get("staged", True)
+    # Set once a moved import has been renamed into the library, so a failure can rename it back
+    renamed = False
+
     print(f"[Task] Transferring {clean_title} to {dest_path}...")
 
     try:
         # 4. Ensure Destination Directory Exists
-        os.makedirs(dest_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
 
         # 5. Check for duplicates / collisions
         if os.path.exists(dest_path):
             print(f"[Warning] File already exists at {dest_path}. Overwriting.")
 
-        # 6. MANUAL COPY (Replaces shutil.move to handle cross-device moves safer)
-        shutil.copy2(temp_path, dest_path)
+        # 6. Commit the upload. Streamed uploads already sit on the library
+        # drive, so this is an atomic rename; a copy only happens when the
+        # staging folder is on a different device. Compressed ingest writes
+        # the ZSO from the staged ISO instead.
+        sizes = None
+        if plan.get("compress"):
+            try:
+                sizes = compress_image(temp_path, dest_path, progress)
+            except Exception as e:
+                # The game is still good as an ISO; a failed compression shouldn't cost the upload
+                print(f"[Warning] Compressing {clean_title} failed, storing the ISO instead: {e}")
+        if not sizes:
+            if plan.get("compress"):
+                dest_path = os.path.splitext(dest_path)[0] + '.iso'
+            # Staged files are moved straight away. A moved import is renamed only
+            # on its own device; otherwise it is copied and removed once recorded.
+            renamed = not staged and not keep_source and ingest.same_device(temp_path, os.path.dirname(dest_path))
+            ingest.commit_file(temp_path, dest_path, CONFIG.INGEST_CHUNK_SIZE,
+                               (lambda done, total: progress("copying", done, total)) if progress else None,
+                               CONFIG.INGEST_WRITEBACK_SIZE, CONFIG.INGEST_KERNEL_COPY,
+                               keep_source or (not staged and not renamed))
 
         # 7. Verify Integrity
-        if os.path.getsize(dest_path) != file_size:
+        if os.path.getsize(dest_path) != (sizes["compressed_size"] if sizes else file_size):
             raise IOError("Copy validation failed: Destination size mismatch.")
 
-        # 8. Delete Source
-        os.remove(temp_path)
-        print(f"[Task] Transfer complete. Source deleted.")
+        print("[Task] Transfer complete.")
 
         # 9. Update Database
         # IMPORTANT: We store the FULL path now. 
@@ -137,16 +243,19 @@ def ProcessUpload(temp_path: str):
         cleanSerial = db.clean_serial(serial)
         cover_url = f"{CONFIG.COVERS_URL}/{cleanSerial}.jpg"
         
-        db.add_game_to_library(serial, clean_title, dest_path, file_size, cover_url)
-        
-        # 10. Trigger Cover Download
-        download_cover(serial)
-
-        # 11. Trigger Disc Download
-        download_disc(serial)
-
-        # 12. Trigger CFG Download
-        download_cfg(serial)
+        if not db.add_game_to_library(serial, clean_title, dest_path, os.path.getsize(dest_path), cover_url, hashes, os.path.getmtime(dest_path),
+                                      file_size, sizes["compressed_size"] if sizes else None, plan.get("fingerprint")):
+            # Unrecorded, so the handler below takes the copy back out and the source stays
+            raise IOError("Could not record the game in the library database.")
+        # Only now is the source no longer needed (a ZSO was written from it, or it was copied)
+        if not keep_source and os.path.exists(temp_path):
+            os.remove(temp_path)
+        DEVICES.refresh_usage(CONFIG.LIB_PATH)
+
+        if hashes:
+            reference = db.query_reference_hashes(serial)
+            if reference and ingest.compare_hashes(reference, hashes):
+                print(f"[Warning] {clean_title} does not match the reference dump for {serial}.")
         
         return {
             "status": "completed", 
@@ -157,20 +266,212 @@ def ProcessUpload(temp_path: str):
 
     except Exception as e:
         print(f"[Error] Transfer failed: {e}")
+        if renamed and os.path.exists(dest_path) and not os.path.exists(temp_path):
+            # The user's file was renamed into the library; give it back rather than delete it
+            try:
+                os.replace(dest_path, temp_path)
+            except: pass
         # Clean up the potentially half-copied file
-        if os.path.exists(dest_path):
+        elif os.path.exists(dest_path):
             try:
                 os.remove(dest_path)
             except: pass
             
-        # Clean up temp file if it still exists
-        if os.path.exists(temp_path):
+        # Clean up the staged upload; an imported file belongs to the user and stays
+        if staged and os.path.exists(temp_path):
             try:
                 os.remove(temp_path)
             except: pass
             
         return {"status": "error", "message": f"Failed to transfer to USB: {str(e)}"}
 
+def FinishUpload(plan: dict, result: dict):
+    """Follow-up stage: fetches artwork and CFG for a committed game."""
+    # 10-12. Cover, disc and CFG downloads run side by side
+    download_assets(plan["serial"])
+    return result
+
+def scan_import_folder(path, recursive=True):
+    """
+    Walks path with os.scandir and returns [(filepath, size)] for every ISO,
+    sorted by path so an import is queued in a predictable order. Hidden
+    folders (like the staging folder) are skipped.
+    """
+    found = []
+    folders = [path]
+    while folders:
+        with os.scandir(folders.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and not entry.name.startswith('.'):
+                        folders.append(entry.path)
+                elif entry.name.lower().endswith(IMPORT_EXTENSIONS) and entry.is_file():
+                    found.append((entry.path, entry.stat().st_size))
+    return sorted(found)
+
+def identify_image(path):
+    # Pool worker: one unreadable file shouldn't fail the whole import
+    try:
+        return iso.get_serial(path)
+    except Exception:
+        return None
+
+def plan_import(path, recursive=True):
+    """
+    Finds and identifies the ISOs under path for a bulk import. Serials are
+    read on a thread pool and titles looked up in one batch. Returns
+    [{path, size, serial, title, status, message}] in queueing order, where
+    status is "ready", "duplicate" (already in the library, or an earlier
+    file in the folder has the same serial) or "error".
+    """
+    global db
+
+    files = scan_import_folder(path, recursive)
+    if not files:
+        return []
+
+    with ThreadPoolExecutor(max_workers=IMPORT_IDENTIFY_WORKERS, thread_name_prefix='import') as pool:
+        serials = list(pool.map(identify_image, [file_path for file_path, _ in files]))
+
+    titles = db.query_titles_by_serials(serial for serial in serials if serial)
+    in_library = db.get_library_serials()
+    seen = set()
+    plan = []
+    for (file_path, size), serial in zip(files, serials):
+        item = {"path": file_path, "size": size, "serial": serial, "title": titles.get(serial), "status": "ready", "message": None}
+        if serial is None:
+            item.update(status="error", message="Game Lacks Valid Serial Number")
+        elif serial in in_library:
+            item.update(status="duplicate", message=f"{serial} is already in the library.")
+        elif serial in seen:
+            item.update(status="duplicate", message=f"{serial} appears earlier in this folder.")
+        seen.add(serial)
+        plan.append(item)
+    return plan
+
+def compress_image(src_path, dest_path, progress=None):
+    """
+    Writes src_path as a ZSO image at dest_path (through a .part file) and
+    verifies it by decompressing. Returns {original_size, compressed_size},
+    or None when it isn't worth it: the image shrinks by less than
+    ZSO_MIN_SAVINGS, or the drive can't hold a second copy. src_path is
+    left alone either way. progress(stage, done, total) as in CommitUpload.
+    """
+    size = os.path.getsize(src_path)
+    # Worst case the ZSO is as big as the ISO, and both exist until the ISO goes
+    free = DEVICES.free_space(os.path.dirname(dest_path))
+    if free is not None and free < size:
+        print(f"[Task] Not enough space to compress {os.path.basename(src_path)}, keeping the ISO.")
+        return None
+
+    partial_path = dest_path + '.part'
+    try:
+        sizes = COMPRESSOR.compress(src_path, partial_path, progress, CONFIG.INGEST_WRITEBACK_SIZE)
+        if sizes["compressed_size"] > size * (1 - ZSO_MIN_SAVINGS):
+            print(f"[Task] {os.path.basename(src_path)} barely compresses, keeping the ISO.")
+            os.remove(partial_path)
+            return None
+        os.replace(partial_path, dest_path)
+    except Exception:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    print(f"[Task] Compressed {os.path.basename(dest_path)}: {sizes['original_size'] // 2**20} MB -> {sizes['compressed_size'] // 2**20} MB.")
+    return sizes
+
+def PrepareCompression(serial: str):
+    """CPU stage of compressing a library game: checks it and plans the ZSO next to its ISO."""
+    global db
+
+    game = db.query_library_by_serial(serial)
+    if not game:
+        return {"status": "error", "message": f"Game {serial} not found in library."}
+
+    source_path = game["filepath"]
+    if zso.is_zso(source_path):
+        return {"status": "error", "message": f"{game['title']} is already compressed."}
+    if not os.path.exists(source_path):
+        return {"status": "error", "message": f"ISO file not found at {source_path}"}
+
+    return {
+        "status": "ready",
+        "serial": serial,
+        "title": game["title"],
+        "source_path": source_path,
+        "dest_path": os.path.splitext(source_path)[0] + zso.ZSO_EXTENSION,
+        "file_size": os.path.getsize(source_path)
+    }
+
+def CommitCompression(plan: dict, progress=None):
+    """
+    Device stage: writes and verifies the ZSO, switches the game over to it
+    and deletes the ISO. progress(stage, done, total) as in CommitUpload.
+    """
+    global db
+
+    serial = plan["serial"]
+    title = plan["title"]
+    dest_path = plan["dest_path"]
+    try:
+        sizes = compress_image(plan["source_path"], dest_path, progress)
+    except Exception as e:
+        print(f"[Error] Compression failed: {e}")
+        return {"status": "error", "message": f"Failed to compress {title}: {e}"}
+
+    if sizes is None:
+        return {"status": "completed", "message": f"{title} kept as ISO.", "title": title, "compressed": False}
+
+    if not db.update_game_file(serial, dest_path, sizes["compressed_size"], os.path.getmtime(dest_path),
+                               sizes["original_size"], sizes["compressed_size"]):
+        # Removed from the library while it was being compressed
+        os.remove(dest_path)
+        return {"status": "error", "message": f"{title} is no longer in the library."}
+
+    os.remove(plan["source_path"])
+    DEVICES.refresh_usage(CONFIG.LIB_PATH)
+    return {
+        "status": "completed",
+        "message": f"{title} Compressed",
+        "title": title,
+        "compressed": True,
+        **sizes
+    }
+
+def compressible_games(serials=None):
+    """Serials (of the given ones, or the whole library) still stored as plain ISOs."""
+    games = {game["serial"]: game for game in db.get_all_games()}
+    wanted = serials if serials is not None else list(games)
+    return [serial for serial in wanted if serial in games and not zso.is_zso(games[serial]["filepath"])]
+
+def download_assets(serial):
+    """Downloads cover, disc art and CFG for one game concurrently."""
+    download_assets_many([serial])
+
+def download_assets_many(serials, missing_only=False, progress=None):
+    """
+    Downloads art and CFG for many games over the shared, bounded fetcher pool.
+    With missing_only, files already present in ART/ and CFG/ are skipped.
+    """
+    existing = set()
+    if missing_only:
+        for folder in ('ART', 'CFG'):
+            folder_path = os.path.join(CONFIG.LIB_PATH, folder)
+            if os.path.isdir(folder_path):
+                with os.scandir(folder_path) as entries:
+                    existing.update(entry.name for entry in entries)
+
+    futures = []
+    for serial in serials:
+        for download, name in ((download_cover, f"{serial}_COV.jpg"), (download_disc, f"{serial}_ICO.png"), (download_cfg, f"{serial}.cfg")):
+            if name not in existing:
+                futures.append(ASSETS.submit(download, serial))
+
+    for done, future in enumerate(futures, start=1):
+        future.result()
+        if progress:
+            progress(done, len(futures))
+
 def download_cover(serial):
     try:
         clean_serial = db.clean_serial(serial)
@@ -183,17 +484,18 @@ def download_cover(serial):
         save_path = os.path.join(art_dir, filename)
 
         print(f"[System] Downloading cover art for {serial}...")
-        response = requests.get(f"{CONFIG.COVERS_URL}/{clean_serial}.jpg", stream=True)
-        response.raise_for_status()
+        content = ASSETS.fetch(f"{CONFIG.COVERS_URL}/{clean_serial}.jpg")
+        if content is None:
+            print(f"[System] No cover art available for {serial}.")
+            return None
 
-        image_data = io.BytesIO(response.content)
-        with Image.open(image_data) as img:
-            resized_img = img.resize((140, 200), Image.Resampling.LANCZOS)
-            if resized_img.mode != 'RGB':
-                resized_img = resized_img.convert('RGB')
-            resized_img.save(save_path, format='JPEG')
+        # Resize on the cover stage's own pool, reusing earlier results for identical images
+        with open(save_path, 'wb') as f:
+            f.write(COVERS.process(content))
 
         print(f"[System] Saved cover art to {save_path}")
+        # art_url is versioned by content, so clients need the row again
+        db.mark_games_changed([serial])
         return save_path
     except Exception as e:
         print(f"[System] Failed to download cover: {e}")
@@ -210,13 +512,15 @@ def download_disc(serial):
         save_path = os.path.join(art_dir, filename)
 
         print(f"[System] Downloading disc art for {serial}...")
-        response = requests.get(f"{CONFIG.DISCS_URL}/{serial}_ICO.png", stream=True)
-        response.raise_for_status()
+        content = ASSETS.fetch(f"{CONFIG.DISCS_URL}/{serial}_ICO.png")
+        if content is None:
+            print(f"[System] No disc art available for {serial}.")
+            return None
         
         with open(save_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+            f.write(content)
         print(f"[System] Saved disc art to {save_path}")
+        db.mark_games_changed([serial])
         return save_path
     except Exception as e:
         print(f"[System] Failed to download disc: {e}")
@@ -233,178 +537,258 @@ def download_cfg(serial):
         save_path = os.path.join(cfg_dir, filename)
 
         print(f"[System] Downloading CFG for {serial}...")
-        response = requests.get(f"{CONFIG.CFG_URL}/{serial}.cfg", stream=True)
-        response.raise_for_status()
+        content = ASSETS.fetch(f"{CONFIG.CFG_URL}/{serial}.cfg")
+        if content is None:
+            print(f"[System] No CFG available for {serial}.")
+            return None
         
         with open(save_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+            f.write(content)
         print(f"[System] Saved CFG to {save_path}")
+
+        # Developer/genre/release feed library search
+        metadata = parse_cfg_metadata(content.decode('utf-8', errors='ignore'))
+        if metadata:
+            db.update_game_metadata(serial, metadata)
         return save_path
     except Exception as e:
         print(f"[System] Failed to download CFG: {e}")
         return None
 
-def get_library():
-    global db
-    return db.get_all_games()
+# OPL CFG keys we index, and the library columns they go to
+CFG_METADATA_KEYS = {
+    'developer': 'developer',
+    'genre': 'genre',
+    'release': 'release',
+}
+
+def parse_cfg_metadata(content) -> dict:
+    """Pulls developer, genre and release out of an OPL CFG (Key=Value lines)."""
+    metadata = {}
+    for line in content.splitlines():
+        key, sep, value = line.partition('=')
+        column = CFG_METADATA_KEYS.get(key.strip().lower())
+        if sep and column and value.strip():
+            metadata[column] = value.strip()
+    return metadata
+
+def read_cfg_metadata(serial) -> dict:
+    cfg_path = os.path.join(CONFIG.LIB_PATH, 'CFG', f"{serial}.cfg")
+    try:
+        with open(cfg_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return parse_cfg_metadata(f.read())
+    except OSError:
+        return {}
 
-def remove_from_library(serial):
+def verify_game(serial):
+    """
+    Re-hashes a library ISO and compares it with the hashes recorded at
+    ingest and, when available, the reference dump hashes.
+    """
     global db
-    
-    # 1. Fetch game details
+
     game_data = db.query_library_by_serial(serial)
-    
     if not game_data:
-        print(f"[System] Cannot remove {serial}: Game not found in database.")
-        return False
+        return {"status": "error", "message": f"Game {serial} not found in library."}
+
+    iso_path = game_data.get('filepath')
+    if not iso_path or not os.path.exists(iso_path):
+        return {"status": "error", "message": f"ISO file not found at {iso_path}"}
 
     try:
-        # --- DELETE ISO FILE ---
-        # Since we stored the full path in ProcessUpload, we can just use it directly.
-        iso_path = game_data.get('filepath')
-        
-        if iso_path and os.path.exists(iso_path):
-            try:
-                os.remove(iso_path)
-                print(f"[System] Deleted ISO: {iso_path}")
-            except OSError as e:
-                print(f"[System] Error deleting ISO file: {e}")
-        else:
-            print(f"[System] ISO file not found at {iso_path}, skipping file deletion.")
-
-        # --- DELETE COVER ART ---
-        cover_path = os.path.join(CONFIG.LIB_PATH, "ART", f"{serial}_COV.jpg")
-        disc_path = os.path.join(CONFIG.LIB_PATH, "ART", f"{serial}_ICO.png")
-        cfg_path = os.path.join(CONFIG.LIB_PATH, "CFG", f"{serial}.cfg")
-        
-        if os.path.exists(cover_path):
-            try:
-                os.remove(cover_path)
-                print(f"[System] Deleted Cover: {cover_path}")
-            except OSError as e:
-                print(f"[System] Error deleting cover art: {e}")
-        
-        if os.path.exists(disc_path):
-            try:
-                os.remove(disc_path)
-                print(f"[System] Deleted Disc: {disc_path}")
-            except OSError as e:
-                print(f"[System] Error deleting disc art: {e}")
+        # Hashes always describe the uncompressed image
+        actual = zso.hash_file(iso_path) if zso.is_zso(iso_path) else ingest.hash_file(iso_path, CONFIG.INGEST_CHUNK_SIZE)
+    except (OSError, zso.ZsoError) as e:
+        return {"status": "error", "message": f"Failed to read ISO: {e}"}
+
+    stored = {k: game_data.get(k) for k in ("crc32", "md5", "sha1")}
+    if not any(stored.values()):
+        # Games added before hashing existed get their hashes recorded now
+        db.update_game_hashes(serial, actual)
+        stored = None
+
+    reference = db.query_reference_hashes(serial)
+
+    mismatches = []
+    if stored:
+        mismatches += [f"library.{name}" for name in ingest.compare_hashes(stored, actual)]
+    if reference:
+        mismatches += [f"reference.{name}" for name in ingest.compare_hashes(reference, actual)]
+
+    return {
+        "status": "success",
+        "serial": serial,
+        "verified": not mismatches,
+        "hashes": actual,
+        "stored": stored,
+        "reference": reference,
+        "mismatches": mismatches
+    }
+
+def image_fingerprint(path):
+    """ingest.image_fingerprint of a library file, read through ZSO compression when needed."""
+    if zso.is_zso(path):
+        with zso.ZsoReader(path) as reader:
+            return ingest.image_fingerprint(reader.read, reader.size)
+    return ingest.fingerprint_file(path)
+
+def check_duplicate(serial, size=None, fingerprint=None):
+    """
+    Tells an uploader whether a game is already in the library, before any of
+    it is sent. identical is True when size and fingerprint both match the
+    library copy, False when either differs, None if there's nothing to go on.
+    Games indexed before fingerprints existed get theirs computed here, but
+    only once the sizes already match.
+    """
+    global db
 
-        if os.path.exists(cfg_path):
+    game = db.query_library_by_serial(serial)
+    if not game:
+        return {"status": "success", "exists": False, "identical": False, "serial": serial}
+
+    # ZSO rows are compared by the image they hold, not the file on the drive
+    library_size = game.get("original_size") or game.get("size")
+    identical = None
+    if size is not None and library_size is not None and size != library_size:
+        identical = False
+    elif size is not None and fingerprint:
+        stored = game.get("fingerprint")
+        if stored is None and game.get("filepath") and os.path.exists(game["filepath"]):
             try:
-                os.remove(cfg_path)
-                print(f"[System] Deleted CFG: {cfg_path}")
-            except OSError as e:
-                print(f"[System] Error deleting CFG: {e}")
+                stored = image_fingerprint(game["filepath"])
+                db.update_game_fingerprint(serial, stored)
+            except (OSError, zso.ZsoError) as e:
+                print(f"[System] Could not fingerprint {serial}: {e}")
+        if stored is not None:
+            identical = stored == fingerprint.lower()
+
+    return {
+        "status": "success",
+        "exists": True,
+        "identical": identical,
+        "serial": serial,
+        "title": game["title"],
+        "size": library_size
+    }
 
-        # --- REMOVE FROM DB ---
-        db.remove_game_from_library(serial)
-        return True
+def get_library():
+    global db
+    return add_art_urls(db.get_all_games())
 
-    except Exception as e:
-        print(f"[System] Critical error during removal process: {e}")
-        return False
+def get_library_revision():
+    global db
+    return db.get_library_revision()
 
-def remove_all_from_library():
+def get_library_changes(since=0, library_id=None):
+    global db
+    changes = db.get_library_changes(since, library_id)
+    if changes:
+        add_art_urls(changes["upserts"])
+    return changes
+
+def search_library(query=None, filters=None, sort=None, descending=False, cursor=None, limit=None):
     global db
-    games = db.get_all_games()
+    results = db.search_library(query, filters, sort, descending, cursor, limit)
+    add_art_urls(results["items"])
+    return results
+
+def add_art_urls(games):
+    # Point the UI at art we already have on the drive instead of the remote cover_url
+    versions = artwork.library_art_versions(CONFIG.LIB_PATH)
     for game in games:
         serial = game["serial"]
-        try:
-            remove_from_library(serial)
-        except Exception as e:
-            return False
+        cover_version = versions.get(artwork.KINDS["cover"].format(serial=serial))
+        disc_version = versions.get(artwork.KINDS["disc"].format(serial=serial))
+        game["art_url"] = artwork.art_url(serial, "cover", cover_version) if cover_version else None
+        game["thumb_url"] = artwork.art_url(serial, "cover", cover_version, artwork.GRID_THUMB_WIDTH) if cover_version else None
+        game["disc_url"] = artwork.art_url(serial, "disc", disc_version) if disc_version else None
+    return games
+
+def remove_from_library(serial):
+    report = remove_games([serial])
+    if report["status"] == "error" or report["results"][0]["status"] == "not_found":
+        print(f"[System] Cannot remove {serial}: Game not found in database.")
+        return False
     return True
 
+def remove_all_from_library():
+    return remove_games(None)["status"] != "error"
+
+def remove_games(serials=None):
+    """
+    Removes many games at once; serials=None removes the whole library.
+    The rows go in one transaction, then each game's ISO, art and CFG are
+    unlinked on a small worker pool. Returns {status, removed, missing,
+    failed, results: [{serial, status, errors}]} where an item's status is
+    "removed", "not_found" or "partial" (row gone, some files left behind).
+    """
+    global db
+
+    rows = db.remove_games_from_library(serials)
+    if rows is None:
+        return {"status": "error", "message": "Library is not available.", "removed": 0, "missing": 0, "failed": 0, "results": []}
+
+    found = {row["serial"]: row["filepath"] for row in rows}
+    requested = list(dict.fromkeys(serials)) if serials is not None else list(found)
+
+    def unlink_game(serial):
+        errors = []
+        paths = [
+            found[serial],
+            os.path.join(CONFIG.LIB_PATH, "ART", f"{serial}_COV.jpg"),
+            os.path.join(CONFIG.LIB_PATH, "ART", f"{serial}_ICO.png"),
+            os.path.join(CONFIG.LIB_PATH, "CFG", f"{serial}.cfg"),
+        ]
+        for path in paths:
+            if not path:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                errors.append(f"{os.path.basename(path)}: {e.strerror or e}")
+        return errors
+
+    with ThreadPoolExecutor(max_workers=DELETE_WORKERS, thread_name_prefix='delete') as pool:
+        unlinked = {serial: pool.submit(unlink_game, serial) for serial in found}
+
+    results = []
+    for serial in requested:
+        if serial not in found:
+            results.append({"serial": serial, "status": "not_found", "errors": []})
+            continue
+        errors = unlinked[serial].result()
+        results.append({"serial": serial, "status": "partial" if errors else "removed", "errors": errors})
+
+    DEVICES.refresh_usage(CONFIG.LIB_PATH)
+    counts = {status: sum(1 for result in results if result["status"] == status) for status in ("removed", "not_found", "partial")}
+    print(f"[System] Removed {len(found)} games ({counts['partial']} with files left behind, {counts['not_found']} not found).")
+    return {
+        "status": "partial" if counts["partial"] else "success",
+        "removed": len(found),
+        "missing": counts["not_found"],
+        "failed": counts["partial"],
+        "results": results
+    }
+
 def get_storage_device(path):
     if not path:
         return None
-    
-    realPath = os.path.realpath(path)
-    if not os.path.exists(realPath):
-        return None
 
-    partitions = psutil.disk_partitions(all=True)
-
-    best_match = ""
-    selected_part = None
-
-    for part in partitions:
-        try:
-            # Handle Windows vs Unix path matching
-            if os.name == 'nt':
-                match = realPath.lower().startswith(part.mountpoint.lower())
-            else:
-                match = realPath.startswith(part.mountpoint)
-
-            if match:
-                # Find the longest matching path (most specific partition)
-                if len(part.mountpoint) > len(best_match):
-                    best_match = part.mountpoint
-                    selected_part = part
-        except Exception:
-            continue
+    # Mounts, labels and free space are cached by the monitor; see devices.py
+    device = DEVICES.device_for(path)
+    if device is None:
+        return None
 
-    if selected_part:
-        try:
-            usage = psutil.disk_usage(selected_part.mountpoint)
-            label = get_drive_label(selected_part.device, selected_part.mountpoint)
-            
-            return {
-                "label": label, 
-                "file_system": selected_part.fstype, 
-                "space_free": usage.free,
-                "total_space": usage.total,
-                "path": path
-            }
-        except Exception as e:
-            print(f"Error reading disk usage: {e}")
-            return None
-            
-    return None
+    return {
+        "label": device["label"],
+        "file_system": device["file_system"],
+        "space_free": device["space_free"],
+        "total_space": device["total_space"],
+        "path": path
+    }
 
-def get_drive_label(device_path, mount_point):
-    """
-    Cross-platform helper to get the volume label.
-    """
-    try:
-        # --- Windows ---
-        if os.name == 'nt':
-            kernel32 = ctypes.windll.kernel32
-            volume_name_buf = ctypes.create_unicode_buffer(1024)
-            # Windows requires a trailing backslash for the root path
-            root_path = mount_point if mount_point.endswith('\\') else mount_point + '\\'
-            
-            kernel32.GetVolumeInformationW(
-                ctypes.c_wchar_p(root_path),
-                volume_name_buf,
-                ctypes.sizeof(volume_name_buf),
-                None, None, None, None, 0
-            )
-            return volume_name_buf.value
-        
-        # --- macOS ---
-        elif sys.platform == 'darwin':
-            cmd = ["diskutil", "info", mount_point]
-            output = subprocess.check_output(cmd).decode()
-            match = re.search(r"Volume Name:\s+(.*)", output)
-            if match:
-                label = match.group(1).strip()
-                return label if label != "Not applicable" else "Untitled"
-            return "Unknown"
-
-        # --- Linux ---
-        else:
-            cmd = ["lsblk", "-no", "LABEL", device_path]
-            label = subprocess.check_output(cmd).decode().strip()
-            return label if label else "Unnamed Drive"
-            
-    except Exception as e:
-        print(f"Error getting label: {e}")
-        return "Unknown"
-    
 def set_library_path(new_path):
     global CONFIG
     
@@ -428,7 +812,8 @@ def set_library_path(new_path):
         with open(SETTINGS_PATH, 'w') as f:
             json.dump(data, f, indent=4)
 
-        # 5. Update the LIVE config object
+        # 5. Update the LIVE config object (and let go of the old drive's DB)
+        db.CONNECTIONS.close_library()
         CONFIG.LIB_PATH = real_path 
         
         # 6. CRITICAL: Re-initialize the database on the new drive
@@ -442,66 +827,137 @@ def set_library_path(new_path):
         print(f"[Settings] Failed to save: {e}")
         return {"status": "error", "message": str(e)}
 
-def rebuild_library():
+SERIAL_PATTERN = r'[a-zA-Z]{4}_\d{3}\.\d{2}'
+LIBRARY_FOLDERS = ('DVD', 'CD')
+# Game images OPL loads; anything else in DVD/ and CD/ (like an unfinished .part) is ignored
+LIBRARY_EXTENSIONS = ('.iso', zso.ZSO_EXTENSION)
+
+def scan_library_files():
+    """
+    Walks DVD/ and CD/ with os.scandir.
+    Returns {filepath: (serial, size, mtime)} for every ISO or ZSO named with
+    a serial. Partial writes (.part) are skipped.
+    """
+    found = {}
+    for folder in LIBRARY_FOLDERS:
+        folder_path = os.path.join(CONFIG.LIB_PATH, folder)
+        if not os.path.isdir(folder_path):
+            continue
+
+        with os.scandir(folder_path) as entries:
+            for entry in entries:
+                if not entry.name.lower().endswith(LIBRARY_EXTENSIONS):
+                    continue
+                match = re.search(SERIAL_PATTERN, entry.name)
+                if not match or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                found[entry.path] = (match.group(), stat.st_size, stat.st_mtime)
+    return found
+
+def image_sizes(path, size) -> dict:
+    """original_size/compressed_size columns for a library file; ZSOs carry their original size in the header."""
+    if zso.is_zso(path):
+        return {"original_size": zso.original_size(path), "compressed_size": size}
+    return {"original_size": size, "compressed_size": None}
+
+def rebuild_library(full=False, progress=None):
+    """
+    Incrementally rescans the library drive. Files whose size and mtime match
+    the DB are skipped, changes are applied in one transaction, and only
+    missing art/CFG is fetched. full=True starts from an empty DB.
+    progress(stage, done, total) is called as the rescan moves along.
+    """
     global db
     global CONFIG
 
     db_path = db.get_db_path()
-    if (not os.path.exists(db_path)):
+    if (not db_path or not os.path.exists(db_path)):
         print("[System] No DB exists, cannot rebuild")
         return {"status": "error", "message": f"Library database doesn't exist at path: {db_path}"}
     
     try:
-        os.remove(db_path)
-        db.initialize_library()
-
-        SERIAL_PATTERN = r'[a-zA-Z]{4}_\d{3}\.\d{2}'
-        # Start with games in DVD folder
-        DVD_PATH = os.path.join(CONFIG.LIB_PATH, 'DVD')
-        DVD_FILES = os.listdir(DVD_PATH)
-        for file in DVD_FILES:
-            match = re.search(SERIAL_PATTERN, file)
-            if not match:
-                continue
-
-            serial = match.group()
-            title = db.query_title_by_serial(serial)
-
+        # A full rebuild re-adds everything and drops the old rows in the same transaction
+        known = {} if full else db.get_library_scan_index()
+        found = scan_library_files()
+        if progress:
+            progress("scanning", len(found), len(found))
+
+        # serial is the library key: keep one file per serial, preferring the one already recorded
+        chosen = {}
+        for game_path in sorted(found):
+            serial = found[game_path][0]
+            if serial not in chosen or game_path in known:
+                chosen[serial] = game_path
+        found = {game_path: found[game_path] for game_path in chosen.values()}
+
+        touches = []
+        changed = []
+        library_serials = []
+        missing_metadata = []
+        for game_path, (serial, game_size, game_mtime) in found.items():
+            row = known.get(game_path)
+            if row and row["serial"] == serial and row["size"] == game_size:
+                if row["mtime"] is None:
+                    # Added before mtimes were tracked; record it instead of re-reading
+                    touches.append((serial, game_mtime))
+                if row["mtime"] is None or row["mtime"] == game_mtime:
+                    library_serials.append(serial)
+                    if not row["has_metadata"]:
+                        missing_metadata.append(serial)
+                    continue
+            changed.append(game_path)
+
+        # One pass over the in-memory title index for everything new or changed
+        found_titles = db.query_titles_by_serials(found[game_path][0] for game_path in changed)
+
+        upserts = []
+        for game_path in changed:
+            serial, game_size, game_mtime = found[game_path]
+            title = found_titles.get(serial)
             if not title:
                 continue
 
-            # Found a valid ISO, add to library db & fetch files
-            game_path = os.path.join(DVD_PATH, file)
-            game_size = os.path.getsize(game_path)
-            cover_url = f"{CONFIG.COVERS_URL}/{db.clean_serial(serial)}.jpg"
-            db.add_game_to_library(serial, title, game_path, game_size, cover_url)
-            download_cover(serial)
-            download_disc(serial)
-            download_cfg(serial)
-
-        # Follow up with viewing 
-        CD_PATH = os.path.join(CONFIG.LIB_PATH, 'CD')
-        CD_FILES = os.listdir(CD_PATH)
-        for file in CD_FILES:
-            match = re.search(SERIAL_PATTERN, file)
-            if not match:
-                continue
-
-            serial = match.group()
-            title = db.query_title_by_serial(serial)
-
-            if not title:
-                continue
-
-            # Found a valid ISO, add to library db & fetch files
-            game_path = os.path.join(CD_PATH, file)
-            game_size = os.path.getsize(game_path)
-            cover_url = f"{CONFIG.COVERS_URL}/{db.clean_serial(serial)}.jpg"
-            db.add_game_to_library(serial, title, game_path, game_size, cover_url)
-            download_cover(serial)
-            download_disc(serial)
-            download_cfg(serial)
-        
-        return {"status": "success", "message": "Successfully rebuilt library database."}
+            # New or changed ISO, add to library db
+            upserts.append({
+                "serial": serial,
+                "title": title,
+                "filepath": game_path,
+                "size": game_size,
+                "cover_url": f"{CONFIG.COVERS_URL}/{db.clean_serial(serial)}.jpg",
+                "mtime": game_mtime,
+                **image_sizes(game_path, game_size),
+                **read_cfg_metadata(serial)
+            })
+            library_serials.append(serial)
+
+        # CFGs that arrived since these games were indexed (e.g. older libraries)
+        metadata = [(serial, read_cfg_metadata(serial)) for serial in missing_metadata]
+        metadata = [(serial, meta) for serial, meta in metadata if meta]
+
+        # Rows whose file disappeared (or moved; the new path is upserted above)
+        deleted = [row["serial"] for game_path, row in known.items() if game_path not in found]
+
+        if upserts or touches or deleted or metadata or full:
+            if not db.apply_library_changes(upserts, touches, deleted, clear=full, metadata=metadata):
+                return {"status": "error", "message": "Error rebuilding library database: failed to apply changes."}
+        if progress:
+            progress("updating", len(upserts) + len(deleted), len(upserts) + len(deleted))
+
+        # Only fetch art & CFG that isn't on the drive yet, over the shared pool
+        download_assets_many(
+            library_serials,
+            missing_only=True,
+            progress=(lambda done, total: progress("assets", done, total)) if progress else None
+        )
+
+        unchanged = len(library_serials) - len(upserts)
+        return {
+            "status": "success",
+            "message": f"Library rescanned: {len(upserts)} added or updated, {len(deleted)} removed, {unchanged} unchanged.",
+            "added": len(upserts),
+            "removed": len(deleted),
+            "unchanged": unchanged
+        }
     except Exception as e:
         return {"status": "error", "message": f"Error rebuilding library database: {e}"}
@@ -0,0 +1,124 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import assets
+
+# tests/test_assets.py
+# AssetFetcher caching against a local stand-in for the art/CFG host: fresh
+# hits stay local, stale ones revalidate with the ETag, 404s are remembered
+# and the cache answers when upstream is down.
+
+class Upstream(BaseHTTPRequestHandler):
+    """Serves `files` ({path: (body, etag)}) and logs (path, If-None-Match) for every request."""
+    files = {}
+    log = []
+
+    def do_GET(self):
+        self.log.append((self.path, self.headers.get('If-None-Match')))
+        if self.path not in self.files:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body, etag = self.files[self.path]
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class AssetFetcherTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        Upstream.files = {'/SLUS_200.02_COV.jpg': (b'cover v1', '"v1"')}
+        Upstream.log = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Upstream)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f'http://127.0.0.1:{self.server.server_port}'
+        self.fetchers = []
+
+    def tearDown(self):
+        self.stop_upstream()
+        for fetcher in self.fetchers:
+            fetcher.pool.shutdown()
+            fetcher._conn.close()
+        shutil.rmtree(self.dir)
+
+    def stop_upstream(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def fetcher(self, **kwargs):
+        session = requests.Session()
+        # Never route the stand-in through a proxy from the environment
+        session.trust_env = False
+        fetcher = assets.AssetFetcher(cache_dir=self.dir, session=session, **kwargs)
+        self.fetchers.append(fetcher)
+        return fetcher
+
+    def test_fresh_entries_skip_upstream(self):
+        fetcher = self.fetcher()
+        url = f'{self.base}/SLUS_200.02_COV.jpg'
+        self.assertEqual(fetcher.fetch(url), b'cover v1')
+        self.assertEqual(fetcher.fetch(url), b'cover v1')
+        self.assertEqual(Upstream.log, [('/SLUS_200.02_COV.jpg', None)])
+
+    def test_stale_entries_revalidate_with_the_etag(self):
+        fetcher = self.fetcher(fresh_seconds=0)
+        url = f'{self.base}/SLUS_200.02_COV.jpg'
+        fetcher.fetch(url)
+        # Unchanged: a 304, served from the cache
+        self.assertEqual(fetcher.fetch(url), b'cover v1')
+        Upstream.files['/SLUS_200.02_COV.jpg'] = (b'cover v2', '"v2"')
+        self.assertEqual(fetcher.fetch(url), b'cover v2')
+        self.assertEqual([etag for _, etag in Upstream.log], [None, '"v1"', '"v1"'])
+
+        # The cache (index and objects) outlives the fetcher
+        self.assertEqual(self.fetcher(fresh_seconds=0).fetch(url), b'cover v2')
+        self.assertEqual(Upstream.log[-1][1], '"v2"')
+
+    def test_missing_assets_are_remembered(self):
+        fetcher = self.fetcher()
+        url = f'{self.base}/SLUS_999.99_COV.jpg'
+        self.assertIsNone(fetcher.fetch(url))
+        self.assertIsNone(fetcher.fetch(url))
+        self.assertEqual(len(Upstream.log), 1)
+
+        # Past the negative TTL it asks again, and picks up art added since
+        fetcher.negative_ttl = 0
+        Upstream.files['/SLUS_999.99_COV.jpg'] = (b'new cover', '"n1"')
+        self.assertEqual(fetcher.fetch(url), b'new cover')
+
+    def test_cache_answers_while_upstream_is_down(self):
+        fetcher = self.fetcher(fresh_seconds=0, timeout=(1, 1))
+        url = f'{self.base}/SLUS_200.02_COV.jpg'
+        fetcher.fetch(url)
+        self.stop_upstream()
+        self.assertEqual(fetcher.fetch(url), b'cover v1')
+        self.assertIsNone(fetcher.fetch(f'{self.base}/SCUS_973.28_COV.jpg'))
+
+    def test_fetch_many_dedupes(self):
+        fetcher = self.fetcher()
+        cover = f'{self.base}/SLUS_200.02_COV.jpg'
+        missing = f'{self.base}/SLUS_200.02_ICO.png'
+        self.assertEqual(fetcher.fetch_many([cover, missing, cover]), {cover: b'cover v1', missing: None})
+        self.assertEqual(len(Upstream.log), 2)
+
+if __name__ == '__main__':
+    unittest.main()
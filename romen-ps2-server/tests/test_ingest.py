@@ -0,0 +1,212 @@
+import io
+import json
+import os
+import sys
+import random
+import shutil
+import hashlib
+import tempfile
+import zlib
+import unittest
+from unittest import mock
+import pycdlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ingest
+
+# tests/test_ingest.py
+# Upload plumbing that doesn't need a server: space admission, resumable
+# upload sessions and compressed upload bodies.
+
+MB = 1024 * 1024
+
+def make_iso(serial='SLUS_200.02', filler=256 * 1024):
+    """A small ISO9660 image with a SYSTEM.CNF pointing at serial and some random data after it."""
+    cnf = f'BOOT2 = cdrom0:\\{serial};1\r\nVER = 1.00\r\nVMODE = NTSC\r\n'.encode('ascii')
+    data = random.Random(serial).randbytes(filler)
+    image = pycdlib.PyCdlib()
+    image.new()
+    image.add_fp(io.BytesIO(cnf), len(cnf), '/SYSTEM.CNF;1')
+    image.add_fp(io.BytesIO(data), len(data), '/DATA.BIN;1')
+    out = io.BytesIO()
+    image.write_fp(out)
+    image.close()
+    return out.getvalue()
+
+class SpaceLedgerTest(unittest.TestCase):
+    def setUp(self):
+        self.free = 1000 * MB
+        self.ledger = ingest.SpaceLedger(lambda: self.free, headroom=100 * MB)
+
+    def test_reservations_count_against_each_other(self):
+        self.ledger.reserve(600 * MB)
+        # 1000 free - 100 headroom - 600 booked leaves 300
+        with self.assertRaises(ingest.InsufficientSpaceError):
+            self.ledger.reserve(301 * MB)
+        self.ledger.reserve(300 * MB)
+        self.assertEqual(self.ledger.status(), {"reserved": 900 * MB, "uploads": 2})
+
+    def test_release_gives_space_back(self):
+        reservation = self.ledger.reserve(900 * MB)
+        reservation.release()
+        self.assertEqual(reservation.outstanding, 0)
+        self.ledger.reserve(900 * MB)
+
+    def test_allocated_bytes_are_not_held_back_twice(self):
+        reservation = self.ledger.reserve(800 * MB)
+        # Preallocating took 500 MB off the drive's free space as well
+        reservation.allocated(500 * MB)
+        self.free -= 500 * MB
+        self.assertEqual(reservation.outstanding, 300 * MB)
+        self.ledger.reserve(100 * MB)
+        with self.assertRaises(ingest.InsufficientSpaceError):
+            self.ledger.reserve(1)
+
+    def test_allocation_never_goes_backwards(self):
+        reservation = self.ledger.reserve(800 * MB)
+        reservation.allocated(500 * MB)
+        reservation.allocated(200 * MB)
+        self.assertEqual(reservation.on_disk, 500 * MB)
+
+    def test_unchecked_and_unknown_free_space_are_admitted(self):
+        self.ledger.reserve(5000 * MB, check=False)
+        self.assertEqual(self.ledger.status()["reserved"], 5000 * MB)
+        self.free = None
+        self.ledger.reserve(5000 * MB)
+
+class ChunkedUploadTest(unittest.TestCase):
+    CHUNK = 64 * 1024
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.image = make_iso()
+        self.ranges = [(start, min(start + self.CHUNK, len(self.image))) for start in range(0, len(self.image), self.CHUNK)]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def create(self):
+        return ingest.ChunkedUpload.create(self.dir, 'game.iso', len(self.image), self.CHUNK, 'job')
+
+    def send(self, session, ranges):
+        for start, end in ranges:
+            session.write_at(start, self.image[start:end])
+
+    def restart(self, session):
+        # What a restart leaves behind: the .part file and its sidecar, nothing in memory
+        os.close(session._fd)
+        session._fd = None
+        return ingest.ChunkedUpload.load(self.dir, session.upload_id, self.CHUNK)
+
+    def test_out_of_order_chunks_hash_and_identify(self):
+        session = self.create()
+        self.send(session, reversed(self.ranges))
+        self.assertTrue(session.complete)
+        self.assertEqual(session.serial, 'SLUS_200.02')
+        self.assertEqual(session.hexdigests()["sha1"], hashlib.sha1(self.image).hexdigest())
+        session.close()
+        with open(session.path, 'rb') as f:
+            self.assertEqual(f.read(), self.image)
+        self.assertFalse(os.path.exists(session.meta_path))
+
+    def test_resume_after_restart(self):
+        session = self.create()
+        half = len(self.ranges) // 2
+        with mock.patch.object(ingest, 'SIDECAR_SAVE_INTERVAL', 0):
+            self.send(session, self.ranges[:half])
+
+        resumed = self.restart(session)
+        self.assertEqual(resumed.received, [(0, self.ranges[half][0])])
+        self.assertEqual(resumed.job_id, 'job')
+        # The hash stream starts over from the part already on disk
+        self.send(resumed, self.ranges[half:])
+        self.assertEqual(resumed.hexdigests()["md5"], hashlib.md5(self.image).hexdigest())
+        self.assertEqual(resumed.serial, 'SLUS_200.02')
+        resumed.close()
+
+    def test_sidecar_lags_between_saves(self):
+        session = self.create()
+        self.send(session, self.ranges[:2])
+        # Inside the save interval, so the sidecar still has what create() wrote
+        resumed = self.restart(session)
+        self.assertEqual(resumed.received, [])
+        self.send(resumed, self.ranges)
+        self.assertTrue(resumed.complete)
+        # Completion is always saved
+        with open(resumed.meta_path) as f:
+            self.assertIn([0, len(self.image)], json.load(f)["received"])
+        resumed.abort()
+        self.assertFalse(os.path.exists(resumed.path))
+
+    def test_rejects_ranges_past_the_end_and_non_images(self):
+        session = self.create()
+        with self.assertRaises(ValueError):
+            session.write_at(len(self.image) - 1, b'xx')
+        session.abort()
+
+        session = ingest.ChunkedUpload.create(self.dir, 'notes.iso', len(self.image), self.CHUNK)
+        with self.assertRaises(ingest.UnidentifiableImageError):
+            session.write_at(0, bytes(len(self.image)))
+        # The session stays failed for any later chunk
+        with self.assertRaises(ingest.UnidentifiableImageError):
+            session.write_at(0, b'x')
+        session.abort()
+
+    def test_load_ignores_unknown_and_malformed_ids(self):
+        self.assertIsNone(ingest.ChunkedUpload.load(self.dir, '0' * 32, self.CHUNK))
+        self.assertIsNone(ingest.ChunkedUpload.load(self.dir, '../etc', self.CHUNK))
+
+def compress(data, encoding):
+    packer = zlib.compressobj(6, zlib.DEFLATED, ingest.TRANSPORT_ENCODINGS[encoding])
+    return packer.compress(data) + packer.flush()
+
+class TransportDecoderTest(unittest.TestCase):
+    PIECE = 64 * 1024
+
+    def setUp(self):
+        rng = random.Random(0)
+        self.data = b''.join(bytes(rng.randrange(1, 4096)) + rng.randbytes(rng.randrange(1, 4096)) for _ in range(200))
+
+    def stream(self, body, decoder, feed=1000):
+        out = []
+        for offset in range(0, len(body), feed):
+            out += decoder.decode(body[offset:offset + feed])
+        out.append(decoder.finish())
+        return out
+
+    def test_round_trips_in_bounded_pieces(self):
+        for encoding in ingest.TRANSPORT_ENCODINGS:
+            with self.subTest(encoding=encoding):
+                pieces = self.stream(compress(self.data, encoding), ingest.TransportDecoder(encoding, self.PIECE))
+                self.assertEqual(b''.join(pieces), self.data)
+                self.assertLessEqual(max(map(len, pieces)), self.PIECE)
+                self.assertEqual(ingest.decode_body(compress(self.data, encoding), encoding, len(self.data)), self.data)
+
+    def test_bomb_stops_at_the_limit(self):
+        # 256 MB of zeros is a few hundred KB compressed
+        packer = zlib.compressobj(9, zlib.DEFLATED, 31)
+        body = b''.join(packer.compress(bytes(MB)) for _ in range(256)) + packer.flush()
+        decoder = ingest.TransportDecoder("gzip", self.PIECE, limit=4 * MB)
+        with self.assertRaises(ingest.TransportError):
+            for piece in decoder.decode(body):
+                self.assertLessEqual(len(piece), self.PIECE)
+        self.assertLessEqual(decoder.decoded, 4 * MB + self.PIECE)
+        with self.assertRaises(ingest.TransportError):
+            ingest.decode_body(body, "gzip", 4 * MB)
+
+    def test_rejects_bad_bodies(self):
+        body = compress(self.data, "gzip")
+        with self.assertRaises(ingest.TransportError):
+            ingest.TransportDecoder("br", self.PIECE)
+        with self.assertRaises(ingest.TransportError):
+            # Sent as deflate, labelled gzip
+            ingest.decode_body(compress(self.data, "deflate"), "gzip", len(self.data))
+        with self.assertRaises(ingest.TransportError):
+            ingest.decode_body(body[:len(body) // 2], "gzip", len(self.data))
+        with self.assertRaises(ingest.TransportError):
+            ingest.decode_body(body + b'extra', "gzip", len(self.data))
+        with self.assertRaises(ingest.TransportError):
+            ingest.decode_body(body[:100] + bytes(100) + body[200:], "gzip", len(self.data))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import jobs
+
+# tests/test_jobs.py
+# JobStore eviction (LRU over capacity, TTL for finished jobs) and what
+# survives a restart.
+
+class JobStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.dir, 'jobs.db')
+        self.now = 1_000_000.0
+        clock = mock.patch.object(jobs.time, 'time', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store._conn.close()
+        shutil.rmtree(self.dir)
+
+    def open(self, **kwargs):
+        store = jobs.JobStore(self.db_path, **kwargs)
+        self.stores.append(store)
+        return store
+
+    def test_lru_drops_finished_jobs_before_running_ones(self):
+        store = self.open(max_jobs=3)
+        store.set("running", {"status": "processing"})
+        store.set("done-old", {"status": "completed"})
+        store.set("done-new", {"status": "completed"})
+        store.get("done-old")
+        store.set("new", {"status": "uploading"})
+        # Over by one: the least recently used finished job goes, the older running one stays
+        self.assertNotIn("done-new", store)
+        self.assertIn("running", store)
+        self.assertIn("done-old", store)
+
+    def test_finished_jobs_expire_after_the_ttl(self):
+        store = self.open(ttl=60)
+        store.set("done", {"status": "completed"})
+        store.set("running", {"status": "processing"})
+        self.now += 61
+        # Eviction runs whenever something is stored
+        store.set("other", {"status": "uploading"})
+        self.assertNotIn("done", store)
+        self.assertIn("running", store)
+
+    def test_update_merges_and_keeps_known_fields(self):
+        store = self.open()
+        store.set("job", {"status": "queued", "title": "Gran Turismo 4"})
+        store.update("job", {"status": "processing", "title": None})
+        self.assertEqual(store["job"], {"status": "processing", "title": "Gran Turismo 4"})
+        with self.assertRaises(KeyError):
+            store["missing"]
+
+    def test_restart_keeps_records_and_fails_interrupted_jobs(self):
+        store = self.open()
+        store.set("done", {"status": "completed", "title": "Ico"})
+        store.set("writing", {"status": "processing"})
+        store.progress("writing", "copying", 10, 100)
+        store._conn.close()
+        self.stores.remove(store)
+
+        reopened = self.open()
+        self.assertEqual(reopened["done"], {"status": "completed", "title": "Ico"})
+        # Progress is memory only, and the worker that owned the job is gone
+        self.assertEqual(reopened["writing"], {"status": "error", "message": "Interrupted by a server restart."})
+
+    def test_restart_drops_expired_records(self):
+        store = self.open(ttl=60)
+        store.set("old", {"status": "completed"})
+        store._conn.close()
+        self.stores.remove(store)
+
+        self.now += 61
+        self.assertNotIn("old", self.open(ttl=60))
+
+    def test_progress_is_throttled_except_when_finished(self):
+        store = self.open()
+        store.set("job", {"status": "processing"})
+        with mock.patch.object(jobs.time, 'monotonic', side_effect=[100.0, 100.1, 100.2]):
+            store.progress("job", "copying", 1, 10)
+            store.progress("job", "copying", 2, 10)
+            self.assertEqual(store["job"]["bytes_done"], 1)
+            store.progress("job", "copying", 10, 10)
+        self.assertEqual(store["job"]["bytes_done"], 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import system
+import database as db
+
+# tests/test_library.py
+# The library DB on a throwaway library folder: the change feed clients sync
+# from, keyset-paged search, and bulk removal.
+
+def game(serial, title, **extra):
+    return {"serial": serial, "title": title, "filepath": f"/lib/DVD/{serial}.{title}.iso", "size": 1000,
+            "cover_url": None, "mtime": 1.0, **extra}
+
+class LibraryTestCase(unittest.TestCase):
+    """Points the library at an empty temporary folder for each test."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        patcher = mock.patch.object(system.CONFIG, 'LIB_PATH', self.dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        db.initialize_library()
+
+    def tearDown(self):
+        db.CONNECTIONS.close_library()
+        shutil.rmtree(self.dir)
+
+class LibraryChangesTest(LibraryTestCase):
+    def test_changes_since_a_revision(self):
+        db.apply_library_changes(upserts=[game("SLUS-20002", "Ridge Racer V"), game("SCUS-97328", "Gran Turismo 4")])
+        start = db.get_library_changes()
+        self.assertTrue(start["reset"])
+        self.assertEqual(len(start["upserts"]), 2)
+
+        db.apply_library_changes(upserts=[game("SLES-82038", "Onimusha")], deleted_serials=["SLUS-20002"])
+        changes = db.get_library_changes(start["revision"], start["library"])
+        self.assertFalse(changes["reset"])
+        self.assertEqual([row["serial"] for row in changes["upserts"]], ["SLES-82038"])
+        self.assertEqual(changes["deleted"], ["SLUS-20002"])
+        self.assertGreater(changes["revision"], start["revision"])
+        self.assertEqual(db.get_library_revision(), (changes["library"], changes["revision"]))
+
+        # Caught up: nothing until the next write
+        latest = db.get_library_changes(changes["revision"], changes["library"])
+        self.assertEqual((latest["upserts"], latest["deleted"]), ([], []))
+
+    def test_writes_that_change_nothing_keep_the_revision(self):
+        db.apply_library_changes(upserts=[game("SLUS-20002", "Ridge Racer V")])
+        revision = db.get_library_revision()[1]
+        db.apply_library_changes(touches=[("SLUS-20002", 1.0)])
+        self.assertEqual(db.get_library_revision()[1], revision)
+        db.apply_library_changes(touches=[("SLUS-20002", 2.0)])
+        self.assertGreater(db.get_library_revision()[1], revision)
+
+    def test_readded_game_is_no_longer_deleted(self):
+        db.apply_library_changes(upserts=[game("SLUS-20002", "Ridge Racer V")])
+        start = db.get_library_changes()
+        db.apply_library_changes(deleted_serials=["SLUS-20002"])
+        db.apply_library_changes(upserts=[game("SLUS-20002", "Ridge Racer V")])
+        changes = db.get_library_changes(start["revision"], start["library"])
+        self.assertEqual(changes["deleted"], [])
+        self.assertEqual([row["serial"] for row in changes["upserts"]], ["SLUS-20002"])
+
+    def test_reset_for_another_library_or_pruned_tombstones(self):
+        db.apply_library_changes(upserts=[game(f"SLUS-2000{i}", f"Game {i}") for i in range(4)])
+        start = db.get_library_changes()
+        self.assertTrue(db.get_library_changes(start["revision"], "another-drive")["reset"])
+        self.assertTrue(db.get_library_changes(start["revision"] + 5, start["library"])["reset"])
+
+        db.apply_library_changes(deleted_serials=[f"SLUS-2000{i}" for i in range(3)])
+        with mock.patch.object(db, 'MAX_LIBRARY_TOMBSTONES', 1):
+            # Tombstones are pruned when the library is opened
+            db.initialize_library()
+        changes = db.get_library_changes(start["revision"], start["library"])
+        self.assertTrue(changes["reset"])
+        self.assertEqual([row["serial"] for row in changes["upserts"]], ["SLUS-20003"])
+
+class SearchLibraryTest(LibraryTestCase):
+    def setUp(self):
+        super().setUp()
+        # Repeated titles and sizes, so pages have to break ties on the serial
+        db.apply_library_changes(upserts=[
+            game(f"SLUS-2{i:04d}", f"Game {i % 7}", size=1000 * (i % 5), genre="Racing" if i % 3 == 0 else "Action")
+            for i in range(50)
+        ])
+
+    def walk(self, **kwargs):
+        serials, cursor = [], None
+        while True:
+            page = db.search_library(cursor=cursor, limit=7, **kwargs)
+            serials += [item["serial"] for item in page["items"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return serials, page
+
+    def test_pages_cover_every_match_once_in_order(self):
+        for sort in ('title', 'serial', 'size'):
+            for descending in (False, True):
+                with self.subTest(sort=sort, descending=descending):
+                    serials, page = self.walk(sort=sort, descending=descending)
+                    self.assertEqual(len(serials), 50)
+                    self.assertEqual(len(set(serials)), 50)
+                    self.assertEqual(page["total"], 50)
+                    rows = {row["serial"]: row for row in db.get_all_games()}
+                    key = {'title': lambda s: rows[s]["title"].lower(), 'serial': lambda s: s,
+                           'size': lambda s: rows[s]["size"]}[sort]
+                    self.assertEqual(serials, sorted(serials, key=lambda s: (key(s), s), reverse=descending))
+
+    def test_filters_and_terms_apply_to_every_page(self):
+        serials, page = self.walk(query="game 3", filters={"genre": "Racing"})
+        rows = {row["serial"]: row for row in db.get_all_games()}
+        expected = sorted(s for s, row in rows.items() if row["title"] == "Game 3" and row["genre"] == "Racing")
+        self.assertEqual(sorted(serials), expected)
+        self.assertEqual(page["total"], len(expected))
+        # Facets count with the other filters only, so every genre stays selectable
+        self.assertEqual(set(page["facets"]["genre"]), {"Racing", "Action"})
+
+    def test_rows_added_between_pages_do_not_shift_the_cursor(self):
+        first = db.search_library(sort='serial', limit=10)
+        db.apply_library_changes(upserts=[game("SLUS-10000", "Early")])
+        second = db.search_library(sort='serial', limit=10, cursor=first["next_cursor"])
+        self.assertEqual(second["items"][0]["serial"], "SLUS-20010")
+        self.assertGreater(second["revision"], first["revision"])
+
+    def test_bad_cursor_starts_from_the_top(self):
+        page = db.search_library(sort='serial', limit=3, cursor="not a cursor")
+        self.assertEqual([item["serial"] for item in page["items"]], ["SLUS-20000", "SLUS-20001", "SLUS-20002"])
+
+class RemoveGamesTest(LibraryTestCase):
+    def add(self, serial):
+        path = os.path.join(self.dir, "DVD", f"{serial}.Game.iso")
+        paths = [path, os.path.join(self.dir, "ART", f"{serial}_COV.jpg"), os.path.join(self.dir, "CFG", f"{serial}.cfg")]
+        for file_path in paths:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'wb') as f:
+                f.write(b'x')
+        db.apply_library_changes(upserts=[{**game(serial, "Game"), "filepath": path}])
+        return paths
+
+    def test_reports_each_game(self):
+        removed = self.add("SLUS-20002")
+        stuck = self.add("SCUS-97328")
+        # A file that can't be unlinked: a folder where the ICO would be
+        os.makedirs(os.path.join(self.dir, "ART", "SCUS-97328_ICO.png"))
+
+        report = system.remove_games(["SLUS-20002", "SCUS-97328", "SLES-00000", "SLUS-20002"])
+        self.assertEqual(report["status"], "partial")
+        self.assertEqual((report["removed"], report["missing"], report["failed"]), (2, 1, 1))
+        by_serial = {result["serial"]: result for result in report["results"]}
+        self.assertEqual(len(report["results"]), 3)
+        self.assertEqual(by_serial["SLUS-20002"], {"serial": "SLUS-20002", "status": "removed", "errors": []})
+        self.assertEqual(by_serial["SLES-00000"]["status"], "not_found")
+        self.assertEqual(by_serial["SCUS-97328"]["status"], "partial")
+        self.assertTrue(by_serial["SCUS-97328"]["errors"][0].startswith("SCUS-97328_ICO.png: "))
+
+        # Both rows are gone, and every file that could go did
+        self.assertEqual(db.get_library_serials(), set())
+        self.assertFalse(any(os.path.exists(path) for path in removed + stuck))
+
+    def test_whole_library(self):
+        paths = self.add("SLUS-20002") + self.add("SCUS-97328")
+        report = system.remove_games()
+        self.assertEqual(report["status"], "success")
+        self.assertEqual(report["removed"], 2)
+        self.assertEqual({result["status"] for result in report["results"]}, {"removed"})
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+
+if __name__ == '__main__':
+    unittest.main()
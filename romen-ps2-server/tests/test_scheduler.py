@@ -0,0 +1,114 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scheduler
+
+# tests/test_scheduler.py
+# IngestScheduler ordering: one writer per device, lower priorities first,
+# submission order within a priority, and finishes off the device worker.
+
+TIMEOUT = 10
+
+class IngestSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.states = {}
+        self.changed = threading.Condition()
+        self.positions = []
+        self.scheduler = scheduler.IngestScheduler(workers_per_device=1, cpu_workers=4, finish_workers=1,
+                                                   on_update=self.on_update, on_positions=self.on_positions)
+        self.committed = []
+        self.gate = threading.Event()
+
+    def tearDown(self):
+        self.gate.set()
+        shutil.rmtree(self.dir)
+
+    def on_update(self, job_id, state):
+        with self.changed:
+            self.states[job_id] = state
+            self.changed.notify_all()
+
+    def on_positions(self, changed):
+        # Reported after a job is enqueued, unlike its "queued" update
+        with self.changed:
+            self.positions.append(changed)
+            self.changed.notify_all()
+
+    def wait_for(self, predicate):
+        with self.changed:
+            self.assertTrue(self.changed.wait_for(predicate, TIMEOUT), self.states)
+
+    def wait_status(self, job_ids, status):
+        self.wait_for(lambda: all(self.states.get(job_id, {}).get("status") == status for job_id in job_ids))
+
+    def plan(self, job_id):
+        return lambda: {"status": "ready", "dest_path": os.path.join(self.dir, f"{job_id}.iso"), "title": job_id}
+
+    def commit(self, plan):
+        if plan["title"] == "blocker":
+            self.gate.wait(TIMEOUT)
+        self.committed.append(plan["title"])
+        return {"status": "completed"}
+
+    def submit(self, job_id, priority=scheduler.DEFAULT_PRIORITY, finish=None):
+        self.scheduler.submit(job_id, self.plan(job_id), self.commit, finish, priority)
+
+    def start_blocker(self):
+        self.submit("blocker")
+        self.wait_status(["blocker"], "processing")
+
+    def test_priority_then_submission_order(self):
+        self.start_blocker()
+        jobs = [("background", scheduler.BACKGROUND_PRIORITY), ("first", 10), ("urgent", 1), ("second", 10)]
+        for job_id, priority in jobs:
+            self.submit(job_id, priority)
+        self.wait_for(lambda: sum(self.scheduler.queue_lengths().values()) == 4)
+
+        self.assertEqual(self.scheduler.position("blocker"), 0)
+        self.assertEqual([self.scheduler.position(job_id) for job_id, _ in jobs], [4, 2, 1, 3])
+
+        self.gate.set()
+        self.wait_status([job_id for job_id, _ in jobs], "completed")
+        self.assertEqual(self.committed, ["blocker", "urgent", "first", "second", "background"])
+        # The last place each queued job heard about was 0, when it started writing
+        reported = {}
+        for update in self.positions:
+            reported.update(update)
+        self.assertEqual({job_id: reported.get(job_id) for job_id, _ in jobs}, {job_id: 0 for job_id, _ in jobs})
+
+    def test_failed_prepare_never_reaches_the_device(self):
+        self.scheduler.submit("bad", lambda: {"status": "error", "message": "no serial"}, self.commit)
+        self.wait_status(["bad"], "error")
+        self.assertEqual(self.states["bad"]["message"], "no serial")
+        self.assertEqual(self.committed, [])
+
+    def test_slow_finish_does_not_hold_up_the_next_job(self):
+        # A single prepare thread, which a finish on the same pool would take up
+        self.scheduler = scheduler.IngestScheduler(workers_per_device=1, cpu_workers=1, finish_workers=1,
+                                                   on_update=self.on_update, on_positions=self.on_positions)
+        started = threading.Event()
+        release = threading.Event()
+
+        def finish(plan, result):
+            started.set()
+            release.wait(TIMEOUT)
+            return {**result, "finished": True}
+
+        self.submit("slow", finish=finish)
+        self.assertTrue(started.wait(TIMEOUT))
+        self.submit("next")
+        self.wait_status(["next"], "completed")
+        self.assertEqual(self.committed, ["slow", "next"])
+        self.assertNotIn("finished", self.states["slow"])
+
+        release.set()
+        self.wait_for(lambda: self.states["slow"].get("finished"))
+
+if __name__ == '__main__':
+    unittest.main()
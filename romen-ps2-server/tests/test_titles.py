@@ -0,0 +1,54 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import titles
+
+# tests/test_titles.py
+# TitleIndex fallbacks against a small hand-made map.
+
+MAP = {
+    "SLES-82038": "Onimusha: Dawn of Dreams (Disc 1)",
+    "SLES-82039": "Onimusha: Dawn of Dreams (Disc 2)",
+    "SLES-82042": "Metal Gear Solid 3: Subsistence (Disc 1) (Subsistence)",
+    "SLES-82043": "Metal Gear Solid 3: Subsistence (Disc 2) (Persistence)",
+    "SLES-82050": "Metal Gear Solid 3: Subsistence (Disc 3) (Existence)",
+    "SLES-82053": "Metal Gear Solid 3: Subsistence (Disc 3) (Existence)",
+    "SLUS-20100": "Xenosaga Episode I (Disc 1)",
+    "SLUS-20102": "Xenosaga Episode I (Disc 3)",
+    "SCUS-97328": "Gran Turismo 4",
+    "SLUS-20300": "Alpha (Disc 1)",
+    "SLUS-20302": "Beta (Disc 2)",
+    "SLUS-20310": "Alpha (Disc 2)",
+    "SLUS-20320": "Beta (Disc 1)",
+}
+
+class DiscSiblingTest(unittest.TestCase):
+    def setUp(self):
+        self.index = titles.TitleIndex(lambda: MAP.items())
+
+    def test_exact_and_family(self):
+        self.assertEqual(self.index.match("SCUS-97328").kind, titles.EXACT)
+        self.assertEqual(self.index.match("SLUS-97328").title, "Gran Turismo 4")
+
+    def test_fills_a_gap_between_known_discs(self):
+        match = self.index.match("SLUS-20101")
+        self.assertEqual(match.kind, titles.DISC_SIBLING)
+        self.assertEqual(match.title, "Xenosaga Episode I (Disc 2)")
+
+    def test_no_disc_past_the_last_known_one(self):
+        # Onimusha is a 2-disc game; MGS3: Subsistence has 3
+        self.assertIsNone(self.index.match("SLES-82040"))
+        self.assertIsNone(self.index.match("SLES-82054"))
+
+    def test_disagreeing_neighbours_give_no_answer(self):
+        # 20300 makes it Alpha disc 2, 20302 Beta disc 1; both discs exist
+        self.assertIsNone(self.index.match("SLUS-20301"))
+
+    def test_between_two_releases(self):
+        # Neither neighbour points at a disc its release has
+        self.assertIsNone(self.index.match("SLES-82041"))
+
+if __name__ == '__main__':
+    unittest.main()
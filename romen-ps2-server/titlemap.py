@@ -0,0 +1,193 @@
+import os
+import sys
+import json
+import zlib
+import struct
+import sqlite3
+import hashlib
+import argparse
+
+# titlemap.py
+# Title list sources for the map DB, without the network:
+#   - streaming readers for GameDB-style JSON ({"SLUS-20002": "Ridge Racer V", ...})
+#     and JSONL (one {"serial": ..., "title": ...} / {serial: title} / [serial, title] per line)
+#   - a compact binary snapshot that ships with the app
+#
+# Snapshot layout: magic, format, entry count, 64-char hex version, then a
+# zlib-compressed, sorted "serial\ttitle\n" body. The version is the SHA-256
+# of that body, so identical title lists always get the same version.
+#
+#   python titlemap.py <PS2.titles.json | .jsonl | ps2_titlemap.db> [-o data/ps2_titles.bin]
+
+SNAPSHOT_MAGIC = b'RMTM'
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_HEADER = struct.Struct('<4sBI64s')
+READ_CHUNK_SIZE = 64 * 1024
+
+class SnapshotError(Exception):
+    """Raised for files that aren't a snapshot this version can read."""
+
+# --- Streaming sources ---
+
+def file_version(path) -> str:
+    """SHA-256 of a source file, so unchanged files can be skipped before parsing."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def iter_source(path):
+    """Yields (serial, title) from a .json or .jsonl title list, reading it incrementally."""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.lower().endswith('.jsonl'):
+            yield from _iter_jsonl(f)
+        else:
+            yield from iter_json_object(f)
+
+def _iter_jsonl(f):
+    for line_number, line in enumerate(f, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        entry = json.loads(line)
+        if isinstance(entry, list) and len(entry) == 2:
+            yield entry[0], entry[1]
+        elif isinstance(entry, dict) and 'serial' in entry:
+            yield entry['serial'], entry.get('title')
+        elif isinstance(entry, dict):
+            yield from entry.items()
+        else:
+            raise ValueError(f"Line {line_number}: expected an object or a [serial, title] pair.")
+
+def iter_json_object(f, chunk_size=READ_CHUNK_SIZE):
+    """Yields the (key, value) pairs of a top-level JSON object without loading it whole."""
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def more():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def peek():
+        # Next non-whitespace character, '' at the end of the file
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if eof:
+                return ''
+            more()
+
+    def value():
+        nonlocal pos
+        while True:
+            try:
+                result, end = decoder.raw_decode(buf, pos)
+                # A number running into the end of the buffer may continue in the next chunk
+                if end == len(buf) and not eof:
+                    raise ValueError
+                pos = end
+                return result
+            except ValueError:
+                if eof:
+                    raise
+                more()
+
+    if peek() != '{':
+        raise ValueError("Expected a JSON object of serial -> title.")
+    pos += 1
+    if peek() == '}':
+        return
+
+    while True:
+        peek()
+        key = value()
+        if peek() != ':':
+            raise ValueError(f"Expected ':' after {key!r}.")
+        pos += 1
+        peek()
+        yield key, value()
+
+        separator = peek()
+        pos += 1
+        if separator == '}':
+            return
+        if separator != ',':
+            raise ValueError(f"Expected ',' or '}}' after {key!r}.")
+
+# --- Snapshots ---
+
+def write_snapshot(path, entries) -> str:
+    """Writes a snapshot of (serial, title) pairs; returns its version."""
+    titles = {}
+    for serial, title in entries:
+        if serial and title:
+            # Tabs and newlines are the body's separators; the rest of the title is kept as is
+            titles[str(serial)] = str(title).replace('\t', ' ').replace('\n', ' ')
+    body = ''.join(f"{serial}\t{titles[serial]}\n" for serial in sorted(titles)).encode('utf-8')
+    version = hashlib.sha256(body).hexdigest()
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, len(titles), version.encode('ascii')))
+        f.write(zlib.compress(body, 9))
+    os.replace(tmp_path, path)
+    return version
+
+def snapshot_version(path) -> str:
+    """Reads just the header, so checking for updates costs one small read."""
+    with open(path, 'rb') as f:
+        header = f.read(SNAPSHOT_HEADER.size)
+    return _parse_header(header)[1]
+
+def read_snapshot(path) -> tuple:
+    """Returns (version, {serial: title})."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    count, version = _parse_header(data[:SNAPSHOT_HEADER.size])
+
+    body = zlib.decompress(data[SNAPSHOT_HEADER.size:])
+    if hashlib.sha256(body).hexdigest() != version:
+        raise SnapshotError(f"{path} is corrupt (version mismatch).")
+
+    # Split on '\n' only; splitlines() would also break titles at other line separators
+    titles = dict(line.split('\t', 1) for line in body.decode('utf-8').split('\n')[:-1])
+    if len(titles) != count:
+        raise SnapshotError(f"{path} is corrupt (expected {count} entries, found {len(titles)}).")
+    return version, titles
+
+def _parse_header(header):
+    if len(header) != SNAPSHOT_HEADER.size:
+        raise SnapshotError("Snapshot is truncated.")
+    magic, fmt, count, version = SNAPSHOT_HEADER.unpack(header)
+    if magic != SNAPSHOT_MAGIC or fmt != SNAPSHOT_FORMAT:
+        raise SnapshotError("Not a title map snapshot, or written by a newer version.")
+    return count, version.decode('ascii')
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the bundled title map snapshot.")
+    parser.add_argument('source', help="PS2.titles.json, a .jsonl title list, or an existing ps2_titlemap.db")
+    parser.add_argument('-o', '--output', default='./data/ps2_titles.bin')
+    args = parser.parse_args()
+
+    if args.source.lower().endswith('.db'):
+        conn = sqlite3.connect(args.source)
+        entries = conn.execute('SELECT serial, title FROM title_map').fetchall()
+        conn.close()
+    else:
+        entries = iter_source(args.source)
+
+    version = write_snapshot(args.output, entries)
+    print(f"Wrote {args.output} ({os.path.getsize(args.output) // 1024} KB, version {version[:12]})")
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import re
+import threading
+
+# titles.py
+# In-memory serial -> title index over the title map. Loaded once, O(1)
+# exact lookups, plus fallbacks for the ways a serial read off a disc or
+# typed into a filename tends to differ from the one GameDB lists.
+
+# Publisher prefixes that share a number space within a region. A disc
+# labelled SCUS-97xxx is sometimes listed as SLUS-97xxx and vice versa.
+PREFIX_FAMILIES = {
+    'NTSC-U': ('SLUS', 'SCUS'),
+    'PAL': ('SLES', 'SCES', 'SCED', 'SLED', 'TCES', 'TLES'),
+    'NTSC-J': ('SLPS', 'SLPM', 'SCPS', 'SCPM', 'SCAJ', 'SLAJ', 'PAPX', 'PBPX', 'PCPX', 'TCPS'),
+    'NTSC-K': ('SLKA', 'SCKA'),
+    'NTSC-C': ('SCCS', 'CPCS'),
+}
+# How far apart the serials of one multi-disc release can be
+MAX_DISC_DISTANCE = 3
+
+DISC_RE = re.compile(r'\(Disc (\d+)\)')
+SERIAL_RE = re.compile(r'([A-Z]{4})-(\d{5})')
+
+# How a title was found
+EXACT = "exact"
+PREFIX_FAMILY = "prefix_family"
+DISC_SIBLING = "disc_sibling"
+DIGIT_TYPO = "digit_typo"
+
+_FAMILY_OF = {prefix: family for family in PREFIX_FAMILIES.values() for prefix in family}
+_REGION_OF = {prefix: region for region, family in PREFIX_FAMILIES.items() for prefix in family}
+
+def region_of(serial):
+    """Region for a serial in either form (SLUS_200.02 / SLUS-20002), None if unknown."""
+    return _REGION_OF.get((serial or '')[:4].upper())
+
+class TitleMatch:
+    def __init__(self, serial, title, kind):
+        self.serial = serial
+        self.title = title
+        self.kind = kind
+
+class TitleIndex:
+    """
+    loader() returns (serial, title) rows with serials in the map's cleaned
+    form (SLUS-20002). The rows are read on first use and again after
+    invalidate().
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._titles = None
+        self._discs = None
+
+    def __len__(self):
+        return len(self._load())
+
+    def invalidate(self):
+        with self._lock:
+            self._titles = None
+            self._discs = None
+
+    def get(self, serial):
+        """Exact lookup of a cleaned serial."""
+        return self._load().get(serial)
+
+    def get_many(self, serials) -> dict:
+        """{serial: TitleMatch} for every serial that matched, exactly or otherwise."""
+        matches = {}
+        for serial in serials:
+            match = self.match(serial)
+            if match:
+                matches[serial] = match
+        return matches
+
+    def match(self, serial, fuzzy=True):
+        """
+        Finds the title for a cleaned serial. Falls back, in order, to the same
+        number under a sibling prefix, a neighbouring disc of a multi-disc
+        release (only up to the highest disc the map knows for that title),
+        then a single-digit typo. Fallbacks only answer when there is exactly
+        one candidate.
+        """
+        titles = self._load()
+        title = titles.get(serial)
+        if title is not None:
+            return TitleMatch(serial, title, EXACT)
+        if not fuzzy:
+            return None
+
+        parsed = SERIAL_RE.fullmatch(serial)
+        if not parsed:
+            return None
+        prefix, digits = parsed.groups()
+        number = int(digits)
+
+        return (
+            self._match_family(titles, prefix, digits)
+            or self._match_disc_sibling(titles, prefix, number)
+            or self._match_digit_typo(titles, prefix, digits)
+        )
+
+    # --- Fallbacks ---
+
+    def _match_family(self, titles, prefix, digits):
+        candidates = [
+            f"{other}-{digits}" for other in _FAMILY_OF.get(prefix, ())
+            if other != prefix and f"{other}-{digits}" in titles
+        ]
+        if len(candidates) != 1:
+            return None
+        return TitleMatch(candidates[0], titles[candidates[0]], PREFIX_FAMILY)
+
+    def _match_disc_sibling(self, titles, prefix, number):
+        # Every neighbour with a "(Disc N)" title suggests a disc for us, assuming discs
+        # are numbered in serial order. Only an answer all of them agree on is used, and
+        # only for a disc the release is known to have.
+        discs = self._load_discs(titles)
+        region = _REGION_OF.get(prefix)
+        candidates = {}
+        for distance in range(1, MAX_DISC_DISTANCE + 1):
+            for offset in (-distance, distance):
+                sibling = f"{prefix}-{number + offset:05d}"
+                title = titles.get(sibling)
+                disc = DISC_RE.search(title) if title else None
+                if not disc:
+                    continue
+                disc_number = int(disc.group(1)) - offset
+                known = discs.get((region, title[:disc.start()].strip()), {})
+                if not 1 <= disc_number <= max(known, default=0):
+                    continue
+                # A disc the map lists elsewhere keeps its own subtitle, e.g. "(Disc 2) (Persistence)"
+                if disc_number in known:
+                    sibling = known[disc_number]
+                    renamed = titles[sibling]
+                else:
+                    renamed = DISC_RE.sub(f"(Disc {disc_number})", title, count=1)
+                candidates.setdefault(renamed, sibling)
+        if len(candidates) != 1:
+            return None
+        renamed, sibling = next(iter(candidates.items()))
+        return TitleMatch(sibling, renamed, DISC_SIBLING)
+
+    def _match_digit_typo(self, titles, prefix, digits):
+        # Serials that differ in exactly one digit; only useful where the
+        # number space is sparse enough for that to be unambiguous
+        candidates = []
+        for position, original in enumerate(digits):
+            for digit in '0123456789':
+                if digit == original:
+                    continue
+                candidate = f"{prefix}-{digits[:position]}{digit}{digits[position + 1:]}"
+                if candidate in titles:
+                    candidates.append(candidate)
+                    if len(candidates) > 1:
+                        return None
+        if len(candidates) != 1:
+            return None
+        return TitleMatch(candidates[0], titles[candidates[0]], DIGIT_TYPO)
+
+    # --- Loading ---
+
+    def _load(self):
+        titles = self._titles
+        if titles is not None:
+            return titles
+
+        with self._lock:
+            if self._titles is None:
+                self._titles = {serial: title for serial, title in self._loader()}
+            return self._titles
+
+    def _load_discs(self, titles):
+        """{(region, title before "(Disc N)"): {disc number: serial}} for the multi-disc releases in titles."""
+        discs = self._discs
+        if discs is not None and discs[0] is titles:
+            return discs[1]
+
+        index = {}
+        for serial, title in titles.items():
+            disc = DISC_RE.search(title)
+            if disc:
+                key = (_REGION_OF.get(serial[:4]), title[:disc.start()].strip())
+                index.setdefault(key, {}).setdefault(int(disc.group(1)), serial)
+        with self._lock:
+            self._discs = (titles, index)
+        return index
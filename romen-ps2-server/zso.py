@@ -0,0 +1,335 @@
+import os
+import sys
+import zlib
+import array
+import struct
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import lz4.block
+import diskio
+import ingest
+
+# zso.py
+# ZSO ("ZISO") images: the ISO cut into 2 KB blocks, each LZ4-compressed on
+# its own (or stored as-is when that doesn't help), behind a table of block
+# offsets. OPL loads them directly, and the padding that fills much of a PS2
+# disc shrinks to almost nothing. Blocks are compressed on a thread pool a
+# task (TASK_BLOCKS blocks) at a time; each task also returns a CRC of what
+# it read, so the finished file is checked by decompressing it again.
+
+ZSO_MAGIC = b'ZISO'
+ZSO_EXTENSION = '.zso'
+# magic, header size, uncompressed size, block size, version, index alignment, reserved
+HEADER = struct.Struct('<4sIQIBB2x')
+BLOCK_SIZE = 2048
+ZSO_VERSION = 1
+# Set on index entries whose block is stored uncompressed
+PLAIN_BLOCK = 0x80000000
+# 1 MB of image per pool task, so the per-task overhead is spread over many blocks
+TASK_BLOCKS = 512
+# Tasks kept in flight per worker; bounds memory while keeping the pool busy
+TASKS_PER_WORKER = 4
+# LZ4 HC level: higher packs tighter and writes slower, reading speed is the same
+DEFAULT_LEVEL = 9
+
+class ZsoError(Exception):
+    pass
+
+def is_zso(path) -> bool:
+    return path.lower().endswith(ZSO_EXTENSION)
+
+def read_header(f) -> dict:
+    """{size, block_size, align, blocks} from an open ZSO file; raises ZsoError if it isn't one."""
+    raw = f.read(HEADER.size)
+    if len(raw) != HEADER.size:
+        raise ZsoError("File is too short to be a ZSO image.")
+    magic, header_size, size, block_size, version, align = HEADER.unpack(raw)
+    if magic != ZSO_MAGIC or header_size != HEADER.size or block_size <= 0:
+        raise ZsoError("Not a ZSO image.")
+    return {"size": size, "block_size": block_size, "align": align, "blocks": -(-size // block_size)}
+
+def original_size(path):
+    """Uncompressed size recorded in a ZSO header, or None if it can't be read."""
+    try:
+        with open(path, 'rb') as f:
+            return read_header(f)["size"]
+    except (OSError, ZsoError):
+        return None
+
+def alignment_for(size, blocks) -> int:
+    """
+    Smallest index alignment that can address the whole file. Entries are
+    offsets >> align in 31 bits, so images past 2 GB need align > 0; every
+    block then starts on a (1 << align) boundary, costing a little padding.
+    """
+    align = 0
+    while True:
+        worst_case = HEADER.size + 4 * (blocks + 1) + size + blocks * ((1 << align) - 1)
+        if worst_case >> align < PLAIN_BLOCK:
+            return align
+        align += 1
+
+def _read_index(f, blocks):
+    index = array.array('I')
+    index.fromfile(f, blocks + 1)
+    if sys.byteorder == 'big':
+        index.byteswap()
+    return index
+
+def _pread_exact(fd, length, offset):
+    if hasattr(os, 'pread'):
+        data = os.pread(fd, length, offset)
+    else:
+        # Windows has no pread
+        os.lseek(fd, offset, os.SEEK_SET)
+        data = os.read(fd, length)
+    if len(data) != length:
+        raise ZsoError(f"Short read at offset {offset}.")
+    return data
+
+def _compress_task(src_path, offset, length, block_size, align, level):
+    """Pool task: compresses one run of blocks. Returns (blocks, plain flags, CRC32 of the input)."""
+    fd = os.open(src_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        data = _pread_exact(fd, length, offset)
+        # Read once, never again
+        diskio.drop_cache(fd, offset, length)
+    finally:
+        os.close(fd)
+
+    blocks, plain = [], []
+    for start in range(0, length, block_size):
+        block = data[start:start + block_size]
+        packed = lz4.block.compress(block, mode='high_compression', compression=level, store_size=False)
+        # Readers size a block by the gap to the next entry, which includes alignment
+        # padding; anything that might not come out smaller is stored as-is
+        if len(packed) + (1 << align) >= len(block):
+            blocks.append(block)
+            plain.append(True)
+        else:
+            blocks.append(packed)
+            plain.append(False)
+    return blocks, plain, zlib.crc32(data)
+
+def _verify_task(path, first_block, entries, block_size, align, size):
+    """Pool task: decompresses blocks first_block.. (entries is their slice of the index, plus one) and returns their CRC32."""
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        start = (entries[0] & ~PLAIN_BLOCK) << align
+        end = (entries[-1] & ~PLAIN_BLOCK) << align
+        data = _pread_exact(fd, end - start, start)
+        diskio.drop_cache(fd, start, end - start)
+    finally:
+        os.close(fd)
+
+    crc = 0
+    for number in range(len(entries) - 1):
+        expected = min(block_size, size - (first_block + number) * block_size)
+        block_start = ((entries[number] & ~PLAIN_BLOCK) << align) - start
+        block_end = ((entries[number + 1] & ~PLAIN_BLOCK) << align) - start
+        block = _decode_block(data[block_start:block_end], entries[number] & PLAIN_BLOCK, expected, (1 << align) - 1)
+        crc = zlib.crc32(block, crc)
+    return crc
+
+def _decode_block(raw, plain, expected, slack=0):
+    """
+    One block of the image. raw runs up to the next index entry, so with
+    align > 0 it may end in up to `slack` zero bytes of padding that aren't
+    part of the LZ4 data; the index doesn't record exact lengths, so each
+    possible length is tried, shortest padding first (as OPL's partial
+    decoder effectively does by stopping at `expected` bytes).
+    """
+    if plain:
+        block = raw[:expected]
+        if len(block) != expected:
+            raise ZsoError("Block decompressed to the wrong size.")
+        return block
+
+    error = None
+    for trim in range(min(slack, len(raw) - 1) + 1):
+        if trim and raw[-trim] != 0:
+            break
+        try:
+            block = lz4.block.decompress(raw[:len(raw) - trim], uncompressed_size=expected)
+        except lz4.block.LZ4BlockError as e:
+            error = e
+            continue
+        if len(block) == expected:
+            return block
+    raise ZsoError(f"Corrupt block: {error}" if error else "Block decompressed to the wrong size.")
+
+class ZsoReader:
+    """Random access to the uncompressed image inside a ZSO file."""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            header = read_header(self._file)
+            self.index = _read_index(self._file, header["blocks"])
+        except Exception:
+            self._file.close()
+            raise
+        self.size = header["size"]
+        self.blocks = header["blocks"]
+        self.block_size = header["block_size"]
+        self.align = header["align"]
+
+    def _offset(self, number):
+        return (self.index[number] & ~PLAIN_BLOCK) << self.align
+
+    def read_blocks(self, first, last) -> bytes:
+        """Blocks first..last-1, decompressed, from one read of their compressed span."""
+        start = self._offset(first)
+        data = _pread_exact(self._file.fileno(), self._offset(last) - start, start)
+        image = bytearray()
+        for number in range(first, last):
+            expected = min(self.block_size, self.size - number * self.block_size)
+            raw = data[self._offset(number) - start:self._offset(number + 1) - start]
+            image += _decode_block(raw, self.index[number] & PLAIN_BLOCK, expected, (1 << self.align) - 1)
+        return bytes(image)
+
+    def read(self, offset, length) -> bytes:
+        end = min(offset + length, self.size)
+        if offset >= end:
+            return b''
+        first = offset // self.block_size
+        data = self.read_blocks(first, -(-end // self.block_size))
+        skip = offset - first * self.block_size
+        return data[skip:skip + end - offset]
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def iter_image(path, chunk_blocks=TASK_BLOCKS):
+    """Yields the uncompressed image, chunk_blocks blocks at a time."""
+    with ZsoReader(path) as reader:
+        for first in range(0, reader.blocks, chunk_blocks):
+            yield reader.read_blocks(first, min(first + chunk_blocks, reader.blocks))
+
+def hash_file(path) -> dict:
+    """Hashes of the uncompressed image, comparable with an ISO's (see ingest.hash_file)."""
+    hasher = ingest.IngestHasher()
+    for chunk in iter_image(path):
+        hasher.update(chunk)
+    return hasher.hexdigests()
+
+class ZsoCompressor:
+    """
+    Writes ISOs as ZSO images using a thread pool that is started on first
+    use and kept for later images. compress() returns the sizes involved;
+    the written file has already been verified by decompressing it.
+    """
+
+    def __init__(self, workers=None, level=DEFAULT_LEVEL):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.level = level
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='zso')
+            return self._pool
+
+    def compress(self, src_path, dest_path, progress=None, window=diskio.WRITEBACK_WINDOW) -> dict:
+        """
+        Compresses src_path into a new file at dest_path, then verifies it.
+        progress(stage, done, total) reports "compressing" and "verifying".
+        Returns {original_size, compressed_size}; raises ZsoError or OSError.
+        """
+        size = os.path.getsize(src_path)
+        blocks = -(-size // BLOCK_SIZE)
+        align = alignment_for(size, blocks)
+        unit = 1 << align
+        task_bytes = TASK_BLOCKS * BLOCK_SIZE
+        pool = self._executor()
+
+        index = array.array('I', bytes(4 * (blocks + 1)))
+        crcs = []
+        with open(dest_path, 'wb', buffering=diskio.COPY_BUFFER_SIZE) as f:
+            writeback = diskio.Writeback(f.fileno(), window, before_sync=f.flush)
+            f.write(HEADER.pack(ZSO_MAGIC, HEADER.size, size, BLOCK_SIZE, ZSO_VERSION, align))
+            # The index is only known at the end; its space is kept and written last
+            f.write(bytes(4 * (blocks + 1)))
+            position = HEADER.size + 4 * (blocks + 1)
+
+            offsets = iter(range(0, size, task_bytes))
+            pending = collections.deque()
+            number = 0
+
+            def submit():
+                offset = next(offsets, None)
+                if offset is not None:
+                    pending.append(pool.submit(_compress_task, src_path, offset, min(task_bytes, size - offset), BLOCK_SIZE, align, self.level))
+
+            for _ in range(self.workers * TASKS_PER_WORKER):
+                submit()
+            while pending:
+                packed, plain, crc = pending.popleft().result()
+                submit()
+                crcs.append(crc)
+                for block, is_plain in zip(packed, plain):
+                    padding = -position % unit
+                    if padding:
+                        f.write(bytes(padding))
+                        position += padding
+                    index[number] = (position >> align) | (PLAIN_BLOCK if is_plain else 0)
+                    f.write(block)
+                    position += len(block)
+                    number += 1
+                writeback.advance(position)
+                if progress:
+                    progress("compressing", min(number * BLOCK_SIZE, size), size)
+
+            # The last entry marks where the final block ends, so it has to be addressable too
+            padding = -position % unit
+            f.write(bytes(padding))
+            position += padding
+            index[blocks] = position >> align
+
+            if sys.byteorder == 'big':
+                index.byteswap()
+            f.seek(HEADER.size)
+            f.write(index.tobytes())
+            f.flush()
+            writeback.finish()
+
+        self.verify(dest_path, crcs, progress)
+        return {"original_size": size, "compressed_size": position}
+
+    def verify(self, path, crcs, progress=None):
+        """Decompresses path on the pool and checks every task's CRC against crcs (as returned while compressing)."""
+        with open(path, 'rb') as f:
+            header = read_header(f)
+            index = _read_index(f, header["blocks"])
+        size, blocks = header["size"], header["blocks"]
+        if len(crcs) != -(-blocks // TASK_BLOCKS):
+            raise ZsoError("Verification data doesn't match the image.")
+
+        pool = self._executor()
+        checks = [
+            pool.submit(_verify_task, path, first, index[first:min(first + TASK_BLOCKS, blocks) + 1].tolist(),
+                        header["block_size"], header["align"], size)
+            for first in range(0, blocks, TASK_BLOCKS)
+        ]
+        for number, (check, expected) in enumerate(zip(checks, crcs)):
+            if check.result() != expected:
+                for remaining in checks:
+                    remaining.cancel()
+                raise ZsoError(f"Verification failed at offset {number * TASK_BLOCKS * header['block_size']}.")
+            if progress:
+                progress("verifying", min((number + 1) * TASK_BLOCKS * header["block_size"], size), size)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None